@@ -14,6 +14,12 @@ def config_parser():
 
     dwc_parser.add_argument("-l", "--logging",  help="set the global logging level, default=none", choices=['none', 'info', 'debug', 'warn', 'error'])
     dwc_parser.add_argument("-c", "--config",   help="provisioning tool config file (default=config.json")
+    dwc_parser.add_argument("-w", "--workers",  help="concurrent requests sent to the tenant (default=8, 1=serial)", type=int)
+    dwc_parser.add_argument("--offline",        help="serve list commands from the tenant snapshot only", default=False, action="store_true")
+    dwc_parser.add_argument("--socket",         help="send the command to the provisioner server listening on this socket")
+    dwc_parser.add_argument("--stats",          help="print request statistics per endpoint when the command completes", default=False, action="store_true")
+    dwc_parser.add_argument("--stats-file",     help="write the request statistics per endpoint as JSON to this file")
+    dwc_parser.add_argument("--stats-hook",     help="call module:function with every request event", action="append")
 
     # Start the parser for all commands.    
     global_subparsers = dwc_parser.add_subparsers(help='dwc provisioning tool commands', dest="command")
@@ -25,6 +31,7 @@ def config_parser():
     config_parser.add_argument("--dwc-url",      help="DWC tenant URL")
     config_parser.add_argument("--dwc-user",     help="DWC user name or email")
     config_parser.add_argument("--dwc-password", help="DWC password")
+    config_parser.add_argument("--dwc-session-file", help="file for the saved DWC session (default=.dwc_session next to config.ini)")
     # HANA specific configuration options
     config_parser.add_argument("--hana-host",      help="HANA host name")
     config_parser.add_argument("--hana-port",      help="HANA port")
@@ -32,9 +39,26 @@ def config_parser():
     config_parser.add_argument("--hana-password",  help="HANA password")
     config_parser.add_argument("--hana-encrypt",   help="Encrypt HANA communication (default=False)", default=False, action="store_true")
     config_parser.add_argument("--hana-sslverify", help="Validate the HANA certificate (default=False)", default=False, action="store_true")
+    config_parser.add_argument("--hana-batch-size", help="rows sent to HANA per batch (default=1000)")
+    config_parser.add_argument("--hana-load",        help="load HANA tables with INSERT statements or IMPORT FROM staged CSV files (default=insert)", choices=['insert', 'import'])
+    config_parser.add_argument("--hana-import-dir",  help="directory for the staged CSV files (HANA must be able to read it)")
+    config_parser.add_argument("--hana-import-path", help="the same directory as seen by the HANA server (default=--hana-import-dir)")
+    # HTTP transport configuration options
+    config_parser.add_argument("--http-connect-timeout", help="seconds to wait for a tenant connection (default=10)")
+    config_parser.add_argument("--http-read-timeout",    help="seconds to wait for a tenant response (default=300)")
+    config_parser.add_argument("--http-retries",         help="retries for failed or throttled requests (default=3)")
+    config_parser.add_argument("--http-backoff",         help="initial retry delay in seconds, doubled per retry (default=0.5)")
+    # Tenant snapshot cache options
+    config_parser.add_argument("--cache-dir", help="directory for tenant snapshots (default=cache next to config.ini)")
+    config_parser.add_argument("--cache-ttl", help="seconds a tenant snapshot is reused (default=0, disabled)")
     
+    # Serve command - keep a logged-in session and run commands sent over a socket
+    serve_parser = global_subparsers.add_parser('serve', help='Run commands sent by clients over a local socket (see --socket)')
+    serve_parser.add_argument("-r", "--refresh", help="seconds before cached spaces and users are reloaded (default=300)", type=int, default=300)
+
     # Script command - only takes a file name
     script_parser = global_subparsers.add_parser('script', help='Execute a series of commands from a script file')
+    script_parser.add_argument("-p", "--parallel", help="run up to N independent commands at a time (default=1, in order)", type=int, default=1)
     script_parser.add_argument('filename', help='script file name')
         
     # Users commands: list (only right now)
@@ -43,9 +67,11 @@ def config_parser():
 
     user_list_parser = user_subparsers.add_parser('list', help='Space member list command')
     user_list_parser.add_argument("-d", "--directory", help="directory for output files")
-    user_list_parser.add_argument("-f", "--format",    help="output style", default="text", choices=['hana', 'csv', 'json', 'text'])
+    user_list_parser.add_argument("-f", "--format",    help="output style", default="text", choices=['hana', 'csv', 'json', 'ndjson', 'parquet', 'text'])
     user_list_parser.add_argument("-p", "--prefix",    help="output prefix for writing", default="DWC_USERS")
     user_list_parser.add_argument("-q", "--query",     help="seach expansion of user names", default=False, action="store_true")
+    user_list_parser.add_argument("-z", "--gzip",      help="compress json and ndjson output", default=False, action="store_true")
+    user_list_parser.add_argument("--merge",           help="update the hana tables in place - only changed rows are written", default=False, action="store_true")
     user_list_parser.add_argument('users',             help='list of user patterns', nargs=argparse.REMAINDER)
 
     # Spaces: list, create, delete, bulk, member
@@ -54,12 +80,14 @@ def config_parser():
 
     # Spaces LIST options
     space_list_parser = space_subparsers.add_parser('list', help='spaces list command')
-    space_list_parser.add_argument("-f", "--format",    help="output style", default="text", choices=['hana', 'csv', 'json', 'text'])
+    space_list_parser.add_argument("-f", "--format",    help="output style", default="text", choices=['hana', 'csv', 'json', 'ndjson', 'parquet', 'text'])
     space_list_parser.add_argument("-p", "--prefix",    help="prefix for output", default="DWC_SPACES")
     space_list_parser.add_argument("-q", "--query",     help="seach expansion of space names", default=False, action="store_true")
     space_list_parser.add_argument("-e", "--extend",    help="extend search to include remote tables and schema objects (slower)", default=False, action="store_true")
     space_list_parser.add_argument("-a", "--add",       help="add user and redeploy the space to query builder objects", default=False, action="store_true")
     space_list_parser.add_argument("-d", "--directory", help="directory for output files")
+    space_list_parser.add_argument("-z", "--gzip",      help="compress json and ndjson output", default=False, action="store_true")
+    space_list_parser.add_argument("--merge",           help="update the hana tables in place - only changed rows are written", default=False, action="store_true")
     space_list_parser.add_argument("spaceID",           help="space id(s) to list", nargs=argparse.REMAINDER)
 
     # Spaces CREATE options
@@ -85,10 +113,16 @@ def config_parser():
     space_bulk_create_parser.add_argument("-s", "--skip",     help="header lines to skip in the CSV file (default=1)", default="1")
     space_bulk_create_parser.add_argument("-f", "--force",    help="force the re-creation if space exists", action="store_true")
     space_bulk_create_parser.add_argument("-t", "--template", help="Space id to use as a template if not specified per space")
+    space_bulk_create_parser.add_argument("-r", "--rate",     help="maximum requests per second sent to the tenant (default=no limit)", type=float)
+    space_bulk_create_parser.add_argument("--report",         help="write the result of each row to this file")
+    space_bulk_create_parser.add_argument("--report-format",  help="report file format (default=csv)", default="csv", choices=['csv', 'json'])
     space_bulk_create_parser.add_argument("filename",         help="CSV file containing spaces to create")
 
     space_bulk_delete_parser = space_bulk_subparsers.add_parser('delete', help='Space bulk delete command')
     space_bulk_delete_parser.add_argument("-s", "--skip", help="header lines to skip in the CSV file", default="1")
+    space_bulk_delete_parser.add_argument("-r", "--rate", help="maximum requests per second sent to the tenant (default=no limit)", type=float)
+    space_bulk_delete_parser.add_argument("--report",     help="write the result of each row to this file")
+    space_bulk_delete_parser.add_argument("--report-format", help="report file format (default=csv)", default="csv", choices=['csv', 'json'])
     space_bulk_delete_parser.add_argument("filename",     help="CSV file containing space names to delete")
 
     # Space MEMBER options
@@ -97,9 +131,11 @@ def config_parser():
 
     space_member_list_parser = space_member_subparsers.add_parser('list', help='Space member list command')
     space_member_list_parser.add_argument("-q", "--query",     help="use search lookup for space name and users", default=False, action="store_true")
-    space_member_list_parser.add_argument("-f", "--format",    help="output style", default="text", choices=['hana', 'csv', 'json', 'text'])
+    space_member_list_parser.add_argument("-f", "--format",    help="output style", default="text", choices=['hana', 'csv', 'json', 'ndjson', 'parquet', 'text'])
     space_member_list_parser.add_argument("-p", "--prefix",    help="output style", default="DWC_MEMBERS")
     space_member_list_parser.add_argument("-d", "--directory", help="directory for output files")
+    space_member_list_parser.add_argument("-z", "--gzip",      help="compress json and ndjson output", default=False, action="store_true")
+    space_member_list_parser.add_argument("--merge",           help="update the hana tables in place - only changed rows are written", default=False, action="store_true")
     space_member_list_parser.add_argument("spaceID",           help="search pattern for spaces", nargs=argparse.REMAINDER)
 
     space_member_add_parser = space_member_subparsers.add_parser('add', help='Space member add command')
@@ -109,7 +145,7 @@ def config_parser():
 
     space_member_remove_parser = space_member_subparsers.add_parser('remove', help='Space member remove command')
     space_member_remove_parser.add_argument("-q", "--query", help="Use search lookup for space name and users", default=False, action="store_true")
-    space_member_remove_parser.add_argument("spaceName",        help="search pattern for spaces to remove user")
+    space_member_remove_parser.add_argument("spaceID",          help="search pattern for spaces to remove user")
     space_member_remove_parser.add_argument("user",             help="user list (patterns) to remove", nargs=argparse.REMAINDER)
 
     # Start the CONNECTIONS command
@@ -119,9 +155,11 @@ def config_parser():
     conn_list_parser = conn_subparsers.add_parser('list', help='Connection list command')
     conn_list_parser.add_argument("-q", "--query",      help="search space names (default=false)", action="store_true")
     conn_list_parser.add_argument("-c", "--connection", help="connection name to list from space")
-    conn_list_parser.add_argument("-f", "--format",     help="output style", default="text", choices=['hana', 'csv', 'json', 'text'])
+    conn_list_parser.add_argument("-f", "--format",     help="output style", default="text", choices=['hana', 'csv', 'json', 'ndjson', 'parquet', 'text'])
     conn_list_parser.add_argument("-p", "--prefix",     help="output prefix, default=DWC_CONNECTIONS", default="DWC_CONNECTIONS")
     conn_list_parser.add_argument("-d", "--directory",  help="directory for output files")
+    conn_list_parser.add_argument("-z", "--gzip",       help="compress json and ndjson output", default=False, action="store_true")
+    conn_list_parser.add_argument("--merge",            help="update the hana tables in place - only changed rows are written", default=False, action="store_true")
     conn_list_parser.add_argument("spaceID",            help="space(s) to list connections", nargs=argparse.REMAINDER)
 
     conn_create_parser = conn_subparsers.add_parser('create', help='Connection create command')
@@ -141,9 +179,11 @@ def config_parser():
 
     share_list_parser = share_subparsers.add_parser('list', help='shares create command help')
     share_list_parser.add_argument("-q", "--query",       help="Use search lookup for space name, object, or target (default=false)", action="store_true")
-    share_list_parser.add_argument("-f", "--format",       help="output style", default="text", choices=['hana', 'csv', 'json', 'text'])
+    share_list_parser.add_argument("-f", "--format",       help="output style", default="text", choices=['hana', 'csv', 'json', 'ndjson', 'parquet', 'text'])
     share_list_parser.add_argument("-p", "--prefix",       help="output prefix", default="DWC_SHARES")
     share_list_parser.add_argument("-d", "--directory",    help="directory for output files")
+    share_list_parser.add_argument("-z", "--gzip",         help="compress json and ndjson output", default=False, action="store_true")
+    share_list_parser.add_argument("--merge",              help="update the hana tables in place - only changed rows are written", default=False, action="store_true")
     share_list_parser.add_argument("-s", "--sourceSpace",  help="source space with object to share")
     share_list_parser.add_argument("-b", "--sourceObject", help="source object technical name to share")
     share_list_parser.add_argument("-t", "--targetSpace",  help="target space(s) getting the share", nargs=argparse.REMAINDER)
@@ -157,6 +197,20 @@ def config_parser():
     # share_list_parser = share_subparsers.add_parser('list', help='shares list command help')
     # share_unshare_parser = share_subparsers.add_parser('unshare', help='shares unshare command help')
 
+def is_mutating(args):
+    """Does the command change the tenant?"""
+
+    if args.command == "spaces":
+        if args.subcommand in [ "create", "delete", "bulk" ]:
+            return True
+
+        return args.subcommand == "member" and args.member_subcommand in [ "add", "remove" ]
+
+    if args.command in [ "connections", "shares" ]:
+        return args.subcommand in [ "create", "delete", "remove" ]
+
+    return False
+
 def parse(args):
     if dwc_parser is None:
         config_parser()
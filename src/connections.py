@@ -27,18 +27,17 @@ def connections_list(connection_args):
     if len(space_list) == 0:
         logger.warn("connections_list: no spaces found to list")
     else:
-        list_of_connections = []
+        # The connections of each space are written as soon as they are read.
 
-        for space in space_list:
-            connections = session_config.dwc.get_connections(space["name"], connection_args.connection)
-
-            for connection in connections:
-                list_of_connections.append(connection)
-
-        writer.write_list(list_of_connections, args=connection_args)
+        writer.write_list(space_connections(space_list, connection_args.connection), args=connection_args)
 
     logger.debug(utility.log_timer("connections_list", "completed."))
     
+def space_connections(space_list, connection_name):
+    for space in space_list:
+        for connection in session_config.dwc.get_connections(space["name"], connection_name):
+            yield connection
+
 def connections_create(connection_args):
     utility.start_timer("connections_create")
 
@@ -61,7 +60,7 @@ def connections_delete(connection_args):
     if len(space_list) == 0:
         logger.warn("connections_delete: no spaces found")
     else:
-        for space in session_config.dwc.query_spaces(space_list):
-            session_config.dwc.delete_connection(space["name"], connection_args.connectionName)
+        for space in space_list:
+            session_config.dwc.connection_delete(space["name"], connection_args.connectionName)
 
     logger.debug(utility.log_timer("connections_delete", "completed."))
@@ -2,6 +2,29 @@ CONST_GIGABYTE = 1000000000
 CONST_DEFAULT_SPACE_STORAGE = 1 * CONST_GIGABYTE
 CONST_DEFAULT_SPACE_MEMORY = int(.5 * CONST_GIGABYTE)
 
+# Number of concurrent requests commands may send to the tenant.
+CONST_DEFAULT_WORKERS = 8
+
+# HTTP transport defaults - timeouts are in seconds, backoff is the
+# initial delay before a retry (doubled for each subsequent retry).
+CONST_HTTP_CONNECT_TIMEOUT = 10
+CONST_HTTP_READ_TIMEOUT = 300
+CONST_HTTP_RETRIES = 3
+CONST_HTTP_BACKOFF = 0.5
+
+# Rows sent to HANA in a single executemany call.
+CONST_HANA_BATCH_SIZE = 1000
+
+# Columns that identify a row for --merge, in order of preference - the first
+# one with a unique value in every row is the key of the table.
+CONST_HANA_MERGE_KEYS = [ "name", "id", "userName" ]
+
+# Longest list of object names (characters) sent in one share list request.
+CONST_SHARE_LIST_NAMES_MAX = 2000
+
+# Rows held in memory per table before a Parquet row group is written.
+CONST_PARQUET_ROW_GROUP_SIZE = 10000
+
 CONST_SPACE_ID = 0
 CONST_BUSINESS = 1
 CONST_DISK = 2
@@ -0,0 +1,370 @@
+import contextvars, io, os, logging, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import session_config
+import cmdparse, connections, spaces, shares, users
+
+logger = logging.getLogger("dispatch")
+
+def read_script(filename):
+    '''
+    Read and parse the commands in a script file.  Returns None if the
+    script does not exist.
+    '''
+
+    logger.setLevel(session_config.log_level)
+
+    if not os.path.exists(filename):
+        logger.error("Script {} not found.".format(filename))
+        return None
+
+    commands = []
+
+    # Read all the commands from the script - stop if we
+    # encounter the "exit" command.  Also, skip any "config"
+    # commands.
+
+    with open(filename, "r") as script:
+        commandScript = script.readlines()
+
+    # Append them to the list of commands after parsing their arguments
+    for line_number, command in enumerate(commandScript, start=1):
+        script_args = command.strip()
+
+        # Only process non-blank and non-comment lines in the file.
+        if len(script_args) == 0 or script_args[0] == "#":
+            continue
+
+        # If we see "exit" we are done with this script.
+        if script_args.startswith("exit"):
+            break
+
+        # Invalid script commands - skip.
+        if script_args.startswith("config") or script_args.startswith("serve"):
+            logger.warning("config and serve commands are not permitted in script files - skipped")
+            continue
+
+        logger.debug("..script cmd: {}".format(script_args))
+
+        # Add this command to the list we will process later.  Go ahead
+        # and parse the commands to verify the arguments.
+        command_args = cmdparse.parse(script_args.split(" "))
+
+        # Remember where the command came from for the --parallel report.
+        command_args.script_line = line_number
+        command_args.script_text = script_args
+
+        commands.append(command_args)
+
+    return commands
+
+def expand(args):
+    '''
+    Build the full list of commands for the parsed arguments - a script
+    expands to the commands it contains.  Returns None if a script is missing.
+    '''
+
+    if args.command != 'script':
+        return [ args ]  # We love lists to loop over.
+
+    return read_script(args.filename)
+
+def process(command_args):
+    """Hand a single command to the processor for its command group."""
+
+    if command_args.command == "spaces":
+        spaces.process(command_args)
+    elif command_args.command == "connections":
+        connections.process(command_args)
+    elif command_args.command == "users":
+        users.process(command_args)
+    elif command_args.command == "shares":
+        shares.process(command_args)
+
+def is_member_change(command_args):
+    return (command_args.command == "spaces" and command_args.subcommand == "member"
+            and command_args.member_subcommand in [ "add", "remove" ])
+
+def run(commands, parallel=None):
+    if parallel is not None and parallel > 1:
+        return run_parallel(commands, parallel)
+
+    # Member adds and removes are queued per space and saved with a single
+    # PUT - when the commands are done, or before any other command that
+    # might read the spaces.
+
+    session_config.dwc.start_member_queue()
+
+    try:
+        # Loop over the commands processing each with their own arguments.
+
+        for command_args in commands:
+            if command_args.command == "exit":
+                break
+
+            if not is_member_change(command_args):
+                session_config.dwc.flush_members()
+
+            process(command_args)
+    finally:
+        session_config.dwc.stop_member_queue()
+
+# ---- parallel scripts --------------------------------------------------------
+#
+# Each command is described by the tenant objects it reads and writes, as
+# (kind, name) pairs - e.g. ("space", "SALES") or ("connections", "*").  Two
+# commands conflict when one writes something the other reads or writes, and
+# a command only starts once every earlier command it conflicts with is done.
+
+EVERYTHING = { ("*", "*") }
+
+def space_names(names, query=False):
+    # A search pattern could match any space.
+
+    if query or names is None or len(names) == 0:
+        return [ "*" ]
+
+    if isinstance(names, str):
+        names = [ names ]
+
+    return [ name.upper() for name in names ]
+
+def output_files(command_args):
+    # List commands writing files (or HANA tables) are named by their prefix.
+
+    if getattr(command_args, "directory", None) is None and getattr(command_args, "format", "text") == "text":
+        return set()
+
+    return { ("output", str(command_args.prefix).upper()) }
+
+def command_resources(command_args):
+    '''Return the (reads, writes) sets of the tenant objects a command touches.'''
+
+    command = command_args.command
+    subcommand = getattr(command_args, "subcommand", None)
+    query = getattr(command_args, "query", False)
+
+    if command == "users" and subcommand == "list":
+        return { ("users", "*") }, output_files(command_args)
+
+    if command == "spaces":
+        if subcommand == "list":
+            spaces = { ("space", name) for name in space_names(command_args.spaceID, query) }
+
+            # Extended lists may add the current user to the spaces for a while.
+            if command_args.extend or command_args.add:
+                return { ("users", "*") }, spaces | output_files(command_args)
+
+            return spaces, output_files(command_args)
+
+        if subcommand in [ "create", "delete" ]:
+            names = space_names(command_args.spaceID)
+            reads = { ("users", "*") }
+
+            if subcommand == "create" and command_args.template is not None:
+                reads.add(("space", command_args.template.upper()))
+
+            # A space takes its connections and shares with it.
+            return reads, { (kind, name) for name in names for kind in [ "space", "connections", "shares" ] }
+
+        if subcommand == "member":
+            if command_args.member_subcommand == "list":
+                return { ("space", name) for name in space_names(command_args.spaceID, query) } | { ("users", "*") }, output_files(command_args)
+
+            if command_args.member_subcommand in [ "add", "remove" ]:
+                names = space_names(command_args.spaceID, query and command_args.member_subcommand == "remove")
+
+                return { ("users", "*") }, { ("space", name) for name in names }
+
+    if command == "connections":
+        if subcommand == "list":
+            names = space_names(command_args.spaceID, query)
+
+            return { (kind, name) for name in names for kind in [ "space", "connections" ] }, output_files(command_args)
+
+        if subcommand in [ "create", "delete" ]:
+            names = space_names(command_args.targetSpace, query)
+
+            return { ("space", name) for name in names }, { ("connections", name) for name in names }
+
+    if command == "shares":
+        if subcommand == "list":
+            names = space_names(command_args.sourceSpace, query)
+
+            return { (kind, name) for name in names for kind in [ "space", "shares" ] }, output_files(command_args)
+
+        if subcommand == "create":
+            names = space_names(command_args.sourceSpace) + space_names(command_args.targetSpace, query)
+
+            return { ("space", name) for name in names }, { ("shares", name) for name in names }
+
+    # Anything else (e.g., a bulk operation) waits for, and holds up, everything.
+
+    return set(), EVERYTHING
+
+def overlaps(first, second):
+    for first_kind, first_name in first:
+        for second_kind, second_name in second:
+            if first_kind != second_kind and "*" not in [ first_kind, second_kind ]:
+                continue
+
+            if first_name == second_name or "*" in [ first_name, second_name ]:
+                return True
+
+    return False
+
+def conflicts(first, second):
+    first_reads, first_writes = first
+    second_reads, second_writes = second
+
+    return overlaps(first_writes, second_reads | second_writes) or overlaps(second_writes, first_reads)
+
+class ScriptOutput:
+    '''
+    Stands in for sys.stdout while script lines run in parallel - each
+    thread writes to the buffer of the line it is running, and the buffers
+    are written out in script order.  Text and bytes written to the binary
+    buffer (e.g., gzip output) share the buffer of the line, so they stay
+    in the order they were written.
+    '''
+
+    def __init__(self, target):
+        self.target = target
+        self.local = threading.local()
+
+    @property
+    def buffer(self):
+        line_buffer = getattr(self.local, "line_buffer", None)
+
+        return self.target.buffer if line_buffer is None else line_buffer
+
+    def write(self, text):
+        line_buffer = getattr(self.local, "line_buffer", None)
+
+        if line_buffer is None:
+            return self.target.write(text)
+
+        line_buffer.write(text.encode(self.target.encoding or "utf-8", self.target.errors or "strict"))
+
+        return len(text)
+
+    def flush(self):
+        if getattr(self.local, "line_buffer", None) is None:
+            self.target.flush()
+
+    def write_line(self, data):
+        # The output of a finished line, on the thread running the script.
+
+        if not hasattr(self.target, "buffer"):
+            self.target.write(data.decode(self.target.encoding or "utf-8"))
+            return
+
+        self.target.flush()
+        self.target.buffer.write(data)
+        self.target.buffer.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+# The processors log their errors and carry on - the error records logged
+# while a script line runs are collected here to decide if the line failed.
+line_errors = contextvars.ContextVar("line_errors", default=None)
+
+class LineErrors(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        errors = line_errors.get()
+
+        if errors is not None:
+            errors.append(record)
+
+def run_line(output, command_args):
+    output.local.line_buffer = io.BytesIO()
+    errors = line_errors.set([])
+
+    t0 = time.perf_counter()
+
+    try:
+        process(command_args)
+        status = "ok" if len(line_errors.get()) == 0 else "failed"
+    except Exception as e:
+        logger.error(f"line {getattr(command_args, 'script_line', '?')} failed - {type(e).__name__}: {e}")
+        status = "failed"
+    finally:
+        data = output.local.line_buffer.getvalue()
+        output.local.line_buffer = None
+
+        line_errors.reset(errors)
+
+    return { "status" : status, "seconds" : time.perf_counter() - t0, "output" : data }
+
+def run_parallel(commands, parallel):
+    '''
+    Run up to "parallel" commands at a time.  Commands that conflict keep
+    their script order, and a command is skipped if one it depends on failed -
+    raised an exception or logged an error.
+    Member changes are not queued here - each one is saved as it runs.
+    '''
+
+    for index, command_args in enumerate(commands):
+        if command_args.command == "exit":
+            commands = commands[:index]
+            break
+
+    resources = [ command_resources(command_args) for command_args in commands ]
+    depends = [ [ earlier for earlier in range(index) if conflicts(resources[earlier], resources[index]) ]
+                for index in range(len(commands)) ]
+
+    results = [ None ] * len(commands)
+    waiting = list(range(len(commands)))
+    running = {}
+    next_output = 0
+
+    output = ScriptOutput(sys.stdout)
+    sys.stdout = output
+
+    error_handler = LineErrors()
+    logging.getLogger().addHandler(error_handler)
+
+    try:
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            while len(waiting) > 0 or len(running) > 0:
+                # Start every command whose dependencies are done - the
+                # dependencies are always earlier lines, so one pass is enough.
+
+                for index in list(waiting):
+                    if any(results[earlier] is None for earlier in depends[index]):
+                        continue
+
+                    waiting.remove(index)
+
+                    if any(results[earlier]["status"] != "ok" for earlier in depends[index]):
+                        results[index] = { "status" : "skipped", "seconds" : 0, "output" : b"" }
+                    else:
+                        running[pool.submit(run_line, output, commands[index])] = index
+
+                if len(running) > 0:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        results[running.pop(future)] = future.result()
+
+                # Write the output of the finished lines, in script order.
+
+                while next_output < len(results) and results[next_output] is not None:
+                    output.write_line(results[next_output]["output"])
+                    next_output += 1
+    finally:
+        sys.stdout = output.target
+
+        logging.getLogger().removeHandler(error_handler)
+
+    print(f"{'line':>5} {'status':<8} {'seconds':>9}  command", file=sys.stderr)
+
+    for index, command_args in enumerate(commands):
+        print(f"{getattr(command_args, 'script_line', index + 1):>5} {results[index]['status']:<8} {results[index]['seconds']:>9.3f}  "
+              f"{getattr(command_args, 'script_text', command_args.command)}", file=sys.stderr)
+
+    return all(result["status"] == "ok" for result in results)
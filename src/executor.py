@@ -0,0 +1,55 @@
+import contextvars, logging, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import session_config
+
+logger = logging.getLogger("executor")
+
+def map_ordered(function, items, workers=None):
+    '''
+    Call the function for each item using a bounded pool of threads and
+    return the results in the same order as the items.  With one worker,
+    or only one item, the calls are made serially on the current thread.
+    '''
+
+    if workers is None:
+        workers = session_config.workers
+
+    items = list(items)  # We love lists - and we need the length.
+
+    if workers <= 1 or len(items) <= 1:
+        return [ function(item) for item in items ]
+
+    logger.debug(f"map_ordered: {len(items)} item(s) - {workers} worker(s)")
+
+    # The pool hands back the results in submission order; an exception
+    # in any call is raised here, just like the serial loop.  Each call runs
+    # in a copy of the caller's context, so context variables (e.g., the
+    # errors of a script line) follow the work onto the pool threads.
+
+    contexts = [ contextvars.copy_context() for _ in items ]
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(lambda context, item: context.run(function, item), contexts, items))
+
+class RateLimiter:
+    '''
+    Space out calls to acquire() so no more than "rate" calls per second
+    get through, no matter how many threads are calling.
+    '''
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def acquire(self):
+        # Reserve the next slot, then wait for it outside the lock.
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time)
+            self.next_time = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
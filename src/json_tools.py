@@ -1,4 +1,4 @@
-import logging, re
+import functools, logging, re
 
 logger = logging.getLogger("json_tools")
 
@@ -13,70 +13,214 @@ logger = logging.getLogger("json_tools")
 # [start:end:step] array slice operator borrowed from ES4.
 # ?()              applies a filter (script) expression.
 # ()               script expression, using the underlying script engine.
+#
+# Supported here: $, ., .., *, [n], [*], [n,m] / ['a','b'] and [start:end:step].
+# A subscript returns a list - [n] is the one element list [ value[n] ].  After
+# a recursive descent, the following steps apply to every value found.
+
+# Compiled paths are kept for reuse - templates use the same few paths for every row.
+CONST_PATH_CACHE_SIZE = 1024
 
 def json_path(data, field):
     if not isinstance(field, str) or len(field.strip()) == 0:
         logger.error("json_value: invalid JSON spec".format(str(field)))
         return None
 
-    # Always return None if the lookup fails.    
+    return compile_path(field.strip())(data)
+
+def parse_selector(selector):
+    # The text between the brackets of a subscript.
+
+    selector = selector.strip()
+
+    if selector == "*":
+        return ("all", None)
+
+    if ":" in selector:
+        bounds = [ int(bound) if len(bound.strip()) > 0 else None for bound in selector.split(":") ]
+        return ("slice", slice(*bounds))
+
+    items = [ item.strip() for item in selector.split(",") ]
+    items = [ item[1:-1] if len(item) > 1 and item[0] == item[-1] and item[0] in "'\"" else
+              int(item) if re.fullmatch(r"-?\d+", item) else item for item in items ]
+
+    if len(items) > 1:
+        return ("union", items)
+
+    if isinstance(items[0], str):
+        return ("name", items[0])
+
+    return ("index", items[0])
+
+def parse_path(spec):
+    # Turn the path into a list of steps: (operation, name, selector).
+
+    steps = []
+    path_specs = spec.split(".")
+
+    descend = False
+
+    for path_indx, path_spec in enumerate(path_specs):
+        # An empty step between two dots is a recursive descent into the next step.
+
+        if path_spec == "" and path_indx not in [ 0, len(path_specs) - 1 ]:
+            descend = True
+            continue
+
+        selector = None
+        name = path_spec
+
+        if path_spec.find("[") != -1 and path_spec.endswith("]"):
+            name = path_spec[0:path_spec.find("[")]
+            selector = parse_selector(re.search(r"\[(.*?)\]", path_spec).group(1))
+
+        if descend:
+            steps.append(("descend", name, selector))
+            descend = False
+        elif path_spec == "$":
+            steps.append(("root", None, None))
+        elif path_spec.startswith("*"):  # Expecting a dictionary or list
+            steps.append(("search", None, None))
+        elif selector is not None:
+            steps.append(("subscript", name, selector))
+        else:
+            steps.append(("key", name, None))
+
+    return steps
+
+def select(value, selector):
+    # Apply a subscript - the result is a list, except for a single ['name'].
+
+    operation, argument = selector
+
+    if operation == "all":
+        return value
+
+    if operation == "index":
+        if len(value) == 0 or argument > len(value) - 1:
+            return None
+
+        return [ value[argument] ]
+
+    if operation == "slice":
+        return value[argument]
+
+    if operation == "name":
+        return value.get(argument) if isinstance(value, dict) else None
+
+    if isinstance(value, dict):
+        return [ value[item] for item in argument if item in value ]
+
+    return [ value[item] for item in argument if isinstance(item, int) and -len(value) <= item < len(value) ]
+
+def descend(value, name, found):
+    # Every value for "name" (or every value for "*") at any depth.
+
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if name == "*" or key == name:
+                found.append(child)
+
+            descend(child, name, found)
+    elif isinstance(value, list):
+        for child in value:
+            descend(child, name, found)
+
+    return found
+
+def evaluate(steps, data):
     json_value = None
-    
-    # We want to be able to subscript the path elements as we loop - split on dot.
-    path_specs = field.strip().split(".")  
-    
-    for path_indx in range(len(path_specs)):
-        path_spec = path_specs[path_indx]
-        
-        if path_spec == "$":
+
+    # After a recursive descent json_value is a list of matches and every
+    # following step is applied to each match.
+    many = False
+
+    for operation, name, selector in steps:
+        if operation == "root":
             json_value = data
-        elif path_spec.startswith("*"):  # Expecting a dictionary
-            # Maybe we have a list of subscripts following the search
-            array_spec = re.search(r"\[(.*?)\]", path_spec)  
+        elif operation == "search":
+            if many:
+                search_value = []
+
+                for match in json_value:
+                    if isinstance(match, list):
+                        search_value.extend(match)
+                    elif isinstance(match, dict):
+                        search_value.extend(match.values())
+
+                return search_value
 
             # We must be on a dictionary or array.
             if isinstance(json_value, list):
                 return json_value
-            
+
             if isinstance(json_value, dict):
-                dict_value = []
-                
-                for key in json_value.keys():
-                    dict_value.append({ "key" : key, "value" : json_value[key] })
-                    
-                return dict_value
-        elif path_spec.find("[") != -1 and path_spec.endswith("]"):
-            array_spec = re.search(r"\[(.*?)\]", path_spec)
-            path_spec = path_spec[0:path_spec.find("[")]
-
-            json_value = json_value[path_spec]  # Pull out the array
-            
-            if array_spec.group(1) != "*":
-                array_index = int(array_spec.group(1))
-                
-                if len(json_value) == 0 or array_index > len(json_value) - 1:
-                    json_value = None
-                else:
-                    json_value = [ json_value[array_index] ]                
-        else:
-            if path_spec not in json_value:
-                logger.debug(f"json_value: invalid path - {path_spec}")
-                json_value = None
-                break
+                return [ { "key" : key, "value" : json_value[key] } for key in json_value.keys() ]
+        elif operation == "descend":
+            matches = descend(json_value, name, []) if not many else [ found for match in json_value for found in descend(match, name, []) ]
+
+            if selector is not None:
+                matches = flatten([ select(match, selector) for match in matches ], selector)
+
+            json_value = matches
+            many = True
+        elif operation == "subscript":
+            if many:
+                matches = [ match[name] if len(name) > 0 else match for match in json_value
+                            if len(name) == 0 or (isinstance(match, dict) and name in match) ]
+
+                json_value = flatten([ select(match, selector) for match in matches ], selector)
             else:
-                if json_value is None:
-                    logger.debug(f"json_value: invalid path {path_spec}")
-                    break
-                
-                json_value = json_value[path_spec]
-    
+                if len(name) > 0:
+                    json_value = json_value[name]  # Pull out the array
+
+                json_value = select(json_value, selector)
+        elif many:
+            json_value = [ match[name] for match in json_value if isinstance(match, dict) and name in match ]
+        else:
+            if name not in json_value:
+                logger.debug(f"json_value: invalid path - {name}")
+                return None
+
+            json_value = json_value[name]
+
     return json_value
 
-if __name__ == '__main__':
-    test_data = { "simpleField" : "simple fld value", 
-                 "subobj" : { "test" : "bob", 
-                               "members" : [ "mark", "sally" ] } }
-    
-    print(json_path(test_data, "$.simpleField"))
-    print(json_path(test_data, "$.subobj.members"))
-    
\ No newline at end of file
+def flatten(selected, selector):
+    # Combine the subscript results of many matches into one list.
+
+    if selector[0] == "name":
+        return [ value for value in selected if value is not None ]
+
+    return [ value for values in selected if values is not None for value in values ]
+
+@functools.lru_cache(maxsize=CONST_PATH_CACHE_SIZE)
+def compile_path(spec):
+    '''
+    Compile a JSONPath into a function returning the value of the path for
+    the data passed to it.  Compiled paths are cached by their text.
+    '''
+
+    steps = parse_path(spec.strip())
+
+    # Most paths are a chain of dictionary keys ("$.resources.memory.used") -
+    # give them a direct accessor.
+
+    if len(steps) > 0 and steps[0][0] == "root" and all(step[0] == "key" for step in steps[1:]):
+        keys = [ name for _, name, _ in steps[1:] ]
+
+        def get_keys(data):
+            json_value = data
+
+            for key in keys:
+                if key not in json_value:
+                    logger.debug(f"json_value: invalid path - {key}")
+                    return None
+
+                json_value = json_value[key]
+
+            return json_value
+
+        return get_keys
+
+    return functools.partial(evaluate, steps)
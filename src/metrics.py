@@ -0,0 +1,149 @@
+import importlib, json, logging, math, sys, threading, time
+
+logger = logging.getLogger("metrics")
+
+class RequestMetrics:
+    '''
+    Every request sent to the tenant is recorded as an event and aggregated
+    per endpoint (the url_name from DWCSession.urls).  Hooks are called with
+    each event so they can be forwarded to another metrics system.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.hooks = []
+
+    def add_hook(self, hook):
+        '''Call hook(event) for every request - the event is a dictionary.'''
+
+        self.hooks.append(hook)
+
+    def record(self, event):
+        with self.lock:
+            if event["url_name"] not in self.endpoints:
+                self.endpoints[event["url_name"]] = { "latencies" : [], "methods" : {}, "statuses" : {},
+                                                      "bytes_in" : 0, "bytes_out" : 0, "retries" : 0, "errors" : 0 }
+
+            endpoint = self.endpoints[event["url_name"]]
+
+            endpoint["latencies"].append(event["latency"])
+            endpoint["methods"][event["method"]] = endpoint["methods"].get(event["method"], 0) + 1
+            endpoint["statuses"][str(event["status"])] = endpoint["statuses"].get(str(event["status"]), 0) + 1
+            endpoint["bytes_in"] += event["bytes_in"]
+            endpoint["bytes_out"] += event["bytes_out"]
+            endpoint["retries"] += event["retries"]
+
+            if event["status"] is None or event["status"] >= 400:
+                endpoint["errors"] += 1
+
+        # A broken hook must not break the command.
+
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logger.warning(f"record: hook {hook} failed - {e}")
+
+    def summary(self):
+        '''Per endpoint counts, latency percentiles (seconds) and bytes.'''
+
+        with self.lock:
+            endpoints = { url_name : dict(endpoint, latencies=sorted(endpoint["latencies"])) for url_name, endpoint in self.endpoints.items() }
+
+        summary = {}
+
+        for url_name, endpoint in endpoints.items():
+            latencies = endpoint["latencies"]
+
+            summary[url_name] = { "count"       : len(latencies),
+                                  "p50"         : percentile(latencies, 50),
+                                  "p95"         : percentile(latencies, 95),
+                                  "p99"         : percentile(latencies, 99),
+                                  "max"         : latencies[-1] if latencies else 0,
+                                  "total_time"  : sum(latencies),
+                                  "bytes_in"    : endpoint["bytes_in"],
+                                  "bytes_out"   : endpoint["bytes_out"],
+                                  "total_bytes" : endpoint["bytes_in"] + endpoint["bytes_out"],
+                                  "retries"     : endpoint["retries"],
+                                  "errors"      : endpoint["errors"],
+                                  "methods"     : endpoint["methods"],
+                                  "statuses"    : endpoint["statuses"] }
+
+        return summary
+
+    def write_summary(self, filename=None):
+        '''Dump the summary as JSON to the file, or print a table to stderr.'''
+
+        summary = self.summary()
+
+        if filename is not None:
+            with open(filename, "w") as stats_file:
+                json.dump({ "endpoints" : summary }, stats_file, indent=2)
+
+            return
+
+        print(f"{'endpoint':<20} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'total s':>9} {'bytes':>12} {'retries':>7} {'errors':>6}", file=sys.stderr)
+
+        for url_name, endpoint in sorted(summary.items(), key=lambda item: item[1]["total_time"], reverse=True):
+            print(f"{url_name:<20} {endpoint['count']:>7} {endpoint['p50'] * 1000:>9.1f} {endpoint['p95'] * 1000:>9.1f} {endpoint['p99'] * 1000:>9.1f} "
+                  f"{endpoint['total_time']:>9.2f} {endpoint['total_bytes']:>12} {endpoint['retries']:>7} {endpoint['errors']:>6}", file=sys.stderr)
+
+    def attach(self, session, url_namer):
+        '''Record every response received by the requests session, including redirects.'''
+
+        def record_response(response, *args, **kwargs):
+            # The body has not been read yet - read it now so the bytes and
+            # the full transfer time are included.
+
+            t0 = time.perf_counter()
+
+            if kwargs.get("stream"):
+                bytes_in = int(response.headers.get("Content-Length", 0))
+            else:
+                bytes_in = len(response.content)
+
+            # Sent through DWCTransport, the latency runs from the first
+            # attempt - retries and the backoff between them included.
+            # Otherwise it is the last response and the time to read it.
+
+            started = getattr(response, "dwc_started", None)
+
+            if started is not None:
+                latency = time.perf_counter() - started
+            else:
+                latency = response.elapsed.total_seconds() + time.perf_counter() - t0
+
+            body = response.request.body or b""
+
+            self.record({ "url_name"  : url_namer(response.request.url),
+                          "method"    : response.request.method,
+                          "status"    : response.status_code,
+                          "bytes_in"  : bytes_in,
+                          "bytes_out" : len(body) if isinstance(body, bytes) else len(body.encode("utf-8")),
+                          "latency"   : latency,
+                          "retries"   : getattr(response, "dwc_retries", 0),
+                          "url"       : response.request.url })
+
+        session.hooks["response"].append(record_response)
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list.
+
+    if len(sorted_values) == 0:
+        return 0
+
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+
+    return sorted_values[rank - 1]
+
+def load_hook(hook_name):
+    '''Import a hook given as "module:function".'''
+
+    module_name, _, function_name = hook_name.partition(":")
+
+    try:
+        return getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError, ValueError) as e:
+        logger.error(f"load_hook: unable to load {hook_name} - {e}")
+        return None
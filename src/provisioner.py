@@ -8,12 +8,13 @@ major elements of the GUI are available for download:
 There are various options that can be set to control the operation of this script.
 """
 
-import os, sys, logging
+import sys, logging
 
 import session_config
-import cmdparse, connections, spaces, shares, users, utility
+import cmdparse, constants, dispatch, metrics, server, utility
 
 from session import DWCSession
+from snapshot import SnapshotCache
 
 logger = logging.getLogger("dwc_tool")
 
@@ -39,80 +40,95 @@ if __name__ == '__main__':
     # Update our logging level based on the configuration we just loaded.
     logger.setLevel(session_config.log_level)        
     
-    # Build the full list of commands, including multiple commands
-    # coming from a script.
-    
-    commands = []  # We love lists to loop over.
+    # A server is running these commands for us - hand the command line over.
 
-    # Check if a script was provided on the command line.  If so, the
-    # commands in the script file will be added to the commands to
-    # run - in addition to the global parameters.
+    if args.socket is not None and args.command != "serve":
+        options = server.unsupported_options(args)
 
-    if args.command != 'script':
-        commands.append(args)
-    else:
-        if not os.path.exists(args.filename):
-            logger.fatal("Script {} not found.".format(args.filename))
+        if len(options) > 0:
+            logger.error(f"{', '.join(options)} cannot be used with --socket - the server runs with its own settings.")
             sys.exit(1)
 
-        # Read all the commands from the script - stop if we
-        # encounter the "exit" command.  Also, skip any "config"
-        # commands.
+        if not server.forward(args.socket, sys.argv[1:]):
+            sys.exit(1)
 
-        with open(args.filename, "r") as script:
-            commandScript = script.readlines()
-    
-        # Append them to the list of commands after parsing their arguments
-        for command in commandScript:
-            script_args = command.strip()
+        sys.exit(0)
 
-            # Only process non-blank and non-comment lines in the file.
-            if len(script_args) == 0 or script_args[0] == "#":   
-                continue
-            
-            # If we see "exit" we are done with this script.
-            if script_args.startswith("exit"):
-                break
-            
-            # Invalid script commands - skip.    
-            if script_args.startswith("config"):
-                logger.warning("config commands are not permitted in script files - skipped")
-                continue
-            
-            logger.debug("..script cmd: {}".format(script_args))
+    # Build the full list of commands, including multiple commands
+    # coming from a script.
 
-            # Add this command to the list we will process later.  Go ahead
-            # and parse the commands to verify the arguments.
-            script_args = script_args.split(" ")
-            commands.append(cmdparse.parse(script_args))
+    commands = dispatch.expand(args)
+
+    if commands is None:
+        sys.exit(1)
 
     # We are good to go, login to the DWC tenant
+
+    dwc_url = session_config.get_config_param("dwc", "dwc_url")
+    dwc_user = session_config.get_config_param("dwc", "dwc_user")
+
+    # Responses may be reused from the on-disk snapshot of this tenant.
+
+    snapshot = SnapshotCache(directory=session_config.get_cache_dir(),
+                             tenant=f"{dwc_url}|{dwc_user}",
+                             ttl=session_config.get_config_number("cache", "cache_ttl", 0),
+                             offline=session_config.offline)
     
     session_config.dwc = DWCSession(
-        url=session_config.get_config_param("dwc", "dwc_url"), 
-        user=session_config.get_config_param("dwc", "dwc_user"), 
-        password=session_config.get_config_param("dwc", "dwc_password"))
+        url=dwc_url, 
+        user=dwc_user, 
+        password=session_config.get_config_param("dwc", "dwc_password"),
+        pool_size=session_config.workers,
+        timeout=(session_config.get_config_number("http", "http_connect_timeout", constants.CONST_HTTP_CONNECT_TIMEOUT),
+                 session_config.get_config_number("http", "http_read_timeout", constants.CONST_HTTP_READ_TIMEOUT)),
+        retries=session_config.get_config_number("http", "http_retries", constants.CONST_HTTP_RETRIES, int),
+        backoff=session_config.get_config_number("http", "http_backoff", constants.CONST_HTTP_BACKOFF),
+        snapshot=snapshot,
+        session_file=session_config.get_session_file())
     
     # Push the logging level into the DWC session.
     session_config.dwc.setLevel(logger.getEffectiveLevel())
 
-    # Start the interaction with DWC by logging in.
+    # Forward the request events to any hooks given on the command line.
+
+    for hook_name in args.stats_hook or []:
+        hook = metrics.load_hook(hook_name)
+
+        if hook is None:
+            sys.exit(1)
+
+        session_config.dwc.metrics.add_hook(hook)
+
+    # Start the interaction with DWC by logging in.  Offline, there is no
+    # login - the user info must come from the snapshot.
 
-    if session_config.dwc.login() == False:
+    if session_config.offline:
+        session_config.dwc.set_user_info()
+
+        if session_config.dwc.dwc_user_info is None:
+            logger.fatal("No tenant snapshot found - run the command online with a cache_ttl configured first.")
+            sys.exit(1)
+    elif session_config.dwc.login() == False:
         sys.exit(1)
         
-    # Loop over the commands processing each with their own arguments.
-    
-    for command_args in commands:
-        if command_args.command == "spaces":
-            spaces.process(command_args)
-        elif command_args.command == "connections":
-            connections.process(command_args)
-        elif command_args.command == "users":
-            users.process(command_args)
-        elif command_args.command == "shares":
-            shares.process(command_args)
-        elif command_args.command == "exit":
-            break
+    # As a server, keep the session and run the commands sent by clients.
+
+    if args.command == "serve":
+        if not server.serve(args):
+            sys.exit(1)
+    else:
+        dispatch.run(commands, parallel=args.parallel if args.command == "script" else None)
         
     logger.info(utility.log_timer("dwc_tool", "DWC Operation"))
+
+    transport_stats = session_config.dwc.get_transport_stats()
+    logger.info("HTTP requests: {} - retries: {} - timeouts: {} - connection errors: {}".format(
+        transport_stats["requests"], transport_stats["retries"], transport_stats["timeouts"], transport_stats["connection_errors"]))
+
+    # Report where the time went, by endpoint.
+
+    if args.stats:
+        session_config.dwc.metrics.write_summary()
+
+    if args.stats_file is not None:
+        session_config.dwc.metrics.write_summary(args.stats_file)
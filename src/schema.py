@@ -0,0 +1,108 @@
+import logging
+
+logger = logging.getLogger("schema")
+
+# Column types, named for the HANA tables - the other writers map them to
+# their own types.
+TYPE_BIGINT = "BIGINT"
+TYPE_TIMESTAMP = "TIMESTAMP"
+TYPE_CLOB = "CLOB"
+TYPE_NVARCHAR = "NVARCHAR(5000)"
+
+timestamps = frozenset([ "createTime", "validFrom", "lastSuccessfulConnect", "lastInvalidConnectAttempt", "modification_date", "creation_date" ])
+date_fields = frozenset([ "LAST_LOGIN_DATE" ])
+
+# When a column has values of different types, the type of the column moves
+# along these steps and never back - any other mix keeps the current type.
+# There is no BIGINT to CLOB step, so the type depends on the order of the
+# values: an integer column stays BIGINT when a list comes along, but becomes
+# a CLOB if a string came first.
+PROMOTIONS = { (TYPE_BIGINT, TYPE_NVARCHAR) : TYPE_NVARCHAR,
+               (TYPE_NVARCHAR, TYPE_CLOB)   : TYPE_CLOB }
+
+def infer_schema(list_data, prefix):
+    """
+        Walk the rows, and the lists nested in them, once and return the
+        schema of every table: the columns in the order they were first seen,
+        each with its fixed name and type, and the list columns that hold the
+        rows of child tables.
+
+            { "DWC_USERS" : { "columns"  : { "userName" : { "name" : "userName", "type" : "NVARCHAR(5000)" }, ... },
+                              "children" : { "roles_list" : "DWC_USERS_ROLES_LIST" } },
+              "DWC_USERS_ROLES_LIST" : { ... } }
+    """
+
+    schema = {}
+
+    infer_table(schema, {}, list_data, prefix.upper())
+
+    logger.debug(f"infer_schema: {len(schema)} table(s) for {prefix.upper()}")
+
+    return schema
+
+def infer_table(schema, typed, list_data, table_name):
+    # Search through all the rows because some columns are not consistently
+    # returned by the URL/REST queries.  Looping over all the rows helps ensure
+    # we capture all the possible columns (attributes).
+
+    for row in list_data:
+        # Lists of "not dictionary" values (e.g., strings) are not tables.
+
+        if not isinstance(row, dict):
+            continue
+
+        if table_name not in schema:
+            schema[table_name] = { "columns" : {}, "children" : {} }
+
+        columns = schema[table_name]["columns"]
+        children = schema[table_name]["children"]
+        table_typed = typed.setdefault(table_name, set())
+
+        for column_name, value in row.items():
+            # Most values are one more of a kind the column has already seen,
+            # and change nothing until the type of the column changes - only
+            # lists need a look, for the rows of the child table.
+
+            column_class = (column_name, value.__class__)
+
+            if column_class in table_typed and value.__class__ is not list:
+                continue
+
+            table_typed.add(column_class)
+
+            if "@" in column_name:  # Exclude metadata columns.
+                continue
+
+            if isinstance(value, int):
+                column_type = TYPE_BIGINT
+            elif column_name in timestamps or column_name in date_fields:
+                column_type = TYPE_TIMESTAMP
+            elif isinstance(value, (list, dict)):
+                column_type = TYPE_CLOB
+
+                # Every list may add columns to the child table, not just the first one.
+
+                if isinstance(value, list):
+                    child_name = children.get(column_name)
+
+                    if child_name is None:
+                        child_name = children[column_name] = (table_name + "_" + column_name).upper()
+
+                    infer_table(schema, typed, value, child_name)
+            else:
+                column_type = TYPE_NVARCHAR
+
+            column = columns.get(column_name)
+
+            if column is None:
+                # Fix the name of the column to match the DDL; remove special characters.
+                columns[column_name] = { "name" : column_name.replace("#", "z"), "type" : column_type }
+            elif column["type"] != column_type:
+                column_type = PROMOTIONS.get((column["type"], column_type), column["type"])
+
+                if column_type != column["type"]:
+                    column["type"] = column_type
+
+                    # The other kinds of value in this column may move the new type on.
+                    table_typed.difference_update([ typed_class for typed_class in table_typed
+                                                    if typed_class[0] == column_name and typed_class != column_class ])
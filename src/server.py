@@ -0,0 +1,204 @@
+import contextlib, io, json, logging, os, signal, socket, socketserver, sys, threading, time, traceback
+
+import session_config
+import cmdparse, dispatch, utility
+
+logger = logging.getLogger("server")
+
+def unsupported_options(args):
+    '''
+    The global options a server cannot apply to one command - the logging,
+    snapshot and request statistics belong to the server process.  --workers
+    is applied to each command.
+    '''
+
+    options = [ ("--logging",    args.logging is not None),
+                ("--offline",    args.offline),
+                ("--stats",      args.stats),
+                ("--stats-file", args.stats_file is not None),
+                ("--stats-hook", args.stats_hook is not None) ]
+
+    return [ option for option, given in options if given ]
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    '''
+    Run one command line received from a client.  The client sends a single
+    JSON line { "argv" : [...], "cwd" : "..." } and receives the command output
+    until the server closes the connection.
+    '''
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            argv = request["argv"]
+        except (ValueError, KeyError):
+            logger.error("handle: invalid request from client")
+            return
+
+        output = io.TextIOWrapper(self.wfile, encoding="utf-8", line_buffering=True)
+
+        # Commands run one at a time - they share the session, its caches
+        # and the working directory of the process.
+
+        with self.server.command_lock:
+            self.server.refresh()
+
+            logger.info(f"command: {' '.join(argv)}")
+            utility.start_timer("server_command")
+
+            cwd = os.getcwd()
+
+            try:
+                os.chdir(request.get("cwd", cwd))
+
+                with contextlib.redirect_stdout(output):
+                    self.server.run(argv)
+            except SystemExit:
+                pass  # argparse exits on --help and bad arguments.
+            except Exception:
+                logger.error(f"command failed: {' '.join(argv)}")
+                output.write(traceback.format_exc())
+            finally:
+                os.chdir(cwd)
+
+            logger.info(utility.log_timer("server_command", f"command: {' '.join(argv)} complete"))
+
+        try:
+            output.flush()
+            output.detach()
+        except (OSError, ValueError):
+            pass  # The client went away.
+
+class CommandServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, refresh):
+        self.command_lock = threading.Lock()
+        self.refresh_seconds = refresh
+        self.refreshed = time.time()
+
+        super().__init__(socket_path, CommandHandler)
+
+    def refresh(self):
+        # The tenant changes behind our back - periodically drop the warm
+        # caches and make sure the session is still logged in.
+
+        if self.refresh_seconds <= 0 or time.time() - self.refreshed < self.refresh_seconds:
+            return
+
+        logger.info("refresh: dropping cached spaces and users")
+
+        session_config.dwc.invalidate_caches()
+        session_config.dwc.login()
+
+        self.refreshed = time.time()
+
+    def run(self, argv):
+        args = cmdparse.parse(argv)
+
+        if args.command in [ None, "config", "serve" ]:
+            logger.warning(f"run: {args.command} commands are not permitted on the server - skipped")
+            return
+
+        options = unsupported_options(args)
+
+        if len(options) > 0:
+            logger.warning(f"run: {', '.join(options)} not supported by the server - skipped")
+            print(f"error: {', '.join(options)} cannot be used with --socket - the command was not run")
+            return
+
+        commands = dispatch.expand(args)
+
+        if commands is None:
+            return
+
+        # The workers asked for apply to this command only, up to the size
+        # of the connection pool the session was created with.
+
+        workers = session_config.workers
+
+        if args.workers is not None:
+            session_config.workers = min(max(1, args.workers), session_config.dwc.transport.pool_size)
+
+        try:
+            dispatch.run(commands, parallel=args.parallel if args.command == "script" else None)
+        finally:
+            session_config.workers = workers
+
+            # Drop anything a change to the tenant may have made stale.
+
+            if any(cmdparse.is_mutating(command) for command in commands):
+                session_config.dwc.invalidate_caches()
+
+def serve(args):
+    logger.setLevel(session_config.log_level)
+
+    if not hasattr(socket, "AF_UNIX"):
+        logger.fatal("serve: Unix domain sockets are not available on this platform.")
+        return False
+
+    socket_path = args.socket
+
+    if socket_path is None:
+        socket_path = os.path.join(os.path.dirname(session_config.config_file), "provisioner.sock")
+
+    # A socket left behind by a previous server is in the way.
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # Only the owner may send commands to the server - the socket is
+    # created without permissions for anyone else, so there is no window
+    # before a chmod when others could connect.
+
+    umask = os.umask(0o177)
+
+    try:
+        server = CommandServer(socket_path, args.refresh)
+    finally:
+        os.umask(umask)
+
+    print(f"provisioner server listening on {socket_path}")
+
+    # Shut down cleanly when stopped with kill.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+    return True
+
+def forward(socket_path, argv):
+    '''Send a command line to the server and copy its output to stdout.'''
+
+    if not hasattr(socket, "AF_UNIX"):
+        logger.error("forward: Unix domain sockets are not available on this platform.")
+        return False
+
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+    except OSError as e:
+        logger.error(f"forward: unable to reach the server at {socket_path} - {e}")
+        return False
+
+    with client:
+        request = json.dumps({ "argv" : argv, "cwd" : os.getcwd() }) + "\n"
+        client.sendall(request.encode("utf-8"))
+
+        while True:
+            data = client.recv(65536)
+
+            if not data:
+                break
+
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+    return True
@@ -1,10 +1,13 @@
 from bs4 import BeautifulSoup
 from os.path import exists
 
-import requests, urllib, urllib3, subprocess
-import logging, time, json, re, copy
+import requests, urllib, urllib3, subprocess, os
+import logging, time, json, re, copy, threading
 
-import utility
+import constants, executor, utility
+from metrics import RequestMetrics
+from transport import DWCTransport
+from snapshot import SnapshotCache
 
 logger = logging.getLogger("session")
 
@@ -12,7 +15,10 @@ class DWCSession:
     # Since we are impersonating a browser we need to identify what kind.
     headers = { 'User-Agent' : 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:63.0) Gecko/20100101 Firefox/63.0' }
 
-    def __init__(self, url, user, password):
+    def __init__(self, url, user, password, pool_size=constants.CONST_DEFAULT_WORKERS,
+                 timeout=(constants.CONST_HTTP_CONNECT_TIMEOUT, constants.CONST_HTTP_READ_TIMEOUT),
+                 retries=constants.CONST_HTTP_RETRIES, backoff=constants.CONST_HTTP_BACKOFF, snapshot=None,
+                 session_file=None):
         logger.debug("ENTERING: DWCSession (__init__)")
 
         self.urls = { "authenticate"      : "#dwc_url/dwaas-ui/index.html",
@@ -27,9 +33,20 @@ class DWCSession:
                       "connection_delete" : "#dwc_url/dwaas-core/repository/remotes/{}?space_ids={}",
                       "remotetables"      : "#dwc_url/dwaas-core/monitor/{spaceID}/remoteTables?includeBusinessNames=true",
                       "businessbuilder"   : "#dwc_url/dwaas-core/c4s/internal_services/loadContent",
+                      "builder_objects"   : "#dwc_url/dwaas-core/repository/search/$all?{query}",
+                      "dbuser_objects"    : "#dwc_url/dwaas-core/datasources/getchildren?path={path}&space={spaceID}",
                       "users"             : "#dwc_url/sap/fpa/services/rest/epm/security/list/users?detail=true&parameter=key_value&includePending=true&forceLicensingCheck=true&tenant={tenant_id}"
                     }
 
+        # Read-only requests that may be served from the on-disk snapshot.
+
+        self.snapshot_urls = [ "logon", "spaces", "spaces_resources", "users", "space", "connections", "share_list",
+                               "remotetables", "businessbuilder", "builder_objects", "dbuser_objects" ]
+
+        # Without a snapshot configured, use a disabled one - nothing is cached.
+
+        self.snapshot = snapshot if snapshot is not None else SnapshotCache()
+
         # To eliminate lots of warning messages, disable the SSL cert validation.
         # This could be eliminated if we updated the cert chain for Python with
         # the SAP trusted authority.
@@ -42,14 +59,50 @@ class DWCSession:
         self.dwc_url = url
         self.dwc_user_info = None
 
+        # Authenticated sessions are saved here and reused by later runs.
+        self.session_file = session_file
+        self.passcode_url = None
+
+        # Each cache is a (list, index) pair, replaced as a whole - a reader
+        # takes the pair once and never sees a list with another list's index.
+
         self.spaces_cache = None
         self.users_cache = None
 
+        # Commands may fan out requests across threads - the caches are
+        # filled once, under a lock, no matter how many threads ask.
+
+        self.cache_lock = threading.RLock()
+
+        # While a run is queuing member changes, this holds each changed
+        # space (and its original members) until flush_members saves it.
+
+        self.member_queue = None
+
         # Instantiate a "requests" session - no network traffic happens here.
         # The Session object handles the HTTP(s) and cookie processing.
 
         self.session = requests.Session()
-        self.session.headers = self.headers
+        self.session.headers = dict(self.headers)
+
+        # Mount the pooled, retrying transport for all tenant traffic.  The pool
+        # is sized to the number of concurrent workers that may share it.
+
+        self.transport = DWCTransport(pool_size=max(pool_size, 1),
+                                      connect_timeout=timeout[0],
+                                      read_timeout=timeout[1],
+                                      retries=retries,
+                                      backoff=backoff)
+
+        self.session.mount("https://", self.transport)
+        self.session.mount("http://", self.transport)
+
+        # Record every request by endpoint - see get_url_name.
+
+        self.url_patterns = self.build_url_patterns()
+
+        self.metrics = RequestMetrics()
+        self.metrics.attach(self.session, self.get_url_name)
 
         logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s %(message)s")
         self.logger = logging.getLogger('dwc-session')
@@ -72,9 +125,58 @@ class DWCSession:
         # Get the specified URL from the DWC urls.  Update the tenant prefix
         return self.urls[url_name].replace("#dwc_url", self.dwc_url)
 
+    def build_url_patterns(self):
+        # Turn each URL template into a pattern for its path (placeholders
+        # match one path segment) plus the names of its query parameters.
+
+        url_patterns = []
+
+        for url_name, url_template in self.urls.items():
+            template = urllib.parse.urlsplit(url_template.replace("#dwc_url", "http://tenant"))
+
+            path_pattern = re.sub(r"\\\{[^}]*\\\}", "[^/]+", re.escape(template.path))
+            query_names = [ parameter.split("=")[0] for parameter in template.query.split("&") if "=" in parameter ]
+
+            url_patterns.append((url_name, re.compile(path_pattern + "$"), query_names))
+
+        return url_patterns
+
+    def get_url_name(self, url):
+        # Find the url_name for a request.  When several templates share a path
+        # (shares and share_list) the one with the most matching query
+        # parameters wins.  Anything else, i.e., the login pages, is named by path.
+
+        parsed = urllib.parse.urlsplit(url)
+        query_names = set(urllib.parse.parse_qs(parsed.query, keep_blank_values=True).keys())
+
+        best_name = None
+        best_score = -1
+
+        for url_name, path_pattern, template_names in self.url_patterns:
+            if path_pattern.match(parsed.path) is None:
+                continue
+
+            if not all(name in query_names for name in template_names):
+                continue
+
+            if len(template_names) > best_score:
+                best_name = url_name
+                best_score = len(template_names)
+
+        return best_name if best_name is not None else parsed.path
+
     def login(self):
         t0 = time.perf_counter()
 
+        # A saved session from an earlier run saves the whole SAML conversation.
+
+        if self.restore_session():
+            self.elapsed = time.perf_counter() - t0
+
+            logger.debug(f"reusing saved session for {self.j_username}")
+
+            return True
+
         url = self.get_url('authenticate')
         logger.debug("login url: %s" % url)
 
@@ -170,6 +272,9 @@ class DWCSession:
     
             self.set_user_info()
 
+            # Save the authenticated session for the next run.
+            self.save_session()
+
             return True
         
         except Exception as e:
@@ -177,6 +282,90 @@ class DWCSession:
 
             return False
 
+    def restore_session(self):
+        # Load the cookies saved by an earlier run and prove they still work
+        # with one request - the user info request we need anyway.
+
+        if self.session_file is None or not exists(self.session_file):
+            return False
+
+        try:
+            with open(self.session_file, "r") as session_handle:
+                saved_session = json.load(session_handle)
+        except (OSError, ValueError):
+            logger.warning(f"restore_session: {self.session_file} is unreadable - logging in.")
+            return False
+
+        # The saved session must be for this tenant and this user.
+
+        if saved_session.get("dwc_url") != self.dwc_url or saved_session.get("user") != self.j_username:
+            return False
+
+        for cookie in saved_session.get("cookies", []):
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"],
+                                     secure=cookie["secure"], expires=cookie["expires"])
+
+        self.passcode_url = saved_session.get("passcode_url")
+
+        logon_url = self.get_url("logon")
+
+        try:
+            response = self.session.get(logon_url, verify=False, allow_redirects=False)
+            user_info = json.loads(response.text) if response.status_code == 200 else None
+        except (requests.exceptions.RequestException, ValueError):
+            user_info = None
+
+        if not isinstance(user_info, dict) or "user" not in user_info:
+            # The session has expired - start over with a clean cookie jar.
+            logger.debug("restore_session: saved session expired.")
+
+            self.session.cookies.clear()
+            self.passcode_url = None
+
+            return False
+
+        self.dwc_user_info = user_info
+
+        # This request skipped get_json - record the user info in the snapshot
+        # just like a login would, so a later --offline run can find it.
+        self.snapshot.put("logon", logon_url, user_info)
+
+        # The tenant may have refreshed the cookies - keep the latest.
+        self.save_session()
+
+        return True
+
+    def save_session(self):
+        if self.session_file is None:
+            return
+
+        cookies = []
+
+        for cookie in self.session.cookies:
+            cookies.append({ "name"    : cookie.name,
+                             "value"   : cookie.value,
+                             "domain"  : cookie.domain,
+                             "path"    : cookie.path,
+                             "secure"  : cookie.secure,
+                             "expires" : cookie.expires })
+
+        saved_session = { "dwc_url"      : self.dwc_url,
+                          "user"         : self.j_username,
+                          "passcode_url" : self.passcode_url,
+                          "cookies"      : cookies }
+
+        # The cookies are as good as a password - only the owner may read the file.
+
+        try:
+            session_fd = os.open(self.session_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+            with os.fdopen(session_fd, "w") as session_handle:
+                json.dump(saved_session, session_handle)
+
+            os.chmod(self.session_file, 0o600)
+        except OSError as e:
+            logger.warning(f"save_session: unable to save session to {self.session_file} - {e}")
+
     def set_user_info(self):
         # After the logon, DWC always asks for the user info, we are
         # replicating that request.  This request also returns the
@@ -200,6 +389,10 @@ class DWCSession:
         # If not otherwise reqe
         if user is None:
             lookup_user = self.get_user_info()
+
+        # A plain string is already a user name.
+        if isinstance(lookup_user, str):
+            return lookup_user
             
         if "userName" in lookup_user:
             return lookup_user["userName"]
@@ -207,30 +400,63 @@ class DWCSession:
         return None
     
     def get_spaces(self, force=False):
+        return self.get_spaces_cache(force=force)[0]
+
+    def get_spaces_cache(self, force=False):
         # Assume this operation does not need to be repeated during this
         # session - cache the first response unless asked to force a reload.
+        # Returns the (spaces, index) pair - see set_spaces_cache.
 
-        if force == False and self.spaces_cache is not None:
-            return self.spaces_cache
+        spaces_cache = self.spaces_cache
 
-        # Query for a list of all spaces in the tenant.  Note: this
-        # operation is valid regardless of whether the current user
-        # is a member of any particular space.
+        if force == False and spaces_cache is not None:
+            return spaces_cache
+
+        with self.cache_lock:
+            # Another thread may have filled the cache while we waited.
+            spaces_cache = self.spaces_cache
+
+            if force == False and spaces_cache is not None:
+                return spaces_cache
+
+            # Query for a list of all spaces in the tenant.  Note: this
+            # operation is valid regardless of whether the current user
+            # is a member of any particular space.
+
+            spaces = self.get_results(self.get_json('spaces'), "results")
+
+            # As a separate query, ask for the utilization of the spaces.
+            return self.set_spaces_cache(spaces, self.get_json('spaces_resources'))
+
+    def set_spaces_cache(self, spaces, spaces_resources):
+        # Called with the cache_lock held.
+
+        self.spaces_resources_cache = spaces_resources
+
+        if not isinstance(self.spaces_resources_cache, dict):
+            self.spaces_resources_cache = {}
 
-        self.spaces_cache = self.get_json('spaces')["results"]
-        
-        # As a separate query, ask for the utilization of the spaces.
-        self.spaces_resources_cache = self.get_json('spaces_resources')
-        
         # Enrich the spaces with consumption information
-        for space in self.spaces_cache:
+        for space in spaces:
             if space["name"] in self.spaces_resources_cache:
                 space["resources"] = self.spaces_resources_cache[space["name"]]
             else:
                 space["resources"] = None
-            
+
+        # Publish the spaces and their index in one assignment.
+
+        self.spaces_cache = (spaces, self.index_spaces(spaces))
+
         return self.spaces_cache
 
+    def invalidate_caches(self):
+        # Forget the spaces and users - the next request reloads them.
+        # Threads already holding a cache pair finish with it.
+
+        with self.cache_lock:
+            self.spaces_cache = None
+            self.users_cache = None
+
     def get_space_guid(self, space_id):
         if space_id is None or not isinstance(space_id, str) or len(space_id) == 0:
             logger.error("get_space_guid: invalid space ID")
@@ -239,20 +465,43 @@ class DWCSession:
         # Search the available spaces by name and, if found return
         # the internal ID of the space.
 
-        spaces = self.get_spaces()
+        spaces, (by_name, by_id, names_upper) = self.get_spaces_cache()
 
-        for space in spaces:
-            if space["name"] == space_id or space["id"] == space_id:
-                return space["id"]
+        # When the value is both a name and an ID, the first space
+        # in the tenant list wins.
 
-        return None
+        positions = [ position for position in (by_name.get(space_id), by_id.get(space_id)) if position is not None ]
+
+        if len(positions) == 0:
+            return None
+
+        return spaces[min(positions)]["id"]
+
+    def index_spaces(self, spaces):
+        '''
+        Build the lookup structures for a list of spaces: hash maps of the
+        name and id values to the position of the space in the list, and the
+        upper case names for "contains" queries.
+        '''
+
+        by_name = {}
+        by_id = {}
+        names_upper = []
+
+        for position, space in enumerate(spaces):
+            by_name.setdefault(space["name"], position)
+            by_id.setdefault(space["id"], position)
+
+            names_upper.append(space["name"].upper())
+
+        return by_name, by_id, names_upper
         
     def query_spaces(self, search_list, query=True, force=False):
         # Locate the spaces identifed in the search list by comparing space
         # names. If "query" is true, use a "contains" test to match space names.
 
-        # Get all the known spaces in the tenant.
-        spaces = self.get_spaces(force=force)
+        # Get all the known spaces in the tenant, with their index.
+        spaces, (by_name, by_id, names_upper) = self.get_spaces_cache(force=force)
 
         # If no list is provided, return all spaces.
         if search_list is None:
@@ -273,19 +522,17 @@ class DWCSession:
             search_list = [ search_list ]
 
         for search_space_name in search_list:
-            matched = False
+            if query:
+                search_upper = search_space_name.upper()
 
-            for space in spaces:
-                if query:
-                    if space["name"].upper().find(search_space_name.upper()) != -1:
-                        return_list.append(space)
-                        matched = True
-                else:
-                    if space["name"] == search_space_name:
-                        return_list.append(space)
-                        matched = True
-                        
-                        break  # This specific space has been included, we are done looking
+                for position in range(len(names_upper)):
+                    if names_upper[position].find(search_upper) != -1:
+                        return_list.append(spaces[position])
+            else:
+                position = by_name.get(search_space_name)
+
+                if position is not None:
+                    return_list.append(spaces[position])
 
         return return_list
 
@@ -300,7 +547,7 @@ class DWCSession:
         else:
             return True
         
-    def get_space(self, space_name, query=False):
+    def get_space(self, space_name, query=False, use_snapshot=True):
         fixed_space_name = self.fix_space_name(space_name)
 
         # Lookup the SPACE name to ensure it exists before looking up the details.
@@ -308,8 +555,9 @@ class DWCSession:
         space_list = self.query_spaces(space_name, query)
         
         if len(space_list) == 1:
-            # Always ask the tenant for a new version of the space.
-            space = self.get_json("space", { "spaceID" : fixed_space_name })
+            # Always ask the tenant for a new version of the space - unless the
+            # caller is happy with the snapshot (read-only use of the space).
+            space = self.get_json("space", { "spaceID" : fixed_space_name }, use_snapshot=use_snapshot)
         else:
             space = None
 
@@ -327,39 +575,46 @@ class DWCSession:
             logger.warn("get_shares: No matching spaces found.")
             return shares_list
         
-        # If an object_name was passed (even if search), look for those
-        # matching objects across the spaces we are searching (or all).
-        
-        for space in spaces:
-            # Get the list of shared objects for this space.
-            objects = self.get_data_builder_objects(space, shared_only=True)
-            
-            # Skip spaces without any data builder objects that have been shared.
-            if len(objects) == 0:
-                continue
-        
-            # Compose the comma separated list of object names having shares
-            
-            search_objects = ""
-            comma = ""
-            
-            for object in objects:
-                search_objects += comma + object["name"]
-                comma = ","
-                    
-            if len(search_objects) == 0:
-                continue
-            
-            # Ask for the all the shares for this space.
-            shares = self.get_json("share_list", values={ "spaceID" : space["name"], "objectNames" : search_objects })
-            
+        # Find the shared objects with a single search.  For more than one
+        # space, search the whole tenant and group the objects by space
+        # instead of searching space by space.
+
+        space_names = [ space["name"] for space in spaces ]
+        shared_objects = { space_name : [] for space_name in space_names }
+
+        if len(spaces) == 1:
+            shared_objects[space_names[0]] = self.get_data_builder_objects(spaces[0], shared_only=True)
+        else:
+            for object in self.get_data_builder_objects(None, shared_only=True):
+                if object.get("space_name") in shared_objects:
+                    shared_objects[object["space_name"]].append(object)
+
+        # Ask for the shares of only the spaces with shared objects, a chunk
+        # of object names at a time to keep the URL short enough.
+
+        share_requests = []
+
+        for space_name in space_names:
+            object_names = [ object["name"] for object in shared_objects[space_name] ]
+
+            for chunk in self.chunk_names(object_names, constants.CONST_SHARE_LIST_NAMES_MAX):
+                share_requests.append((space_name, chunk))
+
+        def get_share_list(request):
+            space_name, search_objects = request
+
+            return self.get_json("share_list", values={ "spaceID" : space_name, "objectNames" : search_objects })
+
+        for (space_name, search_objects), shares in zip(share_requests, executor.map_ordered(get_share_list, share_requests)):
             # We should get back a dictionary of objects with each object listing
-            # their shares.  Loop over to see if we are only looking for a specific
-            # space.
-            
+            # their shares.
+
+            if not isinstance(shares, dict):
+                continue
+
             for object_name in shares:
                 for share in shares[object_name]:
-                    share_item = { "spaceName" : space["name"],
+                    share_item = { "spaceName" : space_name,
                                    "objectName" : object_name,
                                    "targetSpace" : share["name"]
                                  }
@@ -368,7 +623,34 @@ class DWCSession:
         
         return shares_list
             
+    def chunk_names(self, names, max_length):
+        # Split the names into comma separated strings no longer than
+        # max_length - a single long name is sent on its own.
+
+        chunks = []
+        chunk = ""
+
+        for name in names:
+            if len(chunk) > 0 and len(chunk) + 1 + len(name) > max_length:
+                chunks.append(chunk)
+                chunk = ""
+
+            chunk = name if len(chunk) == 0 else chunk + "," + name
+
+        if len(chunk) > 0:
+            chunks.append(chunk)
+
+        return chunks
+
     def add_share(self, space_name, object_name, targets):
+        data = self.share_data(space_name, object_name, targets)
+
+        if len(data["shareSpaceNames"]) > 0:
+            self.post(self.get_url("shares"), json.dumps(data))
+        else:
+            logger.warn("add_share: no valid targets specified.")
+
+    def share_data(self, space_name, object_name, targets):
         # A single share call to DWC can share the same object to many
         # spaces.  Start with an empty list.
         
@@ -394,19 +676,29 @@ class DWCSession:
                     data["shareSpaceNames"].append(target["name"])
                 else:
                     logger.warn("add_share: target {} not valid".format(str(target)))
-        
-        if len(data["shareSpaceNames"]) > 0:
-            self.post(self.get_url("shares"), json.dumps(data))
-        else:
-            logger.warn("add_share: no valid targets specified.")
+
+        return data
 
     def get_connections(self, space, connection_name=None):
+        space_guid = self.get_connections_guid(space)
+
+        if space_guid is None:
+            return []
+
+        # Get the connections, the connections query is guarenteed to return a
+        # "results" object - even if there are no connections in the space.
+
+        connections = self.get_results(self.get_json("connections", { "spaceGUID" : space_guid}), "results")
+
+        return self.filter_connections(connections, connection_name)
+
+    def get_connections_guid(self, space):
         # The caller could pass 1) a space definition, 2) a space name,
         # or 3) a space ID - figure it out.  If the space name is
         # empty, do nothing.
 
         if space is None:
-            return []
+            return None
 
         if isinstance(space, str):
             # If we received a string, assume it's a name and look up the ID.  If the
@@ -423,16 +715,16 @@ class DWCSession:
             if "id" in space:
                 space_guid = space["id"]
             else:
-                return []
+                return None
+        else:
+            return None
 
         # By now, we should have a value representing a space ID - the space may
         # not exist, but we have a value.
 
-        # Get the connections, the connections query is guarenteed to return a
-        # "results" object - even if there are no connections in the space.
-
-        connections = self.get_json("connections", { "spaceGUID" : space_guid})["results"]
+        return space_guid
 
+    def filter_connections(self, connections, connection_name=None):
         if connection_name is None:
             # If we didn't get a specific name to find, return all the connections.
             return connections
@@ -506,9 +798,9 @@ class DWCSession:
 
         # Check to see if the connection already exists in the space.
 
-        connection = self.get_connections(space_name, conn_name)
+        connection = self.get_connections(space_id, conn_name)
 
-        if connection is None:
+        if len(connection) == 0:
             logger.warning(f"delete_connection: space {space_name} - connection {conn_name} not found.")
             return None
 
@@ -531,23 +823,48 @@ class DWCSession:
     
     def get_users(self, users_query=None, force=False, query=True):
         '''
-        Get the list of user from the tenant as a deep copy.  For repeat calls,
+        Get the list of user from the tenant as shallow copies.  For repeat calls,
         always start with a cached user list.  Users are considered non-mutable
         for a single session so doing the same call mulitple times is a performance
-        bottleneck.
+        bottleneck.  Lookups use the index built when the cache is filled.
         '''
 
-        if self.users_cache is None or force == True:
-            self.users_cache = self.get_json("users", { "tenant_id" : self.get_tenant_id() })
+        users_cache = self.users_cache
+
+        if users_cache is None or force == True:
+            with self.cache_lock:
+                users_cache = self.users_cache
+
+                if users_cache is None or force == True:
+                    users_cache = self.set_users_cache(self.get_json("users", { "tenant_id" : self.get_tenant_id() }))
+
+        return self.find_users(users_cache, users_query, query)
+
+    def set_users_cache(self, users):
+        # Called with the cache_lock held.
+
+        if users is None:
+            users = []
+
+        # Publish the users and their index in one assignment.
+
+        self.users_cache = (users, self.index_users(users))
+
+        return self.users_cache
+
+    def find_users(self, users_cache, users_query=None, query=True):
+        # Search a (users, index) pair from the cache - see get_users.
+
+        users, (by_name, by_email, search_text) = users_cache
 
         # Do we have any users in the tenant?  This is never true, but check anyway.
-        if len(self.users_cache) == 0:
+        if len(users) == 0:
             return []
 
         # If no search list was given, return the entire list.
 
         if users_query is None:
-            return copy.deepcopy(self.users_cache)  # Return a mutable list
+            return [ dict(user) for user in users ]  # Return a mutable list
 
         # We could get a few different requests:
         # 1. A single string of a username
@@ -578,7 +895,7 @@ class DWCSession:
             return []
 
         if len(users_query) == 0:
-            return copy.deepcopy(self.users_cache)
+            return [ dict(user) for user in users ]
 
         # Setup the mutable return list.
 
@@ -590,21 +907,51 @@ class DWCSession:
             
             if isinstance(pattern, dict):
                 pattern = pattern["userName"]
-                
-            for user in self.users_cache:
-                if query:
-                    # For a query search, convert the entire user JSON to a string and
-                    # search for any instance of the query pattern.
-                    
-                    if str(user).upper().find(pattern.upper()) != -1:
-                        return_users.append(copy.deepcopy(user))
-                else:
-                    if user["userName"].upper() == pattern.upper() or user["parameters"]["EMAIL"].upper() == pattern.upper():
-                        return_users.append(copy.deepcopy(user))
-                        break  # Non-search pattern has been matched, stop looking
+
+            pattern = pattern.upper()
+
+            if query:
+                # For a query search, look for any instance of the query pattern
+                # in the (upper case) string version of the entire user JSON.
+
+                for position in range(len(search_text)):
+                    if search_text[position].find(pattern) != -1:
+                        return_users.append(dict(users[position]))
+            else:
+                # The pattern is either a user name or an email - when both match
+                # different users, the first user in the tenant list wins.
+
+                positions = [ position for position in (by_name.get(pattern), by_email.get(pattern)) if position is not None ]
+
+                if len(positions) > 0:
+                    return_users.append(dict(users[min(positions)]))
 
         return return_users
 
+    def index_users(self, users):
+        '''
+        Build the lookup structures for a list of users: hash maps of the
+        upper case userName and EMAIL values to the position of the user in
+        the list, and the upper case search text of each user for queries.
+        '''
+
+        by_name = {}
+        by_email = {}
+        search_text = []
+
+        for position, user in enumerate(users):
+            if isinstance(user.get("userName"), str):
+                by_name.setdefault(user["userName"].upper(), position)
+
+            email = user.get("parameters", {}).get("EMAIL")
+
+            if isinstance(email, str):
+                by_email.setdefault(email.upper(), position)
+
+            search_text.append(str(user).upper())
+
+        return by_name, by_email, search_text
+
     def get_space_id(self, space):
         space_id = None
         
@@ -625,7 +972,7 @@ class DWCSession:
                     logger.warn("get_space_name: invalid space object.")
         elif isinstance(space, str):
             # With no other information, simply return the passed name.
-            space_name = space
+            space_id = space
 
         return space_id
 
@@ -654,13 +1001,9 @@ class DWCSession:
         # Encode the search string for the URL.                               
         dbuser_path = urllib.parse.quote(str(search_path).replace("'", '"'))
         
-        # build the final URL to send to DWC
-        dbuser_query = f'#dwc_url/dwaas-core/datasources/getchildren?path={dbuser_path}&space={space_name}'
-
-        # To simplify the get operation, simply punch this URL into the standard list.
-        self.urls["dbuser_objects"] = dbuser_query
-
-        objects = self.get_json("dbuser_objects")
+        # Fill in the path and space of the dbuser_objects URL - the URL
+        # template is shared, so the values are passed with this request.
+        objects = self.get_json("dbuser_objects", { "path" : dbuser_path, "spaceID" : space_name })
         
         if "items" in objects:  # Results are in a sub-object named items
             return objects["items"]
@@ -668,6 +1011,13 @@ class DWCSession:
             return []
 
     def get_data_builder_objects(self, space, shared_only=False):
+        # Go get the objects - the search string is formatted into the
+        # builder_objects URL template for this request only.
+        builder_objects = self.get_json("builder_objects", { "query" : self.builder_objects_query(space, shared_only) })
+        
+        return self.get_results(builder_objects, "value")   # Return the list of objects.
+
+    def builder_objects_query(self, space, shared_only=False):
         space_id = self.get_space_id(space)
 
         # Pick the types of objects to include...
@@ -710,20 +1060,39 @@ class DWCSession:
         db_objects_query += '&'
         db_objects_query += CONST_DOLLAR + 'count=true'
 
-        db_objects_query =  self.get_dwc_url() + "/dwaas-core/repository/search/$all?" + db_objects_query
+        return db_objects_query
 
-        # Park the just constructed URL in the list of the session.  This makes
-        # calling and getting JSON a standard operation.
-        
-        self.urls["builder_objects"] = db_objects_query
+    def get_business_builder_objects(self, space_name):
+        # The business builder content is read with a POST - check the snapshot
+        # ourselves, keyed by the space being read.
 
-        # Go get the objects
-        builder_objects = self.get_json("builder_objects")
-        
-        return builder_objects["value"]   # Return the list of objects.
+        url = self.get_url("businessbuilder")
+        snapshot_key = f"{url}?SpaceID={space_name}"
 
-    def get_business_builder_objects(self, space_name):
-        business_builder_query = {
+        results = self.snapshot.get("businessbuilder", snapshot_key)
+
+        if results is None:
+            if self.snapshot.offline:
+                logger.error(f"businessbuilder: space {space_name} not found in the snapshot.")
+                return []
+
+            response = self.post(url, json.dumps(self.business_builder_query(space_name)), mutates=False)
+
+            try:
+                results = json.loads(response.text)
+            except:
+                logger.error("error parsing JSON")
+                return []
+
+            self.snapshot.put("businessbuilder", snapshot_key, results)
+
+        if "Content" in results:
+            return results["Content"]
+
+        return []
+
+    def business_builder_query(self, space_name):
+        return {
             "SpaceID": space_name,
             "Sort": { "Column": "Title", "isDescending": False },
             "HideEmptyPackages": False,
@@ -742,25 +1111,8 @@ class DWCSession:
             ]
         }
 
-        response = self.post(self.get_url("businessbuilder"), json.dumps(business_builder_query))
-        
-        try:
-            results = json.loads(response.text)
-
-            if "Content" in results:
-                results = results["Content"]
-            else:
-                return []        
-        except:
-            logger.error("error parsing JSON")
-            results = []
-            
-            pass
-                
-        return results
-
     def get_remote_tables(self, space_name):
-        results = self.get_json("remotetables", { "space_name" : space_name })
+        results = self.get_json("remotetables", { "spaceID" : space_name })
 
         if results is not None and "tables" in results:
             remote_tables = results["tables"]
@@ -804,19 +1156,75 @@ class DWCSession:
             return False
         
         # There may be no members, otherwise search for our user name.
-        if "members" in space[space_id]["spaceDefinition"]:
-            for member in space[space_id]["spaceDefinition"]["members"]:
-                if member["name"] == self.get_user_name(user):  # Are we a member of the space?
-                    return True
-
-        return False
+        return self.get_user_name(user) in self.get_member_names(space, space_id)
         
-    def add_members(self, space, users, query=False):
+    def start_member_queue(self):
+        # Queued adds and removes work on one copy of each space and are
+        # saved by flush_members - one PUT per space instead of one per change.
+
+        if self.member_queue is None:
+            self.member_queue = {}
+
+    def stop_member_queue(self):
+        self.flush_members()
+        self.member_queue = None
+
+    def flush_members(self):
+        if not self.member_queue:
+            return
+
+        queued_spaces = self.member_queue
+        self.member_queue = {}
+
+        for space_id, queued in queued_spaces.items():
+            # Adding and then removing the same user is no change at all.
+
+            if self.get_member_set(queued["space"], space_id) == queued["members"]:
+                logger.debug(f"flush_members: {space_id} - membership unchanged")
+                continue
+
+            self.put_space(queued["space"])
+
+    def get_member_names(self, space, space_id):
+        return { member["name"] for member in space[space_id]["spaceDefinition"].get("members", []) }
+
+    def get_member_set(self, space, space_id):
+        return { (member["name"], member["type"]) for member in space[space_id]["spaceDefinition"].get("members", []) }
+
+    def get_member_space(self, space, queue=False):
+        # If we got a string for the space ID, find the space object - the
+        # queued copy if this space already has changes waiting.
+
+        if not isinstance(space, str):
+            return space
+
+        queued = queue and self.member_queue is not None
+
+        if queued and self.fix_space_name(space) in self.member_queue:
+            return self.member_queue[self.fix_space_name(space)]["space"]
+
+        space = self.get_space(space, use_snapshot=False)
+
+        if queued and isinstance(space, dict):
+            space_id = self.get_space_id(space)
+
+            if space_id is not None and "spaceDefinition" in space[space_id]:
+                self.member_queue[space_id] = { "space" : space, "members" : self.get_member_set(space, space_id) }
+
+        return space
+
+    def save_members(self, space, queue=False):
+        # Queued spaces are saved when the queue is flushed.
+
+        if queue and self.member_queue is not None:
+            return
+
+        self.put_space(space)
+
+    def add_members(self, space, users, query=False, queue=False):
         t0 = time.perf_counter()
 
-        # If we got a string for the space ID, find the space object
-        if isinstance(space, str):
-            space = self.get_space(space)
+        space = self.get_member_space(space, queue)
             
         # The space must be an actual space object with the expected structure
         if space is None or not isinstance(space, dict):
@@ -829,29 +1237,34 @@ class DWCSession:
             if space_id is None or "spaceDefinition" not in space[space_id]:
                 logger.error("add_member: invalid space object")        
             else:
-                # Now figure out who's being added - could be many users
+                # Now figure out who's being added - could be many users.  The
+                # lookup validates all of them at once against the tenant users.
                 user_list = self.get_users(users, query=query)
                 
                 if len(user_list) == 0:
                     logger.warning("add_members: invalid list of users")
                 else:
                     added_user = False
+
+                    # Check membership against the names already in the space,
+                    # gathered once no matter how many users are added.
+                    member_names = self.get_member_names(space, space_id)
+                    members = space[space_id]["spaceDefinition"].setdefault("members", [])
                     
                     for user in user_list:
                         # If the user is already a member, no action necessary.
-                        if not self.is_member(space, user):
-                            space[space_id]["spaceDefinition"]["members"].append({ 'name' : user["userName"], 'type' : 'user' })
+                        if user["userName"] not in member_names:
+                            members.append({ 'name' : user["userName"], 'type' : 'user' })
+                            member_names.add(user["userName"])
                             added_user = True
                     
                     if added_user:
-                        self.put_space(space)
+                        self.save_members(space, queue)
         
-    def remove_members(self, space, users, query=False):
+    def remove_members(self, space, users, query=False, queue=False):
         t0 = time.perf_counter()
 
-        # If we got a name, find the space object
-        if isinstance(space, str):
-            space = self.get_space(space)
+        space = self.get_member_space(space, queue)
             
         # The space must be an actual space object with the expected structure
         if space is None or not isinstance(space, dict):
@@ -859,7 +1272,7 @@ class DWCSession:
             return
         
         # The first key must be the name of the space.
-        space_name = self.get_space_name(space)
+        space_name = self.get_space_id(space)
 
         # Check the space object properties.        
         if space_name is None or "spaceDefinition" not in space[space_name]:
@@ -875,18 +1288,13 @@ class DWCSession:
         
         removed_user = False
         remaining_member_list = []
+
+        remove_names = { user["userName"] for user in user_list }
         
         # Loop over the space members and exclude any that match
         # our list of users to remove.
-        for space_user in space[space_name]["spaceDefinition"]["members"]:
-            skip_user = False
-            
-            for user in user_list:
-                if space_user["name"] == user["userName"]:
-                    skip_user = True
-                    break  # Stop checking this space user
-                
-            if skip_user:
+        for space_user in space[space_name]["spaceDefinition"].get("members", []):
+            if space_user["name"] in remove_names:
                 removed_user = True
             else:
                 # Add this space user into the new list of users because
@@ -895,20 +1303,27 @@ class DWCSession:
         
         if removed_user:
             space[space_name]["spaceDefinition"]["members"] = remaining_member_list
-            self.put_space(space)
+            self.save_members(space, queue)
 
     def put_space(self, space):
+        url = self.get_space_url(space)
+
+        if url is None:
+            return
+
+        return self.put(url, json.dumps(space, separators=(',', ':')))
+
+    def get_space_url(self, space):
         # We are expecting a space object, do a quick sanity check.
         space_id = self.get_space_id(space)
         
         if space_id is None or "spaceDefinition" not in space[space_id]:
             logger.error("put_space: invalid space passed")
-            return
+            return None
         
         url = self.get_url("space")
-        url = url.format(**{ "spaceID" : space_id })
 
-        self.put(url, json.dumps(space, separators=(',', ':')))
+        return url.format(**{ "spaceID" : space_id })
 
     def spaces_delete_cli(self, space_id):
         utility.start_timer("spaces_delete_cli")
@@ -1067,12 +1482,34 @@ class DWCSession:
             
         utility.write_json(space_id, space)
 
-    def get_json(self, url_name, values={}):
+    def get_results(self, response, attribute):
+        # Pull the list out of a response object - failed requests
+        # produce an empty list.
+
+        if isinstance(response, dict) and attribute in response:
+            return response[attribute]
+
+        return []
+
+    def get_json(self, url_name, values={}, use_snapshot=True):
         t0 = time.perf_counter()
 
         # Compose the URL - this includes formatting values into the URL template.
         url = self.get_url(url_name).format(**values)
-        
+
+        # Read-only requests may already be in the on-disk snapshot.
+        use_snapshot = use_snapshot and url_name in self.snapshot_urls
+
+        if use_snapshot:
+            results = self.snapshot.get(url_name, url)
+
+            if results is not None:
+                return results
+
+        if self.snapshot.offline:
+            logger.error(f"url_name: {url_name} - not found in the snapshot (offline).")
+            return None
+
         # Send the URL to DWC via a GET operation.
         response = self.session.get(url, verify=False)
 
@@ -1089,11 +1526,30 @@ class DWCSession:
             logger.warning("url_name: {} - error: {} - message: {}".format(url_name, results["code"], results["details"]["message"]))
             return None
 
+        if use_snapshot and response.status_code < 400:
+            self.snapshot.put(url_name, url, results)
+
         return results
 
-    def post(self, url, data=None):
+    def check_offline(self, operation, url):
+        # Changes can't be made to a snapshot - refuse when offline, otherwise
+        # drop the snapshot because the tenant is about to change.  Who we are
+        # logged in as does not change, keep the user info.
+
+        if self.snapshot.offline:
+            logger.error(f"{operation} to {url} - not permitted offline.")
+            return False
+
+        self.snapshot.invalidate(keep=[ "logon" ])
+
+        return True
+
+    def post(self, url, data=None, mutates=True):
         t0 = time.perf_counter()
 
+        if mutates and not self.check_offline("post", url):
+            return None
+
         self.set_header("Content-Type", "application/json")
 
         if data == None:
@@ -1112,6 +1568,9 @@ class DWCSession:
     def delete(self, url):
         t0 = time.perf_counter()
 
+        if not self.check_offline("delete", url):
+            return None
+
         response = self.session.delete(url, verify=False)
 
         self.elapsed = time.perf_counter() - t0
@@ -1126,6 +1585,9 @@ class DWCSession:
     def put(self, url, data):
         t0 = time.perf_counter()
 
+        if not self.check_offline("put", url):
+            return None
+
         put_headers = copy.deepcopy(self.session.headers)
         put_headers["Content-Type"] = "application/json"
         
@@ -1154,3 +1616,6 @@ class DWCSession:
 
     def getelapsed(self):
         return self.elapsed
+
+    def get_transport_stats(self):
+        return self.transport.get_stats()
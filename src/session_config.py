@@ -1,5 +1,7 @@
 import logging, os, sys, configparser, base64, zlib
 
+import constants
+
 # Configure the global logging with a default logging
 # level of info.
 
@@ -8,13 +10,27 @@ logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s : %(message)s")
 # Default logging level for all operations is NOTSET
 log_level = logging.NOTSET
 
+# Number of concurrent requests commands may send to the tenant.
+workers = constants.CONST_DEFAULT_WORKERS
+
+# Serve commands only from the on-disk snapshot of the tenant.
+offline = False
+
+# The configuration file in use for this session.
+config_file = None
+
 logger = logging.getLogger("config")
 
 config_params = { "sections" : [
                     { "name"       : "dwc", 
-                      "parameters" : [ "dwc_url", "dwc_user", "dwc_password" ] },
+                      "parameters" : [ "dwc_url", "dwc_user", "dwc_password", "dwc_session_file+" ] },
                     { "name"       : "hana",
-                      "parameters" : [ "hana_host", "hana_port", "hana_user", "hana_password", "hana_encrypt", "hana_sslverify" ] }
+                      "parameters" : [ "hana_host", "hana_port", "hana_user", "hana_password", "hana_encrypt", "hana_sslverify", "hana_batch_size+",
+                                      "hana_load+", "hana_import_dir+", "hana_import_path+" ] },
+                    { "name"       : "http",
+                      "parameters" : [ "http_connect_timeout+", "http_read_timeout+", "http_retries+", "http_backoff+" ] },
+                    { "name"       : "cache",
+                      "parameters" : [ "cache_dir+", "cache_ttl+" ] }
                   ]
                 }
 
@@ -22,7 +38,7 @@ config_params = { "sections" : [
 session_config = None
 
 def ensure_config(args):
-    global log_level, session_config
+    global log_level, session_config, workers, offline, config_file
     
     # Make sure the configuration file is present and has been initialized. The configuration
     # file is built based on the sections and parameters list above and any command line
@@ -37,6 +53,7 @@ def ensure_config(args):
     else:
         config_file = args.config
 
+    config_file = os.path.abspath(config_file)
     config_exists = os.path.exists(config_file)
     
     if args.command != "config" and not config_exists:
@@ -69,6 +86,10 @@ def ensure_config(args):
         # to the configuration.
             
         if param_name in vars(args): # Was the parameter on the command line?
+          # Parameters not given on the command line keep their current value.
+          if vars(args)[param_name] is None:
+            continue
+
           param_value = str(vars(args)[param_name])
           
           # Obscure any parameter with "password" in the name.
@@ -100,6 +121,13 @@ def ensure_config(args):
 
     log_level = logger.getEffectiveLevel()
 
+    # Capture the concurrency for commands that fan out requests.
+
+    if getattr(args, "workers", None) is not None:
+        workers = max(1, args.workers)
+
+    offline = getattr(args, "offline", False)
+
 def get_config_section(section):
   for config in config_params["sections"]:
     if config["name"] == section:
@@ -148,8 +176,10 @@ def get_config_param(section, parameter):
   
   # Test to see if we have an official parameter name.
   
-  if parameter not in section_params and required:
-    logger.error(f"get_config_param: required configuration parameter {parameter} has no value.")
+  if parameter not in section_params:
+    if required:
+      logger.error(f"get_config_param: required configuration parameter {parameter} has no value.")
+
     return None      
 
   param_value = session_config[section][parameter]
@@ -159,6 +189,41 @@ def get_config_param(section, parameter):
   else:
     return fn_unblur(param_value)
 
+def get_config_number(section, parameter, default, number_type=float):
+  # Optional numeric parameters fall back to the default when they
+  # are not set or not a valid number.
+
+  param_value = get_config_param(section, parameter)
+
+  if param_value is None:
+    return default
+
+  try:
+    return number_type(param_value)
+  except ValueError:
+    logger.warning(f"get_config_number: {parameter} value {param_value} is not a number - using {default}.")
+    return default
+
+def get_cache_dir():
+  # Snapshots live next to the configuration file unless configured.
+
+  cache_dir = get_config_param("cache", "cache_dir")
+
+  if cache_dir is None:
+    cache_dir = os.path.join(os.path.dirname(config_file), "cache")
+
+  return cache_dir
+
+def get_session_file():
+  # The saved tenant session lives next to the configuration file unless configured.
+
+  session_file = get_config_param("dwc", "dwc_session_file")
+
+  if session_file is None:
+    session_file = os.path.join(os.path.dirname(config_file), ".dwc_session")
+
+  return session_file
+
 def fn_blur(value):
     value_b = str.encode(value)
     value_b64 = base64.b64encode(value_b)
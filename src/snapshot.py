@@ -0,0 +1,92 @@
+import gzip, hashlib, json, logging, os, time, uuid
+
+logger = logging.getLogger("snapshot")
+
+class SnapshotCache:
+    '''
+    On-disk cache of tenant responses.  Each response is stored as compressed
+    JSON in a directory for the tenant (DWC URL plus user), one file per
+    endpoint and URL.  Entries older than the TTL (in seconds) are ignored,
+    unless we are offline - then the snapshot is all we have.  A TTL of zero
+    disables the cache.
+    '''
+
+    def __init__(self, directory=None, tenant="", ttl=0, offline=False):
+        self.ttl = ttl
+        self.offline = offline
+        self.enabled = directory is not None and (ttl > 0 or offline)
+
+        self.directory = None
+
+        if directory is not None:
+            tenant_key = hashlib.sha1(tenant.encode("utf-8")).hexdigest()[:16]
+            self.directory = os.path.join(directory, tenant_key)
+
+    def entry_file(self, url_name, url):
+        url_key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+        return os.path.join(self.directory, f"{url_name}-{url_key}.json.gz")
+
+    def get(self, url_name, url):
+        '''Return the cached results for the URL, or None if missing or expired.'''
+
+        if not self.enabled:
+            return None
+
+        entry_file = self.entry_file(url_name, url)
+
+        if not os.path.exists(entry_file):
+            return None
+
+        try:
+            with gzip.open(entry_file, "rt", encoding="utf-8") as entry_handle:
+                entry = json.load(entry_handle)
+        except (OSError, ValueError):
+            logger.warning(f"get: snapshot entry {entry_file} is unreadable - ignored.")
+            return None
+
+        if not self.offline and time.time() - entry["saved"] > self.ttl:
+            return None
+
+        logger.debug(f"get: {url_name} served from snapshot")
+
+        return entry["results"]
+
+    def put(self, url_name, url, results):
+        if not self.enabled or self.offline:
+            return
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+
+        entry_file = self.entry_file(url_name, url)
+
+        # Write to a unique temporary file and swap it in - concurrent
+        # workers never see a partial entry.
+
+        temp_file = f"{entry_file}.{uuid.uuid4().hex}.tmp"
+
+        with gzip.open(temp_file, "wt", encoding="utf-8") as entry_handle:
+            json.dump({ "url" : url, "saved" : time.time(), "results" : results }, entry_handle)
+
+        os.replace(temp_file, entry_file)
+
+    def invalidate(self, keep=()):
+        '''Drop every entry for the tenant, except the endpoints named in keep -
+           called when the tenant changes.'''
+
+        if not self.enabled or self.offline or not os.path.exists(self.directory):
+            return
+
+        keep_prefixes = tuple([ f"{url_name}-" for url_name in keep ])
+
+        for entry_file in os.listdir(self.directory):
+            if len(keep_prefixes) > 0 and entry_file.startswith(keep_prefixes):
+                continue
+
+            try:
+                os.remove(os.path.join(self.directory, entry_file))
+            except OSError:
+                pass  # Another worker got there first.
+
+        logger.debug("invalidate: snapshot cleared")
@@ -1,6 +1,6 @@
-import logging, os, copy
+import argparse, csv, json, logging, os, copy, time
 
-import session_config, cmdparse, constants, utility, writer
+import session_config, constants, executor, utility, writer
 
 logger = logging.getLogger("spaces")
 
@@ -14,13 +14,22 @@ def process(space_args):
     elif space_args.subcommand == "create":
         spaces_create(space_args)
     elif space_args.subcommand == "delete":
-        spaces_delete(space_args)
+        # A bulk delete skips missing spaces, but a space named on its own
+        # must be there - a script line that deletes nothing has failed.
+
+        status, message = spaces_delete(space_args)
+
+        if status != "ok":
+            logger.error(f"spaces_delete: {' '.join(space_args.spaceID)} - {message}")
     elif space_args.subcommand == "bulk":
         process_bulk(space_args)
     elif space_args.subcommand == "member":
         process_members(space_args)
 
-def spaces_create(space_args):
+def spaces_create(space_args, templates=None):
+    """Create one space - returns a (status, message) tuple for the bulk report.
+       Bulk operations pass the template spaces they already fetched."""
+
     utility.start_timer("spaces_create")
 
     # The user could have specified a text name instead of
@@ -30,12 +39,12 @@ def spaces_create(space_args):
 
     if space_id is None:
         logger.error(f'space_create: a space ID is required')
-        return
+        return "failed", "a space ID is required"
 
     space_label = session_config.dwc.validate_space_label(space_id, space_args.business)
 
     if space_label is None:
-        logger.warn(f'Create space {space_args.spaceName} - invalid space label {space_args.label} - defaulting to {space_name}')
+        logger.warn(f'Create space {space_id} - invalid space label {space_args.business} - defaulting to {space_id}')
         
     # Set defaults for disk and ram.  These can be overridden by
     # a template or by command line values (--disk, --memory).
@@ -46,8 +55,8 @@ def spaces_create(space_args):
     # If the user specified the "--force" command line option, this may be overridden
     delete_flag = False
 
-    # Check to see if the space already exists.
-    space_def = session_config.dwc.get_space(space_id)
+    # Check to see if the space already exists - ask the tenant, not the snapshot.
+    space_def = session_config.dwc.get_space(space_id, use_snapshot=False)
 
     # Check to see if the space objects (or empty object) has the
     # space_name as a dictionary object - this only valid when
@@ -56,7 +65,7 @@ def spaces_create(space_args):
     if space_def is not None:
         if space_args.force == False:
             logger.warning(f'spaces_create: space {space_args.spaceID} already exists - specify force.')
-            return
+            return "skipped", "space already exists"
         else:
             delete_flag = True
 
@@ -74,17 +83,23 @@ def spaces_create(space_args):
         new_space_def[space_id]["spaceDefinition"]["members"] = []   # We will add members shortly.
     else:
         # Make sure the template space is in the tenant.
-        template_space = session_config.dwc.get_space(space_args.template)
+        if templates is not None and space_args.template in templates:
+            template_space = templates[space_args.template]
+        else:
+            template_space = session_config.dwc.get_space(space_args.template)
 
         if template_space is None:
             logger.error(f"spaces_create: create space {space_args.spaceID} - template space {space_args.template} - invalid.")
-            return
+            return "failed", f"template space {space_args.template} - invalid"
 
         new_space_def = {}
         new_space_def[space_id] = {}
 
-        # Copy the space definition from the template
-        new_space_def[space_id]["spaceDefinition"] = template_space[space_args.template]["spaceDefinition"]
+        # Copy the space definition from the template - a copy because the same
+        # template is shared by every row of a bulk create.
+        template_id = session_config.dwc.fix_space_name(space_args.template)
+
+        new_space_def[space_id]["spaceDefinition"] = copy.deepcopy(template_space[template_id]["spaceDefinition"])
         new_space_def[space_id]["spaceDefinition"]["label"] = space_label
         new_space_def[space_id]["spaceDefinition"]["members"] = []   # We will add members shortly
 
@@ -123,10 +138,17 @@ def spaces_create(space_args):
 
     # The space is ready to be created, call the CLI to do the operation.
 
-    session_config.dwc.put_space(new_space_def)
+    response = session_config.dwc.put_space(new_space_def)
+
+    if response is None or response.status_code >= 400:
+        status = "no response" if response is None else response.status_code
+        logger.error(f"spaces_create: {space_id} creation failed - {status}")
+        return "failed", f"create failed - {status}"
 
     logger.info(utility.log_timer("spaces_create", f"spaces_create: {space_id} creation complete"))
 
+    return "ok", "created"
+
 def spaces_delete(space_args):
     utility.start_timer("spaces_delete")
 
@@ -134,7 +156,9 @@ def spaces_delete(space_args):
     
     if len(space_list) == 0:
         logger.warning("spaces_delete: no spaces found to delete")
-        return
+        return "skipped", "space not found"
+
+    failed = []
 
     for space in space_list:
         space_id = session_config.dwc.get_space_id(space)
@@ -143,11 +167,19 @@ def spaces_delete(space_args):
         url = url.format(**{ "spaceID" : space_id })
         url += "&connections=true&definitions=true"
         
-        session_config.dwc.delete(url)
+        response = session_config.dwc.delete(url)
+
+        if response is None or response.status_code >= 400:
+            failed.append(space_id)
 
     space_count = len(space_list)
     logger.debug(utility.log_timer("spaces_delete", f"spaces_delete: {space_count} space(s) deleted"))
 
+    if len(failed) > 0:
+        return "failed", f"delete failed - {', '.join(failed)}"
+
+    return "ok", "deleted"
+
 def process_bulk(space_args):
     # A file with a list of spaces for the bulk operation is required.
 
@@ -157,32 +189,107 @@ def process_bulk(space_args):
 
     # Load the file - should be a CSV file
 
-    with open(space_args.filename, "r") as file:
-        bulk_text = file.readlines()
+    with open(space_args.filename, "r", newline="") as file:
+        bulk_text = list(csv.reader(file))
 
     # Remove the header line by clipping starting at the --skip value (default=1).
-    bulk_text = bulk_text[int(space_args.skip):]
-    
-    for text in bulk_text:
-        text = text.strip()
+    skip = int(space_args.skip)
+
+    rows = []
 
+    for row_number, text_row in enumerate(bulk_text[skip:], start=skip + 1):
         # Skip blank and comment lines - I WANTED THE ABILITY TO COMMENT - so shoot me.
-        if len(text) == 0 or text[0] == '#':
+        if len(text_row) == 0 or len("".join(text_row).strip()) == 0 or text_row[0].strip().startswith('#'):
             continue
 
-        if space_args.bulk_subcommand == "create":
-            spaces_bulk_create(space_args, text)
-        elif space_args.bulk_subcommand == "delete":
-            spaces_bulk_delete(text)
+        rows.append((row_number, text_row))
 
-def spaces_bulk_create(space_args, text):
-    # Build the arguments to pass to the spaces_create routine - just like
-    # it would appear on a command line.
-    
-    create_args = [ "spaces", "create" ]
+    # Build every operation up front so the rows can be sent to the tenant
+    # in parallel - each row is independent of the others.
+
+    if space_args.bulk_subcommand == "create":
+        operations = [ spaces_bulk_create(space_args, text_row) for _, text_row in rows ]
+
+        # Each template is fetched once and shared by all the rows using it.
+
+        template_names = sorted({ create_args.template for create_args in operations if create_args.template is not None })
+        templates = dict(zip(template_names, executor.map_ordered(session_config.dwc.get_space, template_names)))
+
+        # Load the users once, before the workers all ask for them.
+        session_config.dwc.get_users()
+
+        operation = lambda create_args: spaces_create(create_args, templates)
+    elif space_args.bulk_subcommand == "delete":
+        operations = [ spaces_bulk_delete(text_row) for _, text_row in rows ]
+        operation = spaces_delete
+    else:
+        return
+
+    # Optionally hold the whole bulk operation to a request rate the tenant can take.
+
+    transport = session_config.dwc.transport
+
+    if space_args.rate is not None and space_args.rate > 0:
+        transport.rate_limiter = executor.RateLimiter(space_args.rate)
+
+    def run_row(item):
+        (row_number, text_row), row_args = item
+
+        t0 = time.perf_counter()
+
+        try:
+            status, message = operation(row_args)
+        except Exception as e:
+            logger.error(f"spaces_bulk: row {row_number} failed - {e}")
+            status, message = "failed", str(e)
+
+        return { "row"      : row_number,
+                 "space_id" : text_row[constants.CONST_SPACE_ID].strip(),
+                 "status"   : status,
+                 "message"  : message,
+                 "latency"  : round(time.perf_counter() - t0, 3) }
+
+    # Rows for the same space (e.g., a create followed by a forced re-create)
+    # must still run in file order - each space is one unit of work.
+
+    space_rows = {}
+
+    for item in zip(rows, operations):
+        space_rows.setdefault(item[0][1][constants.CONST_SPACE_ID].strip().upper(), []).append(item)
+
+    utility.start_timer("spaces_bulk")
+
+    try:
+        space_results = executor.map_ordered(lambda items: [ run_row(item) for item in items ], list(space_rows.values()))
+    finally:
+        transport.rate_limiter = None
+
+    results = sorted([ result for space_result in space_results for result in space_result ], key=lambda result: result["row"])
+
+    counts = { status : sum(1 for result in results if result["status"] == status) for status in [ "ok", "skipped", "failed" ] }
+
+    logger.info(utility.log_timer("spaces_bulk", f"spaces_bulk: {len(results)} row(s) - {counts['ok']} ok, {counts['skipped']} skipped, {counts['failed']} failed"))
+
+    if space_args.report is not None:
+        write_bulk_report(results, space_args.report, space_args.report_format)
+
+def write_bulk_report(results, filename, report_format):
+    columns = [ "row", "space_id", "status", "message", "latency" ]
 
-    # Split the row into expected columns.
-    text_row = text.split(",")
+    with open(filename, "w", newline="", encoding="utf-8") as report_file:
+        if report_format == "json":
+            json.dump(results, report_file, indent=2)
+        else:
+            report_writer = csv.DictWriter(report_file, fieldnames=columns)
+            report_writer.writeheader()
+            report_writer.writerows(results)
+
+def spaces_bulk_create(space_args, text_row):
+    # Build the arguments to pass to the spaces_create routine - the same
+    # namespace the command line parser would produce for "spaces create".
+
+    # Pad short rows so missing columns read as empty.
+    text_row = [ value.strip() for value in text_row ] + [ "" ] * max(constants.CONST_USERS - len(text_row), 0)
 
     space_id = text_row[constants.CONST_SPACE_ID]
     space_business_name = text_row[constants.CONST_BUSINESS]
@@ -194,71 +301,33 @@ def spaces_bulk_create(space_args, text):
     # Pass along the force option, if present.
     # Note: command line argument overrides individual spaces in the CSV
 
-    if space_args.force:   # Override from the "spaces bulk create --force" command
-        create_args.append("--force")
-    else:
-        if isinstance(space_force, str) and len(space_force) > 0 and space_force.lower() == 'true':
-            create_args.append("--force")
-            
-    # Pass along the template specified on the command line.
-    # Note: command line argument overrides individual templates in the CSV
-    
-    # Note: we do not validate the specified template Space - that occurs
-    # during the create operation.
+    force = space_args.force or space_force.lower() == 'true'
 
-    if space_template is not None:
-        if isinstance(space_template, str) and len(space_template.strip()) > 0:
-            # An actual template name was found.
-            create_args.append('--template')
-            create_args.append(space_template.strip())
-        else:
-            # We really didn't see a valid template name, check to see if one
-            # was passed on the "spaces bulk create --template" command line.
-            if space_args.template is not None:
-                create_args.append('--template')
-                create_args.append(space_args.template)
-    else:
-        if space_args.template is not None:
-            create_args.append('--template')
-            create_args.append(space_args.template)
+    # A template in the CSV wins, otherwise use the template passed
+    # on the "spaces bulk create --template" command line.
 
-    # Process a label if present in the CSV
-    # Note: we do not validate the label name - that occurs during
-    #       the create operation.
+    # Note: we do not validate the specified template Space - that occurs
+    # during the create operation.
 
-    if space_business_name is not None and len(space_business_name) > 0:
-        create_args.append("--business")
-        create_args.append(space_business_name)
+    template = space_template if len(space_template) > 0 else space_args.template
 
-    # Note: if disk or memory is not specified for this space
+    # Note: if the label, disk or memory is not specified for this space
     #       then the values will set to defaults or to the template
     #       values (if specified).
 
-    if space_disk is not None and len(space_disk) > 0:
-        create_args.append("--disk")
-        create_args.append(space_disk)
-
-    if space_memory is not None and len(space_memory) > 0:
-        create_args.append("--memory")
-        create_args.append(space_memory)
-
-    # Add the NON-dPTIONAL space id parameter
-    create_args.append(space_id)
-
-    # Add in the NON-dPTIONAL list of users
-    for user in text_row[constants.CONST_USERS:]:
-        if isinstance(user, str) and len(user) > 0:
-            create_args.append(user.strip())
-
-    spaces_create(cmdparse.parse(create_args))
+    return argparse.Namespace(command="spaces",
+                              subcommand="create",
+                              business=space_business_name if len(space_business_name) > 0 else None,
+                              template=template,
+                              disk=space_disk if len(space_disk) > 0 else None,
+                              memory=space_memory if len(space_memory) > 0 else None,
+                              force=force,
+                              query=False,
+                              spaceID=space_id,
+                              users=[ user for user in text_row[constants.CONST_USERS:] if len(user) > 0 ])
 
-def spaces_bulk_delete(text):
-    space_args = text.split(",")
-    space_id = space_args[0]
-
-    delete_args = [ "spaces", "delete", space_id ]
-
-    spaces_delete(cmdparse.parse(delete_args))
+def spaces_bulk_delete(text_row):
+    return argparse.Namespace(command="spaces", subcommand="delete", spaceID=[ text_row[constants.CONST_SPACE_ID].strip() ])
 
 def spaces_list(space_args):
     utility.start_timer("spaces_list")
@@ -271,80 +340,91 @@ def spaces_list(space_args):
     # Capture this list of spaces to a file so we can visually review if needed.
     utility.write_json("spaces-list", spaces)  
     
-    # Now loop over the spaces list and do additional queries to get all the details for each space.
+    # Now fan out over the spaces list and do additional queries to get all the
+    # details for each space.  The results come back in the same order as the
+    # spaces list regardless of how many workers are running.
+
+    space_list = executor.map_ordered(lambda current_space: spaces_list_details(current_space, space_args), spaces)
 
-    space_list = []
+    # Spaces without details (not found, or missing from an offline snapshot) are skipped.
+    space_list = [ space for space in space_list if space is not None ]
+
+    if len(space_list) == 0:
+        logger.warn("spaces_list: No spaces found.")
+    else:
+        writer.write_list(space_list, args=space_args)
+
+    logger.debug(utility.log_timer("spaces_list", f"spaces_list: {len(space_list)} space(s) listed"))
+
+def spaces_list_details(current_space, space_args):
+    space_id = current_space["name"]  # This is the technical name for the space.
+
+    logger.debug(f"spaces_list: starting space list for {space_id}")
     
-    for current_space in spaces:
-        space_id = current_space["name"]  # This is the technical name for the space.
+    # Get the space details (including members/dbusers/connections/etc) from DWC.
+    # This returns a dict object with the space as the first key.
+    space = session_config.dwc.get_space(space_id)
 
-        logger.debug(f"spaces_list: starting space list for {space_id}")
-        
-        # Get the space details (including members/dbusers/connections/etc) from DWC.
-        # This returns a dict object with the space as the first key.
-        space = session_config.dwc.get_space(space_id)
+    if not isinstance(space, dict) or space_id not in space:
+        logger.warning(f"spaces_list: details for space {space_id} not available.")
+        return None
 
-        # Pull out the space details from the query results.
-        space_def = space[space_id]["spaceDefinition"]
+    # Pull out the space details from the query results.
+    space_def = space[space_id]["spaceDefinition"]
 
-        # Compose the space row to be written to the output.  This is a combination
-        # of all the short space query attributes and the detailed query attributes.
-        new_space = copy.deepcopy(current_space)   # Start with a copy of the simple space defintion
-        new_space.update(space_def)                # Add the detailed space attributes
+    # Compose the space row to be written to the output.  This is a combination
+    # of all the short space query attributes and the detailed query attributes.
+    new_space = copy.deepcopy(current_space)   # Start with a copy of the simple space defintion
+    new_space.update(space_def)                # Add the detailed space attributes
 
-        # Add this completed space to the list - we love lists
-        space_list.append(new_space)
-        
-        # Ask for any connections defined for this space.
-        new_space["connections"] = session_config.dwc.get_connections(space_id)
+    # Ask for any connections defined for this space.
+    new_space["connections"] = session_config.dwc.get_connections(space_id)
 
-        # Create a list object for this space's dbusers containing the list
-        # of schema objects available for building views.
+    # Create a list object for this space's dbusers containing the list
+    # of schema objects available for building views.
 
-        if space_args.extend:
-            for object in session_config.dwc.get_dbuser_objects(space_id, new_space["dbusers"]):
-                # Add in the hastag username of the user as a distinct field.
-                object["dbuser"] = object["id"][:object["id"].find(".")]  
+    if space_args.extend:
+        for object in session_config.dwc.get_dbuser_objects(space_id, new_space["dbusers"]):
+            # Add in the hastag username of the user as a distinct field.
+            object["dbuser"] = object["id"][:object["id"].find(".")]  
+            
+            if "dbuser_objects" not in new_space:
+                new_space["dbuser_objects"] = []
                 
-                if "dbuser_objects" not in new_space:
-                    new_space["dbuser_objects"] = []
-                    
-                new_space["dbuser_objects"].append(object)
- 
-        # Ask for additional categories of objects that may be associated with each space.
-        # These data are only available for members of the space - we may need to add ourselves.
-    
-        # Check to see if the current user is a member of this space.  We can't collect
-        # info on various object types if we are not a member.
+            new_space["dbuser_objects"].append(object)
 
-        is_member = session_config.dwc.is_member(space_id)
-        remove_member = False
+    # Ask for additional categories of objects that may be associated with each space.
+    # These data are only available for members of the space - we may need to add ourselves.
+
+    # Check to see if the current user is a member of this space.  We can't collect
+    # info on various object types if we are not a member.  We already have the
+    # space definition, no need to ask the tenant for it again.
+
+    is_member = session_config.dwc.is_member(space)
+    remove_member = False
+    
+    if not is_member:
+        if space_args.add:  # Did the user ask to add themselves?
+            session_config.dwc.add_members(space_id, session_config.dwc.get_user_name())
+            remove_member = True
         
-        if not is_member:
-            if space_args.add:  # Did the user ask to add themselves?
-                session_config.add_member(current_space)
-                remove_member = True
-            
-        # Pump out the data builder objects - this returns nothing if we are not a member
-        new_space["data_builder"] = session_config.dwc.get_data_builder_objects(space_id)
+    # Pump out the data builder objects - this returns nothing if we are not a member
+    new_space["data_builder"] = session_config.dwc.get_data_builder_objects(space_id)
 
-        # Pump out the remote tables list - this returns nothing if we are not a member
-        if space_args.extend:
-            new_space["remote_tables"] = session_config.dwc.get_remote_tables(space_id)
-        else:
-            new_space["remote_tables"] = []
+    # Pump out the remote tables list - this returns nothing if we are not a member
+    if space_args.extend:
+        new_space["remote_tables"] = session_config.dwc.get_remote_tables(space_id)
+    else:
+        new_space["remote_tables"] = []
 
-        # Pump out the business builder objects - this returns nothing if we are not a member
-        new_space["business_builder"] = session_config.dwc.get_business_builder_objects(space_id)
+    # Pump out the business builder objects - this returns nothing if we are not a member
+    new_space["business_builder"] = session_config.dwc.get_business_builder_objects(space_id)
 
-        # Take ourselves out of the space.
-        if remove_member:
-            session_config.space_remove_member(current_space)
+    # Take ourselves out of the space.
+    if remove_member:
+        session_config.dwc.remove_members(space_id, session_config.dwc.get_user_name())
 
-    if len(space_list) == 0:
-        logger.warn("spaces_list: No spaces found.")
-    else:
-        writer.write_list(space_list, args=space_args)
+    return new_space
 
 def process_members(space_args):
     if space_args.member_subcommand == "list":
@@ -382,8 +462,8 @@ def members_action(space_args):
         logger.warn("member_action: invalid space name specified")
     else:
         if space_args.member_subcommand == "add":
-            session_config.dwc.add_members(space_args.spaceID, space_args.user, space_args.query)
+            session_config.dwc.add_members(space_args.spaceID, space_args.user, space_args.query, queue=True)
         elif space_args.member_subcommand == "remove":
-            session_config.dwc.remove_members(space_args.spaceID, space_args.user, space_args.query)
+            session_config.dwc.remove_members(space_args.spaceID, space_args.user, space_args.query, queue=True)
         else:
             logger.error("members_action: invalid action.")
\ No newline at end of file
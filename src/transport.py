@@ -0,0 +1,163 @@
+import logging, random, socket, threading, time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+logger = logging.getLogger("transport")
+
+class DWCTransport(HTTPAdapter):
+    '''
+    HTTP transport mounted on the DWC session.  The adapter sizes the connection
+    pool to the number of concurrent workers, keeps connections alive, applies
+    connect/read timeouts to every request, and retries failed requests with
+    exponential backoff and jitter.
+    '''
+
+    # Methods that can safely be sent again after a broken connection.
+    idempotent_methods = { "GET", "HEAD", "OPTIONS", "PUT", "DELETE" }
+
+    # The tenant did not process the request - any method can be retried.
+    rejected_statuses = { 429, 503 }
+
+    # Gateway errors - the request may have been processed, only retry
+    # idempotent methods.
+    gateway_statuses = { 502, 504 }
+
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=300, retries=3, backoff=0.5, backoff_max=30):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        # Set to an executor.RateLimiter to cap the requests per second.
+        self.rate_limiter = None
+
+        self.stats_lock = threading.Lock()
+        self.stats = { "requests" : 0, "retries" : 0, "timeouts" : 0, "connection_errors" : 0, "exhausted" : 0, "retry_statuses" : {} }
+
+        # Retries are handled in send() so they can be counted - turn off
+        # the urllib3 retries.
+
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        # Ask the OS to keep idle pooled connections alive.
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + [ (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) ]
+
+        super().init_poolmanager(*args, **kwargs)
+
+    def count(self, name, status=None):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+            if status is not None:
+                self.stats["retry_statuses"][status] = self.stats["retry_statuses"].get(status, 0) + 1
+
+    def retry_delay(self, attempt, response=None):
+        # Honor the tenant asking us to wait, otherwise back off exponentially
+        # with jitter so concurrent workers do not retry in lock step.
+
+        if response is not None and "Retry-After" in response.headers:
+            try:
+                return min(float(response.headers["Retry-After"]), self.backoff_max)
+            except ValueError:
+                pass
+
+        delay = min(self.backoff * (2 ** attempt), self.backoff_max)
+
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def can_retry(self, method, attempt, status=None, connect_failed=False):
+        if attempt >= self.retries:
+            return False
+
+        if status in self.rejected_statuses or connect_failed:
+            return True
+
+        return method in self.idempotent_methods and (status is None or status in self.gateway_statuses)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+
+        # The caller waits for every attempt and the delays between them.
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            self.count("requests")
+
+            try:
+                response = super().send(request, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if isinstance(e, requests.exceptions.Timeout):
+                    self.count("timeouts")
+                else:
+                    self.count("connection_errors")
+
+                # A connect failure never reached the tenant - safe for any method.
+                connect_failed = isinstance(e, requests.exceptions.ConnectTimeout)
+
+                if not self.can_retry(request.method, attempt, connect_failed=connect_failed):
+                    if attempt > 0:
+                        self.count("exhausted")
+                    raise
+
+                self.count("retries")
+
+                delay = self.retry_delay(attempt)
+                logger.warning(f"{request.method} {request.url} - {type(e).__name__} - retry {attempt + 1} in {delay:.2f}s")
+            else:
+                status = response.status_code
+
+                if status not in self.rejected_statuses and status not in self.gateway_statuses:
+                    response.dwc_retries = attempt
+                    response.dwc_started = started
+                    return response
+
+                if not self.can_retry(request.method, attempt, status=status):
+                    if attempt > 0:
+                        self.count("exhausted")
+
+                    response.dwc_retries = attempt
+                    response.dwc_started = started
+                    return response
+
+                self.count("retries", status)
+
+                delay = self.retry_delay(attempt, response)
+                logger.warning(f"{request.method} {request.url} - status {status} - retry {attempt + 1} in {delay:.2f}s")
+
+                response.close()  # Hand the connection back to the pool.
+
+            time.sleep(delay)
+
+            attempt += 1
+
+    def get_stats(self):
+        '''Return the retry counts and the state of the connection pools.'''
+
+        with self.stats_lock:
+            stats = dict(self.stats)
+            stats["retry_statuses"] = dict(self.stats["retry_statuses"])
+
+        stats["pool_size"] = self.pool_size
+        stats["pools"] = []
+
+        for key in list(self.poolmanager.pools.keys()):
+            pool = self.poolmanager.pools.get(key)
+
+            if pool is None:
+                continue
+
+            stats["pools"].append({ "host"        : f"{pool.scheme}://{pool.host}:{pool.port}",
+                                    "connections" : pool.num_connections,
+                                    "requests"    : pool.num_requests,
+                                    "idle"        : pool.pool.qsize() if pool.pool is not None else 0 })
+
+        return stats
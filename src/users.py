@@ -16,10 +16,21 @@ def process(user_args):
 def users_list(user_args):
     utility.start_timer("users_list")
 
-    # Target list of users that will be formatted and/or output.
-    user_list = []  # We love lists.
+    # The users are prepared one at a time as the writer asks for them.
+
+    writer.write_list(prepare_users(session_config.dwc.get_users(user_args.users, user_args.query)), args=user_args)
     
-    for user in session_config.dwc.get_users(user_args.users, user_args.query):
+    logger.debug(utility.log_timer("users_list", "Command: users list"))
+
+def prepare_users(users):
+    # Take the users off the list as they are handed out, so a streaming
+    # writer can let go of each one once it is written.
+
+    users.reverse()
+
+    while len(users) > 0:
+        user = users.pop()
+
         # Do some fixup to streamline the user information by pulling some
         # specific attributes up from subobjects.
 
@@ -44,11 +55,5 @@ def users_list(user_args):
                     "roleName" : role
                 })
 
-        # Add to the list of user we will be writing.
-        user_list.append(user)
-
-    # The ETL is complete and we have the users and their roles, output the list.
-
-    writer.write_list(user_list, args=user_args)
-    
-    logger.debug(utility.log_timer("users_list", "Command: users list"))
+        # Hand the user to the writer.
+        yield user
@@ -1,23 +1,32 @@
-import time, json, os, logging
+import time, json, os, logging, threading
 from pathlib import Path
 
 logger = logging.getLogger("utility")
 
 # Create some timer functions to track the execution time
 # for the named operation.  This allows setting multiple timers
-# at the same time.
+# at the same time.  Each thread has its own timers - the worker
+# pools and parallel script lines start timers with the same names.
 
-timers = {}
+timers = threading.local()
 
 def setLevel(level):
     logger.setLevel(level)
 
+def thread_timers():
+    if not hasattr(timers, "started"):
+        timers.started = {}
+
+    return timers.started
+
 def set_timer(name="default"):
-    timers[name] = time.perf_counter();
+    thread_timers()[name] = time.perf_counter();
     
 def get_timer(name="default"):
-    if name in timers:
-        elapsed = time.perf_counter() - timers[name]
+    started = thread_timers()
+
+    if name in started:
+        elapsed = time.perf_counter() - started[name]
 
         return elapsed
 
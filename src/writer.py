@@ -1,23 +1,37 @@
 import logging
 
 import session_config
-import writer_hana, writer_csv, writer_text, writer_json
+import writer_hana, writer_csv, writer_text, writer_json, writer_parquet
 
 logger = logging.getLogger('writer')
         
 def write_list(list_data, args=None):
     logger.setLevel(session_config.log_level)
     
-    if list_data is None or len(list_data) == 0:
+    if list_data is None or (isinstance(list_data, (list, dict)) and len(list_data) == 0):
         logger.error(f'invalid list passed to write_list: target {args.format}.')
         return
 
+    # The JSON writer streams the records as they are produced - every
+    # other writer needs the whole list.
+
+    if args.format in [ "json", "ndjson" ]:
+        writer_json.write_list(list_data, args)
+        return
+
+    if not isinstance(list_data, (list, dict)):
+        list_data = list(list_data)
+
+        if len(list_data) == 0:
+            logger.error(f'invalid list passed to write_list: target {args.format}.')
+            return
+
     if args.format == "hana":
         writer_hana.write_list(list_data, args)
     elif args.format == "csv":
         writer_csv.write_list(list_data, args)
-    elif args.format == "json":
-        writer_json.write_list(list_data, args)
+    elif args.format == "parquet":
+        writer_parquet.write_list(list_data, args)
     elif args.format == "text":
         writer_text.write_list(list_data, args)
     else:
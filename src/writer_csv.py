@@ -1,90 +1,75 @@
-import logging
+import csv, json, logging, os
 
-import session_config
+import session_config, schema
 
 logger = logging.getLogger("writer_csv")
 
-def recurse_columns(columns, list_data, prefix):
-    csv_name = prefix.upper()
+# Large exports write many rows - give each file a generous buffer.
+CSV_BUFFER_SIZE = 1024 * 1024
 
-    # Search through all the rows because some columns are not consistently
-    # returned by the URL/REST queries.  Looping over all the rows helps ensure
-    # we capture all the possible columns (attributes).
-        
-    for row in list_data:
-        if not isinstance(row, dict):
-            continue
-        
-        row_column_names = row.keys()
-
-        # Lazy instantiation of the column list - we may see
-        # not see the same csv content in every pass through
-        # list objects.
-        
-        if csv_name not in columns:
-            columns[csv_name] = { "columns": [], "file_handle" : None }
+def csv_value(value):
+    # Complex values are written as JSON so they can be read back.
 
-        for column_name in row_column_names:
-            if column_name.find("@") != -1:  # Exclude metadata columns.
-                continue
+    if value is None:
+        return ""
 
-            # For each column we add, record the name of the column.
-            # DWC queries are sometimes inconsistent about columns and we
-            # can use this list to ensure all columns are accounted for
-            # across all rows in the CSV file.
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
 
-            if column_name not in columns[csv_name]["columns"]:
-                columns[csv_name]["columns"].append(column_name)
+    return value
 
-                if isinstance(row[column_name], list):
-                    recurse_columns(columns, row[column_name], csv_name + "_" + column_name)
+def write_csv(tables, files, list_data, csv_name, directory=None):
+    if csv_name not in tables:
+        return  # A list with no objects, e.g., a list of strings.
 
-def write_csv(columns, list_data, prefix):
-    csv_name = prefix.upper()
-    csv_file = csv_name + ".csv"
+    csv_def = tables[csv_name]
 
-    if csv_name not in columns:
-        logger.warn(f"write_csv passed unexpected CSV object name: {csv_name}")
-
-    if columns[csv_name]["file_handle"] is None:
+    if csv_name not in files:
         # Open the file and output the heading row for this file.
 
-        columns[csv_name]["file_handle"] = open(csv_file, "w")
+        csv_file = csv_name + ".csv"
+
+        if directory is not None:
+            csv_file = os.path.join(directory, csv_file)
 
-        heading_line = ""
-        comma = ""
+        file_handle = open(csv_file, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE)
+        files[csv_name] = (file_handle, csv.writer(file_handle, quoting=csv.QUOTE_MINIMAL))
 
-        for heading in columns[csv_name]["columns"]:
-            heading_line += comma + '"' + heading + '"'
-            comma = ","
+        files[csv_name][1].writerow(csv_def["columns"])
 
-        columns[csv_name]["file_handle"].write(f"{heading_line}\n")
+    csv_writer = files[csv_name][1]
+    csv_columns = list(csv_def["columns"])
+    child_tables = list(csv_def["children"].items())
 
     for row in list_data:
-        output_line = ""
-        comma = ""
-        
-        for column_name in columns[csv_name]["columns"]:
-            if column_name in row:
-                output_line += comma + str(row[column_name])
-                comma = ","
-            
-        columns[csv_name]["file_handle"].write(f"{output_line}\n")
-    
+        if not isinstance(row, dict):
+            continue
+
+        csv_writer.writerow([ csv_value(row.get(column_name)) for column_name in csv_columns ])
+
+        # Child lists go to their own files while we have the row in hand.
+
+        for column_name, child_name in child_tables:
+            if isinstance(row.get(column_name), list):
+                write_csv(tables, files, row[column_name], child_name, directory)
+
 def write_list(list_data, args):
     logger.setLevel(session_config.log_level)
 
+    if args.directory is not None and not os.path.exists(args.directory):
+        os.makedirs(args.directory, exist_ok=True)
+
     # Build out the full defintions or all the CSV files we will be
     # creating from this object.  There may be many sub-objects
     # in the JSON - each one gets a separate file.
-    columns = {}
-    
-    recurse_columns(columns, list_data, args.prefix)
+    tables = schema.infer_schema(list_data, args.prefix)
+
+    files = {}
 
-    write_csv(columns, list_data, args.prefix)
+    try:
+        write_csv(tables, files, list_data, args.prefix.upper(), args.directory)
+    finally:
+        # Every sub-list may have generated an open file, close them all.
 
-    # Every sub-list may have generated an open file, close them all.
-    
-    for csv_name in columns:
-        if columns[csv_name]["file_handle"] is not None and columns[csv_name]["file_handle"].closed == False:
-            columns[csv_name]["file_handle"].close()
\ No newline at end of file
+        for file_handle, _ in files.values():
+            file_handle.close()
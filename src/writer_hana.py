@@ -1,17 +1,27 @@
-import logging
+import hashlib, logging, os
 import time, datetime as dt
 
-#from hdbcli import dbapi
-
 import session_config as config
+import constants, schema, utility
 
 logger = logging.getLogger("hana")
 
 conn = None
 cursor = None
 
-timestamps = [ "createTime", "validFrom", "lastSuccessfulConnect", "lastInvalidConnectAttempt", "modification_date", "creation_date" ]
-date_fields = [ "LAST_LOGIN_DATE" ]
+# Rows are staged for IMPORT FROM in a CSV file per table.  Strings are
+# always quoted so an unquoted empty field can stand for NULL.
+IMPORT_SQL = "import from csv file '{}' into {} with record delimited by '\\n' field delimited by ',' optionally enclosed by '\"' fail on invalid data"
+IMPORT_BUFFER_SIZE = 1024 * 1024
+
+# With --merge every table carries the key of each row, and a hash of its
+# values to tell which rows changed since the last refresh.
+MERGE_KEY_COLUMN = "_ROW_KEY"
+MERGE_HASH_COLUMN = "_ROW_HASH"
+
+# The tables merged for each prefix - a child table missing from a refresh
+# (its lists were all empty) still has rows to delete.
+MERGE_CATALOG = "PROVISIONER_MERGE_TABLES"
 
 def hana_connect():
     '''Connect to HANA
@@ -24,6 +34,15 @@ def hana_connect():
     global conn, cursor
 
     if conn is None:
+        # The HANA client is only needed for HANA output - import it here
+        # so the other formats work without it installed.
+
+        try:
+            from hdbcli import dbapi
+        except ImportError:
+            logger.error("The hdbcli package is required for HANA output - pip install hdbcli")
+            return False
+
         if config.get_config_param("hana", "hana_encrypt") == "True":
             encrypt = True
         else:
@@ -34,42 +53,145 @@ def hana_connect():
         else:
             ssl = False
 
-        conn = dbapi.connect(address=config.get_config_param("hana", "hana_host"),
-                             port=config.get_config_param("hana", "hana_port"),
-                             user=config.get_config_param("hana", "hana_user"),
-                             password=config.get_config_param("hana", "hana_password"),
-                             encrypt=encrypt,
-                             sslValidateCertificate=ssl
-                            )
-        
+        try:
+            conn = dbapi.connect(address=config.get_config_param("hana", "hana_host"),
+                                 port=config.get_config_param("hana", "hana_port"),
+                                 user=config.get_config_param("hana", "hana_user"),
+                                 password=config.get_config_param("hana", "hana_password"),
+                                 encrypt=encrypt,
+                                 sslValidateCertificate=ssl
+                                )
+        except Exception as e:
+            logger.error("HANA connection failed: {}".format(sql_error(e)))
+            return False
+
+        # Inserts are committed once per table, not per row.
+        conn.setautocommit(False)
+
         cursor = conn.cursor()
 
     return True
 
+def sql_error(e):
+    # hdbcli errors carry the database message in errortext.
+    return getattr(e, "errortext", str(e))
+
 def hana_execute(sql_statement, bind_values=[]):
     try:
-        if not hana_connect():   # Ensure the connection
-            logger.error("Invalid HANA connection")
-            logger.error(sql_statement)
-            return
-
         cursor.execute(sql_statement, bind_values)
     except Exception as e:
-        logger.error("SQL Error: {}".format(e.errortext))
+        logger.error("SQL Error: {}".format(sql_error(e)))
         logger.error(sql_statement)
 
+def get_batch_size():
+    batch_size = config.get_config_number("hana", "hana_batch_size", constants.CONST_HANA_BATCH_SIZE, int)
+
+    if batch_size < 1:
+        batch_size = constants.CONST_HANA_BATCH_SIZE
+
+    return batch_size
+
+def execute_batches(sql_statement, rows):
+    batch_size = get_batch_size()
+
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql_statement, rows[start:start + batch_size])
+
+def hana_executemany(table_name, sql_statement, rows):
+    """Insert the rows for a table in batches and commit them together."""
+
+    utility.start_timer("hana_insert")
+
+    try:
+        execute_batches(sql_statement, rows)
+
+        conn.commit()
+    except Exception as e:
+        logger.error("SQL Error: {} - table {} rolled back".format(sql_error(e), table_name))
+        logger.error(sql_statement)
+
+        conn.rollback()
+        return
+
+    elapsed = utility.get_timer("hana_insert")
+    rate = len(rows) / elapsed if elapsed > 0 else 0
+
+    logger.info(f"{table_name}: inserted {len(rows)} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+def import_value(value, column_type):
+    # The staged text must read back as the value INSERT would have bound.
+
+    if value is None:
+        return ""
+
+    if isinstance(value, bool):
+        return "1" if value else "0"
+
+    if isinstance(value, (int, float)):
+        return str(value)
+
+    # Timestamps and converted epoch dates share one format in the file.
+    if column_type == "TIMESTAMP":
+        value = value.replace("T", " ", 1)
+
+    return '"' + str(value).replace('"', '""') + '"'
+
+def hana_import(table_name, table_def, rows):
+    """Stage the rows for a table in a CSV file and load them with IMPORT FROM.
+       Returns False if there is nowhere to stage the file."""
+
+    import_dir = config.get_config_param("hana", "hana_import_dir")
+    import_path = config.get_config_param("hana", "hana_import_path") or import_dir
+
+    if import_dir is None:
+        logger.error("hana_import: hana_import_dir is not configured - inserting the rows instead")
+        return False
+
+    os.makedirs(import_dir, exist_ok=True)
+
+    staged_file = os.path.join(import_dir, table_name + ".csv")
+    column_types = [ column_def["type"] for column_def in table_def["columns"].values() ]
+
+    utility.start_timer("hana_import")
+
+    with open(staged_file, "w", newline="", encoding="utf-8", buffering=IMPORT_BUFFER_SIZE) as staged_handle:
+        for row in rows:
+            staged_handle.write(",".join([ import_value(value, column_type) for value, column_type in zip(row, column_types) ]) + "\n")
+
+    # The server reads the file - name it as the server sees the directory.
+    import_sql = IMPORT_SQL.format(import_path.rstrip("/\\") + "/" + table_name + ".csv", table_name)
+
+    try:
+        cursor.execute(import_sql)
+        conn.commit()
+    except Exception as e:
+        logger.error("SQL Error: {} - table {} rolled back, staged file kept: {}".format(sql_error(e), table_name, staged_file))
+        logger.error(import_sql)
+
+        conn.rollback()
+        return True
+
+    os.remove(staged_file)
+
+    elapsed = utility.get_timer("hana_import")
+    rate = len(rows) / elapsed if elapsed > 0 else 0
+
+    logger.info(f"{table_name}: imported {len(rows)} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+    return True
+
 def create_ddl(list_obj, args):
     """Create a SQL definition for a list of objects
     """
     logger.debug(f'Entering create_table_sql: {args.prefix}')
 
-    ddl = {}
-
     drop_sql_tmpl = 'drop table {} cascade'
     create_sql_tmpl = 'create column table {} ('
     insert_sql_tmpl = 'insert into {} values ('
 
-    recurse_columns(ddl, list_obj, args.prefix.upper())
+    # The tables, columns and types come from one pass over the rows - the
+    # statements are added to the definition of each table.
+    ddl = schema.infer_schema(list_obj, args.prefix)
 
     # Build all the SQL statements for all the columns
 
@@ -90,7 +212,7 @@ def create_ddl(list_obj, args):
             column_def = ddl[table_name]["columns"][column_name]
 
             create_sql += "\n" + comma + '"' + column_def["name"] + '" ' + column_def["type"]
-            insert_sql += "\n" + comma + ":" + column_def["name"]
+            insert_sql += "\n" + comma + "?"
             comma = ","
 
         ddl[table_name]["create"] = create_sql + ')'
@@ -98,86 +220,83 @@ def create_ddl(list_obj, args):
 
     return ddl
 
-def recurse_columns(ddl, list_data, param_name):
-    table_name = param_name.upper()
+def execute_ddl(ddl, statement_name):
+    # If values were provided, do some fix-up to make sure they align
+    # with the DDL computed earlier - this includes fixing timestamps,
+    # adding missing values, and handling complex objects.
+    
+    for table_name in ddl:
+        if statement_name in ddl[table_name]:
+            sql_statement = ddl[table_name][statement_name]
 
-    # Search through all the rows because some columns are not consistently
-    # returned by the URL/REST queries.  Looping over all the rows helps ensure
-    # we capture all the possible columns (attributes).
-        
-    for row in list_data:
-        # If we got a list of "not dictionary" skip this recursion.
+            hana_execute(sql_statement)
 
-        if not isinstance(row, dict):
-            return
+    conn.commit()
 
-        row_column_names = row.keys()
+def collect_rows(ddl, list_data, table_name, table_rows):
+    # Build the bind values for every row of the table, and any child tables
+    # found in list columns, without touching the database.
 
-        if table_name not in ddl:
-            ddl[table_name] = { "columns" : {} }
+    if table_name not in ddl or "insert" not in ddl[table_name]:
+        return
 
-        for column_name in row_column_names:
-            if column_name.find("@") != -1:  # Exclude metadata columns.
-                continue
+    columns = ddl[table_name]["columns"]
+    rows = table_rows.setdefault(table_name, [])
 
-            # Figure out the data type over all the rows
+    for row in list_data:
+        if not isinstance(row, dict):
+            continue
 
-            sql_type = None
+        # Build the list of values to pass to the insert statement independant
+        # of the actual values.  We need to insert any missing values to make
+        # sure all the bind variables are present in the values passed to the
+        # statement.
 
-            if isinstance(row[column_name], int):
-                sql_type = "BIGINT"
-            elif column_name in timestamps or column_name in date_fields:
-                sql_type = "TIMESTAMP"
-            elif isinstance(row[column_name], list) or isinstance(row[column_name], dict):
-                sql_type = "CLOB"
+        insert_values = []
 
-                if isinstance(row[column_name], list):
-                    recurse_columns(ddl, row[column_name], table_name + "_" + column_name)
-            else:
-                sql_type = "NVARCHAR(5000)"
-
-            # For each column we add, record the name of the column.
-            # DWC queries are sometimes inconsistent about columns and we
-            # can use this list to ensure all columns are accounted for
-            # across all rows.
-
-            if column_name in ddl[table_name]["columns"]:
-                column = ddl[table_name]["columns"][column_name]
-
-                if column["type"] is None: 
-                    ddl[table_name]["columns"][column_name]["type"] = sql_type
-                elif column["type"] == "BIGINT" and sql_type.startswith("NVARCHAR"):
-                    ddl[table_name]["columns"][column_name]["type"] = sql_type
-                elif column["type"].startswith("NVARCHAR") and sql_type == "CLOB":
-                    ddl[table_name]["columns"][column_name]["type"] = sql_type
-            else:
-                # Fix the name of the column to match the DDL; remove special characters.
-                fixed_column = column_name.replace("#", "z")
+        for column_name in columns:
+            column_def = columns[column_name]
+            value = row.get(column_name)
 
-                ddl[table_name]["columns"][column_name] = { "name" : fixed_column, "type" : sql_type }
+            # Check for missing values - not all queries to DWC reliably return exactly the same columns
 
-def execute_ddl(ddl, statement_name):
-    # If values were provided, do some fix-up to make sure they align
-    # with the DDL computed earlier - this includes fixing timestamps,
-    # adding missing values, and handling complex objects.
-    
-    for table_name in ddl:
-        if statement_name in ddl[table_name]:
-            sql_statement = ddl[table_name][statement_name]
+            if value is None:
+                insert_values.append(None)
+            elif column_name in schema.timestamps:
+                # Fix-up timestamps by chopping off extend milliseconds and timezone info.
+                # Note: dateFields do not need adjustment because they have default HANA
+                #       formatting that do not need to be adjusted.
+
+                insert_values.append(value[0:23])
+            elif column_name in schema.date_fields:
+                # This is an epoch date, convert the value before
+                epoch_time = time.gmtime(int(value[0:10]))
+                insert_values.append(dt.datetime(*epoch_time[:7]).strftime("%Y-%m-%d %H:%M:%S"))
+            elif column_def["type"] == 'CLOB':
+                # Convert complex objects to strings that get inserted as CLOB values
+                insert_values.append(str(value))
+
+                # if this is a list, collect the rows of the child table.
+
+                if isinstance(value, list):
+                    collect_rows(ddl, value, ddl[table_name]["children"][column_name], table_rows)
+            else:
+                # Just a normal value
+                insert_values.append(value)
 
-            hana_execute(sql_statement)
+        rows.append(tuple(insert_values))
 
 def execute_dml(ddl, statement_name, list_data, param_name):
     if ddl is None or not isinstance(ddl, dict) or len(ddl) == 0:
         logger.error("Invalid ddl object passed to execute_dml.")
         return
 
+    table_name = param_name.upper()
+
     if list_data is None or isinstance(list_data, list) == False:
         logger.error(f"invalid list object passed to execute_dml - table {table_name}")
         return
 
-    table_name = param_name.upper()
-
     # There are some lists that are not objects, skip
 
     if table_name not in ddl:
@@ -186,55 +305,246 @@ def execute_dml(ddl, statement_name, list_data, param_name):
     if statement_name not in ddl[table_name]:
         return
 
-    sql_stmt = ddl[table_name][statement_name]
+    # Gather the rows for all the tables first, then send each table
+    # to HANA in batches.
 
-    for row in list_data:
-        # Build the list of values to pass to the insert statement independant
-        # of the actual values.  We need to insert any missing values to make
-        # sure all the bind variables are present in the values passed to the
-        # statement.
+    table_rows = {}
 
-        insert_values = {}
+    collect_rows(ddl, list_data, table_name, table_rows)
 
-        for column_name in ddl[table_name]["columns"]:
-            column_def = ddl[table_name]["columns"][column_name]
+    bulk_import = config.get_config_param("hana", "hana_load") == "import"
 
-            # Check for missing values - not all queries to DWC reliably return exactly the same columns
+    for table_name in table_rows:
+        if len(table_rows[table_name]) == 0:
+            continue
+
+        if bulk_import and hana_import(table_name, ddl[table_name], table_rows[table_name]):
+            continue
+
+        hana_executemany(table_name, ddl[table_name][statement_name], table_rows[table_name])
+
+def table_columns(table_name):
+    # The columns of an existing table, or None if there is no such table.
+
+    try:
+        cursor.execute(f"select * from {table_name} where 1 = 0")
+    except Exception:
+        return None
+
+    return [ column[0] for column in cursor.description ]
+
+def column_types(table_name):
+    # The types of the columns of an existing table, named like the schema types.
+
+    cursor.execute('select "COLUMN_NAME", "DATA_TYPE_NAME" from SYS.TABLE_COLUMNS '
+                   'where "SCHEMA_NAME" = CURRENT_SCHEMA and "TABLE_NAME" = ?', (table_name,))
+
+    type_names = { "NVARCHAR" : schema.TYPE_NVARCHAR, "VARCHAR" : schema.TYPE_NVARCHAR, "NCLOB" : schema.TYPE_CLOB }
+
+    return { column_name : type_names.get(type_name, type_name) for column_name, type_name in cursor.fetchall() }
+
+def column_fits(existing_type, column_type):
+    # The values of a column type fit a column of the same type, or of any
+    # type it is promoted to (BIGINT to NVARCHAR to CLOB).
+
+    fitting_types = { column_type }
+
+    while True:
+        wider_types = { promoted_type for (from_type, _), promoted_type in schema.PROMOTIONS.items() if from_type in fitting_types } - fitting_types
+
+        if len(wider_types) == 0:
+            return existing_type in fitting_types
+
+        fitting_types |= wider_types
+
+def merge_table(table_name, table_def):
+    """Make sure the table is ready for merging - create it if it is missing,
+       recreate it if a column needs a wider type, and add any new columns
+       found in the data."""
+
+    existing_columns = table_columns(table_name)
+    changed_columns = []
+
+    if existing_columns is not None and MERGE_KEY_COLUMN in existing_columns:
+        existing_types = column_types(table_name)
+
+        changed_columns = [ column_def["name"] for column_def in table_def["columns"].values()
+                            if column_def["name"] in existing_types and not column_fits(existing_types[column_def["name"]], column_def["type"]) ]
+
+    if existing_columns is None or MERGE_KEY_COLUMN not in existing_columns or len(changed_columns) > 0:
+        # The first merge loads every row anyway, so a table written
+        # without --merge is simply replaced.  So is a table with a column
+        # too narrow for the values - HANA cannot alter every type to every
+        # other (e.g., NVARCHAR to CLOB), and the rows are reloaded.
+
+        if len(changed_columns) > 0:
+            logger.info(f"{table_name}: recreating the table - new type for column(s) {', '.join(changed_columns)}")
+
+        if existing_columns is not None:
+            hana_execute(table_def["drop"])
+
+        hana_execute(table_def["create"][:-1] + f',\n"{MERGE_KEY_COLUMN}" NVARCHAR(256) PRIMARY KEY,\n"{MERGE_HASH_COLUMN}" NVARCHAR(40))')
+        conn.commit()
+
+        return
+
+    for column_def in table_def["columns"].values():
+        if column_def["name"] not in existing_columns:
+            logger.info(f"{table_name}: adding column {column_def['name']} {column_def['type']}")
+
+            hana_execute(f'alter table {table_name} add ("{column_def["name"]}" {column_def["type"]})')
+
+    conn.commit()
+
+def row_keys(table_def, rows, keyed):
+    # The key of each row is the first of the merge key columns that is
+    # unique for the table.  Child tables, and tables without such a column,
+    # are keyed by the hash of the row - a changed row is a delete and an add.
+
+    column_names = [ column_def["name"] for column_def in table_def["columns"].values() ]
+    hashes = []
+
+    for row in rows:
+        # Only the values present count, so a new column does not change
+        # the rows that have no value for it.
+        values = [ (column_name, value) for column_name, value in zip(column_names, row) if value is not None ]
+
+        hashes.append(hashlib.sha1(repr(values).encode("utf-8")).hexdigest())
+
+    if keyed:
+        for key_column in constants.CONST_HANA_MERGE_KEYS:
+            if key_column not in table_def["columns"]:
+                continue
+
+            key_index = list(table_def["columns"]).index(key_column)
+            keys = [ row[key_index] for row in rows ]
 
-            if column_name not in row or row[column_name] is None:
-                insert_values[column_def["name"]] = None
-            else:            
-                if column_name in timestamps:
-                    # Fix-up timestamps by chopping off extend milliseconds and timezone info.
-                    # Note: dateFields do not need adjustment because they have default HANA
-                    #       formatting that do not need to be adjusted.
+            if None not in keys and len(set(keys)) == len(keys):
+                return [ str(key) for key in keys ], hashes
 
-                    insert_values[column_def["name"]] = row[column_name][0:23]
-                elif column_name in date_fields:
-                    # This is an epoch date, convert the value before
-                    epoch_time = time.gmtime(int(row[column_name][0:10]))
-                    date_value = dt.datetime(*epoch_time[:7]).strftime("%Y-%m-%d %H:%M:%S")
+    # Identical rows get a counter so each one has its own key.
 
-                    insert_values[column_def["name"]] = date_value
-                elif column_def["type"] == 'CLOB':
-                    # Convert complex objects to strings that get inserted as CLOB values
-                    insert_values[column_def["name"]] = str(row[column_name])
+    keys = []
+    seen = {}
 
-                    # if this is a list, recurse to find additional table types.
+    for row_hash in hashes:
+        seen[row_hash] = seen.get(row_hash, 0) + 1
+        keys.append(f"{row_hash}:{seen[row_hash]}")
 
-                    if isinstance(row[column_name], list):
-                        execute_dml(ddl, statement_name, row[column_name], table_name + "_" + column_name)
-                else:
-                    # Just a normal value
-                    insert_values[column_def["name"]] = row[column_name]
+    return keys, hashes
 
-        hana_execute(sql_stmt, insert_values)
+def merge_rows(table_name, table_def, rows, keyed):
+    """Upsert the new and changed rows of a table and delete the rows that are
+       gone, committing them together."""
+
+    utility.start_timer("hana_merge")
+
+    keys, hashes = row_keys(table_def, rows, keyed)
+
+    cursor.execute(f'select "{MERGE_KEY_COLUMN}", "{MERGE_HASH_COLUMN}" from {table_name}')
+
+    existing = dict(cursor.fetchall())
+
+    changed_rows = [ row + (key, row_hash) for row, key, row_hash in zip(rows, keys, hashes) if existing.get(key) != row_hash ]
+    deleted_keys = [ (key,) for key in existing.keys() - set(keys) ]
+
+    column_names = [ column_def["name"] for column_def in table_def["columns"].values() ] + [ MERGE_KEY_COLUMN, MERGE_HASH_COLUMN ]
+
+    upsert_sql = "upsert {} ({}) values ({}) with primary key".format(table_name,
+                                                                     ",".join([ f'"{column_name}"' for column_name in column_names ]),
+                                                                     ",".join([ "?" ] * len(column_names)))
+    delete_sql = f'delete from {table_name} where "{MERGE_KEY_COLUMN}" = ?'
+
+    try:
+        execute_batches(delete_sql, deleted_keys)
+        execute_batches(upsert_sql, changed_rows)
+
+        conn.commit()
+    except Exception as e:
+        logger.error("SQL Error: {} - table {} rolled back".format(sql_error(e), table_name))
+        logger.error(upsert_sql)
+
+        conn.rollback()
+        return
+
+    elapsed = utility.get_timer("hana_merge")
+
+    logger.info(f"{table_name}: {len(changed_rows)} rows upserted, {len(deleted_keys)} deleted, "
+                f"{len(rows) - len(changed_rows)} unchanged in {elapsed:.2f}s")
+
+def merged_tables(prefix):
+    # The tables merged for the prefix by earlier runs.
+
+    if table_columns(MERGE_CATALOG) is None:
+        hana_execute(f'create column table {MERGE_CATALOG} ("PREFIX" NVARCHAR(256), "TABLE_NAME" NVARCHAR(256), primary key ("PREFIX", "TABLE_NAME"))')
+        conn.commit()
+
+    cursor.execute(f'select "TABLE_NAME" from {MERGE_CATALOG} where "PREFIX" = ?', (prefix,))
+
+    return [ row[0] for row in cursor.fetchall() ]
+
+def clear_table(table_name):
+    """Delete every row of a merged table that has no rows in this refresh."""
+
+    try:
+        cursor.execute(f"select count(*) from {table_name}")
+        row_count = cursor.fetchall()[0][0]
+
+        if row_count > 0:
+            cursor.execute(f"delete from {table_name}")
+
+        conn.commit()
+    except Exception as e:
+        logger.error("SQL Error: {} - table {} rolled back".format(sql_error(e), table_name))
+
+        conn.rollback()
+        return
+
+    logger.info(f"{table_name}: not in this refresh - {row_count} rows deleted")
+
+def merge_dml(ddl, list_data, param_name):
+    # Only the tables with columns can be merged - collect the rows
+    # for all of them, then bring each one up to date.
+
+    table_name = param_name.upper()
+    table_rows = {}
+
+    collect_rows(ddl, list_data, table_name, table_rows)
+
+    previous_tables = merged_tables(table_name)
+
+    for merge_name in ddl:
+        if "create" not in ddl[merge_name]:
+            continue
+
+        merge_table(merge_name, ddl[merge_name])
+        merge_rows(merge_name, ddl[merge_name], table_rows.get(merge_name, []), merge_name == table_name)
+
+        if merge_name not in previous_tables:
+            hana_execute(f'upsert {MERGE_CATALOG} ("PREFIX", "TABLE_NAME") values (?, ?) with primary key', (table_name, merge_name))
+            conn.commit()
+
+    # Tables merged before, but not found in the data this time, are emptied.
+
+    for merge_name in previous_tables:
+        if merge_name not in ddl or "create" not in ddl[merge_name]:
+            if table_columns(merge_name) is not None:
+                clear_table(merge_name)
 
 def write_list(list_data, args):
     logger.setLevel(config.log_level)
 
     ddl = create_ddl(list_data, args)
 
+    if not hana_connect():
+        return
+
+    # Merging keeps the tables, and only writes the rows that changed.
+
+    if getattr(args, "merge", False):
+        merge_dml(ddl, list_data, args.prefix)
+        return
+
     execute_ddl(ddl, "drop")
     execute_ddl(ddl, "create")
 
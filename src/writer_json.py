@@ -1,25 +1,72 @@
-import json, os, logging
+import gzip, io, json, os, logging, sys
 
 import session_config
 
 logger = logging.getLogger("write_json")
 
-def write_list(object, prefix):
-    logger.setLevel(session_config.log_level)
+# Records are written as they arrive - give the file a generous buffer.
+JSON_BUFFER_SIZE = 1024 * 1024
+
+# Level 6 is most of the compression of level 9 (the gzip default) in much less time.
+JSON_GZIP_LEVEL = 6
+
+def open_output(args):
+    # Write to PREFIX.json (or .ndjson) in the directory, or to stdout so
+    # the records can be piped to another program.
+
+    compress = getattr(args, "gzip", False)
+
+    if args.directory is None:
+        if not compress:
+            return sys.stdout, False
+
+        gzip_file = gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb", compresslevel=JSON_GZIP_LEVEL)
+
+        return io.TextIOWrapper(gzip_file, encoding="utf-8"), True
+
+    if not os.path.exists(args.directory):
+        os.makedirs(args.directory, exist_ok=True)
+
+    json_file = os.path.join(args.directory, args.prefix.upper() + "." + args.format)
+
+    if compress:
+        return gzip.open(json_file + ".gz", "wt", encoding="utf-8", compresslevel=JSON_GZIP_LEVEL), True
+
+    return open(json_file, "w", encoding="utf-8", buffering=JSON_BUFFER_SIZE), True
+
+def write_list(list_data, args):
     """
-        Write out the provided object to the specified file.
+        Stream the records to the output, one record per line - as a JSON
+        array for "json" or as JSON Lines for "ndjson".  The records can
+        be any iterable, so they are written as they are produced.
     """
 
-    # Ensure the working directory exists before trying to write
-    # this file.
+    logger.setLevel(session_config.log_level)
+
+    if isinstance(list_data, dict):
+        list_data = [ list_data ] # We love lists
+
+    output_handle, close = open_output(args)
 
-    json_path = os.path.join(Path(__file__).parent.absolute(), "working")
+    lines = 0
 
-    if not os.path.exists(json_path):
-        os.mkdir(json_path)
+    try:
+        if args.format == "ndjson":
+            for record in list_data:
+                output_handle.write(json.dumps(record, separators=(',', ':')) + "\n")
+                lines += 1
+        else:
+            output_handle.write("[")
 
-    json_file = os.path.join(json_path, f"{json_name}.json")
+            for record in list_data:
+                output_handle.write(("\n" if lines == 0 else ",\n") + json.dumps(record, separators=(',', ':')))
+                lines += 1
 
-    with open(json_file, "w") as outfile:
-        outfile.write(json.dumps(object, indent = 4)) # With pretty print
+            output_handle.write("\n]\n")
+    finally:
+        if close:
+            output_handle.close()
+        else:
+            output_handle.flush()
 
+    logger.debug(f"write_list: {lines} record(s) written")
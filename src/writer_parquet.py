@@ -0,0 +1,145 @@
+import datetime as dt, json, logging, os, time
+
+import session_config, constants, schema
+
+logger = logging.getLogger("writer_parquet")
+
+def arrow_types(pa):
+    # The column types found by schema.infer_schema, as Arrow types.
+
+    return { schema.TYPE_BIGINT    : pa.int64(),
+             schema.TYPE_TIMESTAMP : pa.timestamp("ms"),
+             schema.TYPE_CLOB      : pa.string() }
+
+def parquet_value(value, column_name, column_type):
+    # Convert a value to fit the Arrow type of its column - a mismatched value
+    # is dropped rather than failing the whole file.
+
+    if value is None:
+        return None
+
+    if column_type == schema.TYPE_BIGINT:
+        return int(value) if isinstance(value, int) else None
+
+    if column_type == schema.TYPE_TIMESTAMP:
+        try:
+            if column_name in schema.date_fields:
+                # An epoch date - seconds are the first 10 digits.
+                return dt.datetime(*time.gmtime(int(value[0:10]))[:6])
+
+            # Chop off the extended milliseconds and timezone info, just like HANA.
+            return dt.datetime.fromisoformat(value[0:23])
+        except (TypeError, ValueError):
+            return None
+
+    # Complex objects are written as JSON so they can be read back.
+
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+
+    return value if isinstance(value, str) else str(value)
+
+class TableWriter:
+    '''Write the rows of one table to a Parquet file, a row group at a time.'''
+
+    def __init__(self, pa, pq, filename, columns):
+        self.pa = pa
+        self.columns = columns
+
+        types = arrow_types(pa)
+
+        self.schema = pa.schema([ (column_def["name"], types.get(column_def["type"], pa.string()))
+                                  for column_def in columns.values() ])
+
+        self.writer = pq.ParquetWriter(filename, self.schema)
+        self.buffer = { column_name : [] for column_name in columns }
+        self.buffered = 0
+        self.rows = 0
+
+    def append(self, row):
+        for column_name, column_def in self.columns.items():
+            self.buffer[column_name].append(parquet_value(row.get(column_name), column_name, column_def["type"]))
+
+        self.buffered += 1
+
+        if self.buffered >= constants.CONST_PARQUET_ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.buffered == 0:
+            return
+
+        arrays = [ self.pa.array(self.buffer[column_name], type=field.type) for column_name, field in zip(self.columns, self.schema) ]
+
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+        self.rows += self.buffered
+        self.buffer = { column_name : [] for column_name in self.columns }
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+def write_rows(writers, tables, list_data, table_name):
+    # Child lists go to their own tables while we have the row in hand.
+
+    table_writer = writers.get(table_name)
+
+    if table_writer is None:
+        return
+
+    child_tables = list(tables[table_name]["children"].items())
+
+    for row in list_data:
+        if not isinstance(row, dict):
+            continue
+
+        table_writer.append(row)
+
+        for column_name, child_name in child_tables:
+            if isinstance(row.get(column_name), list):
+                write_rows(writers, tables, row[column_name], child_name)
+
+def write_list(list_data, args):
+    logger.setLevel(session_config.log_level)
+
+    # Parquet support is optional - only needed for this format.
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.error("The pyarrow package is required for Parquet output - pip install -r requirements/parquet.txt")
+        return
+
+    if args.directory is not None and not os.path.exists(args.directory):
+        os.makedirs(args.directory, exist_ok=True)
+
+    # One pass over all the rows finds the tables, columns and types - the
+    # same schema used for HANA tables.
+
+    tables = schema.infer_schema(list_data, args.prefix)
+
+    writers = {}
+
+    try:
+        for table_name in tables:
+            if len(tables[table_name]["columns"]) == 0:
+                continue
+
+            parquet_file = table_name + ".parquet"
+
+            if args.directory is not None:
+                parquet_file = os.path.join(args.directory, parquet_file)
+
+            writers[table_name] = TableWriter(pa, pq, parquet_file, tables[table_name]["columns"])
+
+        write_rows(writers, tables, list_data, args.prefix.upper())
+    finally:
+        # Every table may have an open file, close them all.
+
+        for table_name, table_writer in writers.items():
+            table_writer.close()
+
+            logger.info(f"{table_name}: wrote {table_writer.rows} rows")
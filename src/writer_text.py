@@ -1,4 +1,4 @@
-import logging, re, time, sys, math, os
+import logging, re, time, sys, os
 
 import constants, session_config
 import json_tools as jt
@@ -40,33 +40,69 @@ class FieldFormat:
     def is_utc(self):
         return self.get_format() == "u"
     
-def lookup_value(data, field_def):
-    # Get the requested value - invalid lookups always return a None value.
-    lookup_value = ""
-    
-    # Set a default formatting to None
-    format = FieldFormat()
-    
-    # Did we get a field specification from the template that includes a path?
-    if isinstance(field_def, dict):  
-        if "path" in field_def:
-            lookup_value = jt.json_path(data, field_def["path"])
-        else:
-            # Must include a { "path" : "??" } attribute
-            logger.debug("lookup_value: path not found")
-            return lookup_value
+# Rendered lines are collected and written to the output in chunks.
+OUTPUT_CHUNK_LINES = 1000
+
+# Templates are compiled the first time they are used - see compile_template.
+# The plans are kept by template name, with the template they were compiled
+# from, so a template that is replaced is compiled again.
+compiled_templates = {}
+
+def compile_field(field_def):
+    # Everything about a field that does not depend on the data item.
+
+    field = { "get" : None, "aggregate" : None, "format" : FieldFormat(), "blank" : "" }
 
+    if isinstance(field_def, dict):
         # There may be a formatting specification for this field definition.        
         if "format" in field_def:
-            format.set_spec(field_def["format"])
+            field["format"].set_spec(field_def["format"])
 
+        # Without a path there is no value - the field is always blank.
+        if "path" in field_def:
+            field["get"] = jt.compile_path(field_def["path"])
+
+        if "aggregate" in field_def:
+            field["aggregate"] = jt.compile_path(field_def["aggregate"])
     elif isinstance(field_def, str):
-        # Specific "path" string not included in a field definition.
-        # The caller really should just call json_path.
-        lookup_value = jt.json_path(data, field_def)
-    else:
-        logger.debug(f"lookup_value: path not found: {field_def}")
-        return lookup_value
+        field["get"] = jt.compile_path(field_def)
+
+    if field["format"].get_width() is not None:
+        field["blank"] = " " * field["format"].get_width()
+
+    return field
+
+def compile_template(template):
+    '''
+    Build the render plan for a template: each row layout is split once into
+    its literal text and field slots, and each field into a path accessor and
+    its format.
+    '''
+
+    rows = []
+
+    for row in template["rows"]:
+        # re.split alternates literal text and field names: [ text, field, text, ... ]
+        parts = re.split("\\{(.*?)\\}", row["layout"])
+
+        literals = parts[0::2]
+        slots = parts[1::2]
+
+        rows.append({ "literals" : literals, 
+                      "slots"    : slots, 
+                      "fields"   : { name : compile_field(template["fields"][name]) for name in slots } })
+
+    return rows
+
+def lookup_value(data, field):
+    # Get the value for a compiled field as a list of lines - invalid lookups
+    # are always blank.
+
+    if field["get"] is None:
+        return []
+
+    lookup_value = field["get"](data)
+    format = field["format"]
 
     # We have value (if the value exists), handle type conversion and formatting.
     
@@ -79,101 +115,89 @@ def lookup_value(data, field_def):
             lookup_value = str(lookup_value)
             
         # Handle epoch/unix date formatting.
-        if len(lookup_value) > 0 and lookup_value != "" and format.is_epoch():
+        if len(lookup_value) > 0 and format.is_epoch():
             lookup_value = time.strftime('%Y-%m-%d', time.gmtime(int(lookup_value[0:10])))
 
         # Quick and dirty formatting for GB field values.
-        if len(lookup_value) > 0 and lookup_value != "" and format.is_gigabyte():
+        if len(lookup_value) > 0 and format.is_gigabyte():
             lookup_value = "{:.2f} GB".format(int(lookup_value) / constants.CONST_GIGABYTE)
     elif isinstance(lookup_value, list):
         # The user passed a list specification, we need to aggregate the values
         # into a single string.
-        if "aggregate" not in field_def:
+        if field["aggregate"] is None:
             logger.warning("aggregate specification missing")
         else:
-            aggr_value = ""
-            comma = ""
-            
-            for item in lookup_value:
-                aggr_value += comma + jt.json_path(item, field_def["aggregate"])
-                comma = ", "
-            
-            lookup_value = aggr_value
+            lookup_value = ", ".join([ field["aggregate"](item) for item in lookup_value ])
 
     # Force the value to fit in the columns by wrapping the value into multiple line
     # in the width provided.
     
-    return_list = []
-    
-    if format.get_width() is None:
-        return_list.append(lookup_value)  # return the value as provided, but in a list
-    else:
-        width = format.get_width()
-        
-        if len(lookup_value) <= format.get_width():
-            return_list.append((lookup_value + (" " * width))[:width])
-        else:
-            # Cut the list into chunks - one line per chunk of width
-            line_count = math.ceil(len(lookup_value) / width)
-            
-            for i in range(line_count):
-                start_pos = i * width
-                
-                line_value = lookup_value[start_pos:start_pos + width]
-                line_value = (line_value + (" ") * width)[:width]
-                
-                return_list.append(line_value)
+    width = format.get_width()
+
+    if width is None:
+        return [ lookup_value ]  # return the value as provided, but in a list
+
+    if len(lookup_value) <= width:
+        return [ lookup_value + field["blank"][len(lookup_value):] ]
+
+    # Cut the value into chunks - one line per chunk of width, the last one padded.
+    return_list = [ lookup_value[start_pos:start_pos + width] for start_pos in range(0, len(lookup_value), width) ]
+    return_list[-1] += field["blank"][len(return_list[-1]):]
 
     return return_list
 
-def recurse_format(data, template, output_handle):
+def render_item(item, plan, lines):
+    # For each item, there will be one or more "rows" in the plan.
+
+    for row in plan:
+        literals = row["literals"]
+        slots = row["slots"]
+        fields = row["fields"]
+
+        # Go get the data for this row/field.
+        values = { name : lookup_value(item, field) for name, field in fields.items() }
+
+        # The total lines of output for this row is driven by how many lines
+        # exist across all the (wrapped) values.
+        max_lines = max([ len(value_lines) for value_lines in values.values() ], default=0)
+
+        for current_line in range(max_lines):
+            pieces = [ literals[0] ]
+
+            for slot_index, name in enumerate(slots):
+                value_lines = values[name]
+
+                # Fill line for this value with spaces if it has no more lines.
+                pieces.append(value_lines[current_line] if current_line < len(value_lines) else fields[name]["blank"])
+                pieces.append(literals[slot_index + 1])
+
+            lines.append("".join(pieces).rstrip())
+
+def get_plan(template_name, template):
+    compiled = compiled_templates.get(template_name)
+
+    if compiled is None or compiled[0] is not template:
+        compiled = compiled_templates[template_name] = (template, compile_template(template))
+
+    return compiled[1]
+
+def recurse_format(data, template_name, output_handle):
     if data is None or not isinstance(data, list):
         logger.warning("recurse_format: invalid data - is None or not a list.")
         return
-    
+
+    plan = get_plan(template_name, constants.templates[template_name])
+    lines = []
+
     for item in data:
-        # For each item, there will be one or more "rows" attribute
-        # containing data and formatting instructions.
-        for row in template["rows"]:
-            # Locate all the field place holders in the current row
-            fields = re.findall("\\{(.*?)\\}", row["layout"]);
-            
-            # Start the list of values we will put into the place holders.
-            values = {}
-            formats = {}
-            
-            # Go get the data for this row/field.
-            for field in fields:
-                values[field] = lookup_value(item, template["fields"][field])
-                formats[field] = FieldFormat(template["fields"][field]["format"])
-            
-            # Apply the data to the formatting string.  First, ask all the values
-            # how many lines they contain (wrapped values).  The output for this
-            # total lines of output for this row is driven by how many lines exist
-            # across all the values.
-            
-            max_lines = 0
-            for value in values:
-                max_lines = max(len(values[value]), max_lines)
-            
-            # For each line, built the content based on the field values.
-
-            for current_line in range(max_lines):
-                output_row = row["layout"] # Start with a fresh layout
-                
-                for field in fields:  # Place the field values into the format
-                    value_lines = values[field]
-                    format = formats[field]
-                    
-                    if len(value_lines) > current_line:
-                        # Add the current lines value to the output
-                        output_row = output_row.replace("{" + field + "}", value_lines[current_line])
-                    else:
-                        # Fill line for this value with spaces
-                        output_row = output_row.replace("{" + field + "}", " " * format.get_width())
-                
-                # This line is complete, push it out
-                output_handle.write(output_row.rstrip() + "\n")
+        render_item(item, plan, lines)
+
+        if len(lines) >= OUTPUT_CHUNK_LINES:
+            output_handle.write("\n".join(lines) + "\n")
+            lines = []
+
+    if len(lines) > 0:
+        output_handle.write("\n".join(lines) + "\n")
             
 def write_list(list_data, args):
     logger.setLevel(session_config.log_level)
@@ -202,12 +226,9 @@ def write_list(list_data, args):
         logger.error(f"write_list_text: {args.command} template not found.")
         return
 
-    # Get the template based on the name of the command we are
-    # running.    
-    template = constants.templates[args.command]
-
-    # Loop over each item and build output lines based on the template.
-    recurse_format(list_data, template, output_handle)
+    # Loop over each item and build output lines based on the template
+    # for the command we are running.
+    recurse_format(list_data, args.command, output_handle)
 
     # If we are writing to an output file, close the file.    
     if args.directory is not None:
@@ -0,0 +1,239 @@
+"""
+End to end benchmark of the provisioner commands against the local DWC stand-in.
+
+For each scale a synthetic tenant is generated, served by the stand-in on a
+background thread, and every command is run as a separate provisioner process.
+Wall time, requests, bytes transferred (from the stand-in /__stats) and the
+peak RSS of the provisioner process are written to a JSON results file.
+
+    python benchmark.py --scales 10,100,1000 --output results.json
+    python benchmark.py --scales 10,100,1000 --baseline results.json --threshold 20
+
+With --baseline, the run fails (exit code 1) if any metric is worse than the
+baseline by more than the threshold percentage.
+"""
+
+import argparse, datetime, importlib.util, json, os, platform, subprocess, sys, tempfile, time
+import urllib.request
+
+import dwc_standin, tenant_generator
+
+PROVISIONER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "provisioner.py")
+
+# Commands to time - {space} is replaced with a space from the tenant and
+# {bulk} with a CSV of spaces to create.  The bulk commands change the tenant
+# so they run last.
+
+COMMANDS = [
+    ( "users list",               [ "users", "list" ] ),
+    ( "spaces list",              [ "spaces", "list" ] ),
+    ( "spaces list --extend",     [ "spaces", "list", "--extend" ] ),
+    ( "spaces member list",       [ "spaces", "member", "list", "{space}" ] ),
+    ( "connections list",         [ "connections", "list" ] ),
+    ( "shares list",              [ "shares", "list" ] ),
+    ( "users list -f text",       [ "users", "list", "-f", "text", "-d", "{output}" ] ),
+    ( "users list -f csv",        [ "users", "list", "-f", "csv", "-d", "{output}" ] ),
+    ( "users list -f json",       [ "users", "list", "-f", "json", "-d", "{output}" ] ),
+    ( "users list -f hana",       [ "users", "list", "-f", "hana" ] ),
+    ( "spaces list -f csv",       [ "spaces", "list", "-f", "csv", "-d", "{output}" ] ),
+    ( "spaces bulk create",       [ "spaces", "bulk", "create", "{bulk}" ] ),
+    ( "spaces bulk delete",       [ "spaces", "bulk", "delete", "{bulk}" ] ),
+]
+
+# Metrics compared against the baseline - lower is better for all of them.
+METRICS = [ "wall_seconds", "requests", "bytes", "peak_rss_kb" ]
+
+def get_stats(url):
+    with urllib.request.urlopen(f"{url}/__stats") as response:
+        return json.loads(response.read())
+
+def reset_stats(url):
+    urllib.request.urlopen(urllib.request.Request(f"{url}/__reset", method="POST")).read()
+
+def run_provisioner(argv, work_dir):
+    '''Run one provisioner process and return its exit code, wall time and peak RSS.'''
+
+    start = time.perf_counter()
+
+    process = subprocess.Popen([ sys.executable, PROVISIONER ] + argv, cwd=work_dir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    # wait4 reports the resources of just this child (not available on Windows).
+
+    if hasattr(os, "wait4"):
+        stderr = process.stderr.read()
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak_rss_kb = usage.ru_maxrss
+    else:
+        _, stderr = process.communicate()
+        peak_rss_kb = None
+
+    wall_seconds = time.perf_counter() - start
+
+    return process.returncode, wall_seconds, peak_rss_kb, stderr.decode("utf-8", errors="replace")
+
+def write_bulk_file(work_dir, tenant, count):
+    template = tenant["spaces"][0]["name"]
+    member = tenant["users"][0]["userName"]
+
+    bulk_file = os.path.join(work_dir, "bulk.csv")
+
+    with open(bulk_file, "w") as bulk_handle:
+        bulk_handle.write("Space Id,Business Name,Disk,Memory,Template,Force,User 1\n")
+
+        for index in range(count):
+            bulk_handle.write(f"BENCH_{index:05d},Bench {index},2,1,{template},false,{member}\n")
+
+    return bulk_file
+
+def benchmark_scale(scale, args):
+    users = max(scale * args.users_per_space, 10)
+    tenant = tenant_generator.generate(space_count=scale, user_count=users)
+
+    server, url = dwc_standin.start_server(tenant, latency=args.latency)
+    results = {}
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            code, _, _, stderr = run_provisioner([ "config", "--dwc-url", url, "--dwc-user", tenant_generator.ADMIN_USER,
+                                                   "--dwc-password", "standin" ], work_dir)
+
+            if code != 0:
+                raise RuntimeError(f"config failed: {stderr}")
+
+            # Log in once so every timed command reuses the saved session.
+
+            code, _, _, stderr = run_provisioner([ "users", "list" ], work_dir)
+
+            if code != 0:
+                raise RuntimeError(f"login failed: {stderr}")
+
+            values = { "space"  : tenant["spaces"][0]["name"],
+                       "output" : os.path.join(work_dir, "output"),
+                       "bulk"   : write_bulk_file(work_dir, tenant, max(scale // 10, 1)) }
+
+            os.makedirs(values["output"], exist_ok=True)
+
+            hana_available = importlib.util.find_spec("hdbcli") is not None
+
+            for name, argv in COMMANDS:
+                if args.commands is not None and name not in args.commands:
+                    continue
+
+                if "-f hana" in name and not hana_available:
+                    results[name] = { "status" : "skipped", "reason" : "hdbcli is not installed" }
+                    continue
+
+                argv = [ value.format(**values) for value in argv ]
+
+                # The fastest of the repeats is the least disturbed by the machine.
+
+                best = None
+
+                for repeat in range(args.repeat):
+                    reset_stats(url)
+
+                    code, wall_seconds, peak_rss_kb, stderr = run_provisioner([ "--workers", str(args.workers) ] + argv, work_dir)
+                    stats = get_stats(url)
+
+                    result = { "status"       : "ok" if code == 0 else "failed",
+                               "wall_seconds" : round(wall_seconds, 4),
+                               "requests"     : stats["requests"] - 1,   # Not counting the reset.
+                               "bytes"        : stats["bytes_in"] + stats["bytes_out"],
+                               "peak_rss_kb"  : peak_rss_kb }
+
+                    if code != 0:
+                        result["error"] = stderr.strip().splitlines()[-1:]
+
+                    if best is None or result["wall_seconds"] < best["wall_seconds"]:
+                        best = result
+
+                results[name] = best
+
+                print(f"{scale:>7} {name:<25} {best['status']:<7} {best['wall_seconds']:>9.3f}s {best['requests']:>8} req "
+                      f"{best['bytes']:>12} bytes {best['peak_rss_kb'] or 0:>9} KB")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return results
+
+def compare(results, baseline, threshold, min_seconds):
+    '''Return the list of metrics that regressed by more than the threshold (percent).'''
+
+    regressions = []
+
+    for scale, commands in results["scales"].items():
+        for name, result in commands.items():
+            base = baseline.get("scales", {}).get(scale, {}).get(name)
+
+            if base is None or base.get("status") != "ok":
+                continue
+
+            if result.get("status") != "ok":
+                regressions.append(f"{scale} {name}: {result.get('status')} (was ok)")
+                continue
+
+            for metric in METRICS:
+                if base.get(metric) is None or result.get(metric) is None:
+                    continue
+
+                # Very short runs are mostly noise - only compare timings above a floor.
+                if metric == "wall_seconds" and base[metric] < min_seconds:
+                    continue
+
+                limit = base[metric] * (1 + threshold / 100)
+
+                if result[metric] > limit:
+                    change = (result[metric] / base[metric] - 1) * 100 if base[metric] else float("inf")
+                    regressions.append(f"{scale} {name} {metric}: {base[metric]} -> {result[metric]} (+{change:.1f}%)")
+
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the provisioner against the local DWC stand-in.")
+    parser.add_argument("-s", "--scales",          help="comma separated numbers of spaces (default=10,100)", default="10,100")
+    parser.add_argument("-u", "--users-per-space", help="users generated per space (default=5)", type=int, default=5)
+    parser.add_argument("-c", "--commands",        help="only run these commands (by name, comma separated)")
+    parser.add_argument("-w", "--workers",         help="provisioner --workers value (default=8)", type=int, default=8)
+    parser.add_argument("-l", "--latency",         help="stand-in latency per request in milliseconds (default=0)", type=float, default=0)
+    parser.add_argument("-r", "--repeat",          help="runs per command, the fastest is kept (default=1)", type=int, default=1)
+    parser.add_argument("-o", "--output",          help="results file (default=benchmark_results.json)", default="benchmark_results.json")
+    parser.add_argument("-b", "--baseline",        help="results file to compare against")
+    parser.add_argument("-t", "--threshold",       help="allowed regression in percent (default=20)", type=float, default=20)
+    parser.add_argument("--min-seconds",           help="ignore wall time changes for commands faster than this (default=0.5)", type=float, default=0.5)
+
+    args = parser.parse_args()
+
+    if args.commands is not None:
+        args.commands = [ name.strip() for name in args.commands.split(",") ]
+
+    results = { "timestamp" : datetime.datetime.now().isoformat(timespec="seconds"),
+                "python"    : platform.python_version(),
+                "platform"  : platform.platform(),
+                "workers"   : args.workers,
+                "latency"   : args.latency,
+                "scales"    : {} }
+
+    for scale in [ int(scale) for scale in args.scales.split(",") ]:
+        results["scales"][str(scale)] = benchmark_scale(scale, args)
+
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+
+    print(f"Results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+        print(f"No regressions above {args.threshold}% against {args.baseline}")
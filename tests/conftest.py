@@ -0,0 +1,39 @@
+import os, subprocess, sys
+
+import pytest
+
+# The provisioner modules are imported by name, like provisioner.py does.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import dwc_standin, tenant_generator
+
+PROVISIONER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "provisioner.py")
+
+@pytest.fixture
+def run_provisioner():
+    '''Run provisioner.py as a separate process in the work directory - returns the completed process.'''
+
+    def run(work_dir, *argv, text=True):
+        return subprocess.run([ sys.executable, PROVISIONER ] + list(argv), cwd=work_dir, capture_output=True, text=text)
+
+    return run
+
+@pytest.fixture
+def standin():
+    '''Serve a generated tenant from the DWC stand-in - call it with the tenant size, get (tenant, url).'''
+
+    servers = []
+
+    def start(space_count=4, user_count=10):
+        tenant = tenant_generator.generate(space_count=space_count, user_count=user_count)
+        server, url = dwc_standin.start_server(tenant)
+
+        servers.append(server)
+
+        return tenant, url
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
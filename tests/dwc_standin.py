@@ -0,0 +1,404 @@
+"""
+Local stand-in for a DWC tenant.  The server implements the endpoints the provisioner
+uses (see DWCSession.urls) plus a stub of the SAML login sequence, serving a synthetic
+tenant built by tenant_generator.py.  Point the provisioner at the stand-in with:
+
+    python dwc_standin.py --spaces 100 --users 1000 --port 8765
+    provisioner config --dwc-url http://127.0.0.1:8765 --dwc-user PROVISIONER --dwc-password x
+
+Two extra endpoints support benchmarking: GET /__stats returns request and byte
+counts, POST /__reset clears them.
+"""
+
+import argparse, json, logging, random, re, threading, time, uuid
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tenant_generator
+
+logger = logging.getLogger("dwc_standin")
+
+CONST_SESSION_COOKIE = "STANDIN_SESSION"
+
+class StandinTenant:
+    '''The tenant state - all access is serialized by a lock.'''
+
+    def __init__(self, tenant):
+        self.lock = threading.Lock()
+        self.tenant = tenant
+        self.sessions = set()
+        self.space_index = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = { "requests" : 0, "bytes_in" : 0, "bytes_out" : 0, "endpoints" : {} }
+
+    def record(self, method, endpoint, bytes_in, bytes_out):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_in"] += bytes_in
+            self.stats["bytes_out"] += bytes_out
+
+            key = f"{method} {endpoint}"
+            self.stats["endpoints"][key] = self.stats["endpoints"].get(key, 0) + 1
+
+    def find_space(self, space_id):
+        # Spaces are found by name or id - index them once, creating or
+        # deleting a space drops the index.
+
+        if self.space_index is None:
+            self.space_index = {}
+
+            for space in self.tenant["spaces"]:
+                self.space_index[space["id"]] = space
+                self.space_index[space["name"]] = space
+
+        return self.space_index.get(space_id)
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-alive, just like the real tenant.
+    disable_nagle_algorithm = True  # Headers and body are separate writes - don't delay the body.
+
+    # Set by the server factory.
+    tenant = None
+    latency = 0
+    fail_rate = 0
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    # ---- plumbing ----------------------------------------------------------
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+
+        return self.rfile.read(length) if length > 0 else b""
+
+    def send(self, status, body, content_type="application/json", cookies=None, endpoint=None, body_in=b""):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+
+        for cookie in cookies or []:
+            self.send_header("Set-Cookie", cookie)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.tenant.record(self.command, endpoint or self.path.split("?")[0], len(body_in), len(body))
+
+    def host_url(self):
+        return f"http://{self.headers['Host']}"
+
+    def authenticated(self):
+        cookies = self.headers.get("Cookie", "")
+        match = re.search(CONST_SESSION_COOKIE + r"=([^;]+)", cookies)
+
+        return match is not None and match.group(1) in self.tenant.sessions
+
+    def simulate_network(self):
+        if self.latency > 0:
+            time.sleep(self.latency / 1000)
+
+        if self.fail_rate > 0 and random.random() < self.fail_rate:
+            self.send(503, "service unavailable", content_type="text/plain", endpoint="__fault")
+            return True
+
+        return False
+
+    # ---- verbs -------------------------------------------------------------
+
+    def do_GET(self):
+        self.route("GET", b"")
+
+    def do_POST(self):
+        self.route("POST", self.read_body())
+
+    def do_PUT(self):
+        self.route("PUT", self.read_body())
+
+    def do_DELETE(self):
+        self.route("DELETE", b"")
+
+    def route(self, method, body):
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        query = urllib.parse.parse_qs(parsed.query)
+
+        if path == "/__stats":
+            return self.send(200, self.tenant.stats, endpoint="__stats")
+
+        if path == "/__reset":
+            self.tenant.reset_stats()
+            return self.send(200, {}, endpoint="__reset")
+
+        # The SAML conversation - these pages are never authenticated.
+
+        if path == "/dwaas-ui/index.html":
+            return self.login_start()
+        if path == "/oauth/authorize":
+            return self.send(200, '<html><body><a href="saml/login">continue</a></body></html>', "text/html")
+        if path == "/saml/login":
+            return self.login_form(method, body)
+        if path == "/saml/callback":
+            return self.login_complete(body)
+        if path == "/passcode":
+            return self.send(200, "<html><body><h2><b>STANDIN0</b></h2></body></html>", "text/html")
+
+        if self.simulate_network():
+            return
+
+        if not self.authenticated():
+            return self.send(401, { "code" : 401, "details" : { "message" : "not authenticated" } })
+
+        with self.tenant.lock:
+            status, result, endpoint = self.api(method, path, query, parsed.query, body)
+
+        self.send(status, result, endpoint=endpoint, body_in=body)
+
+    # ---- SAML stub ---------------------------------------------------------
+
+    def login_start(self):
+        # The provisioner picks the signature and the next location out of a single line.
+        page = f'<script>document.cookie="signature=STANDINSIG;";location="{self.host_url()}/oauth/authorize?client=standin"</script>'
+
+        self.send(200, page, "text/html")
+
+    def login_form(self, method, body):
+        form = urllib.parse.parse_qs(body.decode("utf-8"))
+
+        if method == "GET":
+            return self.send(200, "<html><body>identity provider</body></html>", "text/html")
+
+        if "j_username" not in form:
+            inputs = "".join(f'<input name="{name}" value="{name}-value"/>' for name in [ "authenticity_token", "idpSSOEndpoint", "RelayState",
+                                                                                          "SAMLRequest", "spId", "spName", "xsrfProtection" ])
+            return self.send(200, f"<html><body><form>{inputs}</form></body></html>", "text/html")
+
+        page = (f'<html><body><form action="{self.host_url()}/saml/callback">'
+                '<input name="authenticity_token" value="token"/>'
+                '<input name="SAMLResponse" value="response"/>'
+                '<input name="RelayState" value="state"/>'
+                '</form></body></html>')
+
+        self.send(200, page, "text/html")
+
+    def login_complete(self, body):
+        session_id = uuid.uuid4().hex
+
+        with self.tenant.lock:
+            self.tenant.sessions.add(session_id)
+
+        self.send(200, "<html><body>logged in</body></html>", "text/html", cookies=[ f"{CONST_SESSION_COOKIE}={session_id}; Path=/" ])
+
+    # ---- REST API ----------------------------------------------------------
+
+    def api(self, method, path, query, raw_query, body):
+        tenant = self.tenant.tenant
+
+        if path == "/sap/fpa/services/rest/epm/session":
+            admin = tenant["admin"]
+            return 200, { "user" : { "userName" : admin["userName"], "email" : admin["email"] },
+                          "session" : { "tenant" : [ { "id" : tenant["tenant_id"] } ] } }, "logon"
+
+        if path == "/sap/fpa/services/rest/epm/security/list/users":
+            return 200, tenant["users"], "users"
+
+        if path == "/dwaas-core/repository/spaces":
+            return 200, { "results" : tenant["spaces"] }, "spaces"
+
+        if path == "/dwaas-core/resources/spaces":
+            return 200, tenant["resources"], "spaces_resources"
+
+        if path == "/dwaas-core/api/v1/content":
+            return self.api_space(method, query["space"][0], body)
+
+        if path == "/dwaas-core/repository/shares":
+            if method == "POST":
+                return self.api_share_add(json.loads(body))
+
+            return self.api_share_list(query["spaceName"][0], query.get("objectNames", [ "" ])[0])
+
+        if path.startswith("/dwaas-core/repository/remotes"):
+            return self.api_connections(method, path, query, body)
+
+        if path.startswith("/dwaas-core/monitor/") and path.endswith("/remoteTables"):
+            space_name = path.split("/")[3]
+            tables = [ object for object in tenant["objects"].get(space_name, []) if object["technical_type"] == "DWC_REMOTE_TABLE" ]
+            return 200, { "tables" : tables }, "remotetables"
+
+        if path == "/dwaas-core/c4s/internal_services/loadContent":
+            space_name = json.loads(body)["SpaceID"]
+            return 200, { "Content" : [ { "Title" : f"{space_name} perspective", "EntityType" : "Perspective" } ] }, "businessbuilder"
+
+        if path == "/dwaas-core/repository/search/$all":
+            return self.api_search(urllib.parse.unquote(raw_query))
+
+        if path == "/dwaas-core/datasources/getchildren":
+            space_name = query["space"][0]
+            hashtags = [ item["id"] for item in json.loads(query["path"][0]) ]
+            items = [ { "id" : f"{hashtag}.TABLE_{index}", "type" : "table" } for hashtag in hashtags for index in range(3) ]
+            return 200, { "items" : items }, "dbuser_objects"
+
+        return 404, { "code" : 404, "details" : { "message" : f"unknown path {path}" } }, "unknown"
+
+    def api_space(self, method, space_name, body):
+        tenant = self.tenant.tenant
+
+        if method == "GET":
+            if space_name not in tenant["definitions"]:
+                return 404, { "code" : 404, "details" : { "message" : f"space {space_name} not found" } }, "space"
+
+            return 200, { space_name : { "spaceDefinition" : tenant["definitions"][space_name] } }, "space"
+
+        if method == "PUT":
+            definition = json.loads(body)[space_name]["spaceDefinition"]
+
+            if space_name not in tenant["definitions"]:
+                tenant["spaces"].append({ "name" : space_name, "id" : str(uuid.uuid4()), "businessName" : definition.get("label", space_name) })
+                tenant["resources"][space_name] = { "memory" : { "assigned" : definition.get("assignedRam", 0), "used" : 0 } }
+                tenant["connections"][space_name] = []
+                tenant["objects"][space_name] = []
+
+            tenant["definitions"][space_name] = definition
+            self.tenant.space_index = None
+
+            return 200, {}, "space"
+
+        if method == "DELETE":
+            tenant["spaces"] = [ space for space in tenant["spaces"] if space["name"] != space_name ]
+
+            for collection in [ "definitions", "resources", "connections", "objects", "shares" ]:
+                tenant[collection].pop(space_name, None)
+
+            self.tenant.space_index = None
+
+            return 200, {}, "space"
+
+        return 405, {}, "space"
+
+    def api_share_add(self, share):
+        tenant = self.tenant.tenant
+        space_shares = tenant["shares"].setdefault(share["spaceName"], {})
+
+        for object_name in share["objectNames"]:
+            targets = space_shares.setdefault(object_name, [])
+
+            for target in share["shareSpaceNames"]:
+                if { "name" : target } not in targets:
+                    targets.append({ "name" : target })
+
+            for object in tenant["objects"].get(share["spaceName"], []):
+                if object["name"] == object_name:
+                    object["shared_with_space_name"] = [ target["name"] for target in targets ]
+
+        return 200, {}, "shares"
+
+    def api_share_list(self, space_name, object_names):
+        space_shares = self.tenant.tenant["shares"].get(space_name, {})
+        results = {}
+
+        for object_name in object_names.split(","):
+            if object_name in space_shares:
+                results[object_name] = space_shares[object_name]
+
+        return 200, results, "share_list"
+
+    def api_connections(self, method, path, query, body):
+        tenant = self.tenant.tenant
+        space = self.tenant.find_space(query.get("space_ids", [ "" ])[0])
+
+        if space is None:
+            return 200, { "results" : [] }, "connections"
+
+        connections = tenant["connections"].setdefault(space["name"], [])
+
+        if method == "GET":
+            return 200, { "results" : connections }, "connections"
+
+        if method == "POST":
+            data = json.loads(body)["data"]
+            connections.append({ "id" : str(uuid.uuid4()), "name" : data["name"], "businessName" : data.get("businessName", data["name"]),
+                                 "typeId" : data.get("typeId", "UNKNOWN"), "space_name" : space["name"], "space_id" : space["id"] })
+            return 200, {}, "connection"
+
+        if method == "DELETE":
+            connection_id = path.rstrip("/").split("/")[-1]
+            tenant["connections"][space["name"]] = [ connection for connection in connections if connection["id"] != connection_id ]
+            return 200, {}, "connection_delete"
+
+        return 405, {}, "connections"
+
+    def api_search(self, raw_query):
+        objects = self.tenant.tenant["objects"]
+
+        space_match = re.search(r'space_name:EQ:"([^"]*)"', raw_query)
+        shared_only = raw_query.find("shared_with_space_name:NE") != -1
+
+        if space_match is not None:
+            candidates = objects.get(space_match.group(1), [])
+        else:
+            candidates = [ object for space_objects in objects.values() for object in space_objects ]
+
+        if shared_only:
+            candidates = [ object for object in candidates if len(object["shared_with_space_name"]) > 0 ]
+
+        return 200, { "@odata.count" : len(candidates), "value" : candidates }, "builder_objects"
+
+def make_server(tenant, host="127.0.0.1", port=0, latency=0, fail_rate=0):
+    '''Build (but do not start) a stand-in server for the tenant document.'''
+
+    handler = type("BoundStandinHandler", (StandinHandler,), { "tenant"    : StandinTenant(tenant),
+                                                               "latency"   : latency,
+                                                               "fail_rate" : fail_rate })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.tenant = handler.tenant
+
+    return server
+
+def start_server(tenant, **kwargs):
+    '''Start a stand-in server on a background thread and return it with its URL.'''
+
+    server = make_server(tenant, **kwargs)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address[:2]
+
+    return server, f"http://{host}:{port}"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for a DWC tenant.")
+    parser.add_argument("-t", "--tenant",    help="tenant JSON from tenant_generator.py (default=generate one)")
+    parser.add_argument("-s", "--spaces",    help="spaces to generate when no tenant file is given (default=10)", type=int, default=10)
+    parser.add_argument("-u", "--users",     help="users to generate when no tenant file is given (default=100)", type=int, default=100)
+    parser.add_argument("--host",            help="listen address (default=127.0.0.1)", default="127.0.0.1")
+    parser.add_argument("-p", "--port",      help="listen port (default=8765)", type=int, default=8765)
+    parser.add_argument("-l", "--latency",   help="added latency per API request in milliseconds (default=0)", type=float, default=0)
+    parser.add_argument("-f", "--fail-rate", help="fraction of API requests answered with 503 (default=0)", type=float, default=0)
+
+    args = parser.parse_args()
+
+    if args.tenant is not None:
+        with open(args.tenant, "r") as tenant_file:
+            tenant = json.load(tenant_file)
+    else:
+        tenant = tenant_generator.generate(args.spaces, args.users)
+
+    server = make_server(tenant, args.host, args.port, args.latency, args.fail_rate)
+
+    print(f"DWC stand-in listening on http://{args.host}:{args.port} - {len(tenant['spaces'])} space(s), {len(tenant['users'])} user(s)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,123 @@
+"""
+Compare the two ways writer_hana loads a table - batched INSERT statements and
+IMPORT FROM a staged CSV file - against the sqlite stand-in for the HANA client
+in hana_standin.  Synthetic users from tenant_generator.py are written in each
+mode and the rows/sec of each are reported, after checking both modes loaded
+the same rows.  The stand-in is much slower than HANA at its own work (reading
+the staged file, storing the rows), so the provisioner side of the load - the
+elapsed time less the time spent in sqlite - is reported as well.
+
+    python hana_benchmark.py --users 100000 --latency 2
+
+--latency adds a network round trip, in milliseconds, to every statement - the
+difference between the modes is the number of round trips to the database.
+"""
+
+import argparse, configparser, os, sys, tempfile, time
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "src"))
+sys.path.insert(0, os.path.join(TESTS_DIR, "hana_standin"))
+
+import session_config, users, writer_hana
+import tenant_generator
+
+def configure(load, batch_size, import_dir):
+    config = configparser.ConfigParser()
+
+    config["hana"] = { "hana_host"       : "localhost",
+                       "hana_port"       : "30015",
+                       "hana_user"       : "BENCHMARK",
+                       "hana_password"   : session_config.fn_blur("BENCHMARK"),
+                       "hana_encrypt"    : "False",
+                       "hana_sslverify"  : "False",
+                       "hana_batch_size" : str(batch_size),
+                       "hana_load"       : load,
+                       "hana_import_dir" : import_dir }
+
+    session_config.session_config = config
+
+def table_contents(ddl):
+    # Every row of every table, with timestamps in one format - INSERT binds
+    # "2022-04-01T10:11:12" where the staged file has "2022-04-01 10:11:12",
+    # and HANA stores the same value for both.
+
+    contents = {}
+
+    for table_name in ddl:
+        if "create" not in ddl[table_name]:
+            continue
+
+        writer_hana.cursor.execute(f"select * from {table_name}")
+
+        contents[table_name] = sorted([ tuple(value.replace("T", " ", 1) if isinstance(value, str) else value for value in row)
+                                        for row in writer_hana.cursor.fetchall() ], key=repr)
+
+    return contents
+
+def run(load, user_list, args, import_dir):
+    configure(load, args.batch_size, import_dir)
+
+    # Each run gets a new connection, and a new database.
+    writer_hana.conn = None
+    writer_hana.cursor = None
+
+    write_args = argparse.Namespace(prefix="users", directory=None)
+
+    start = time.perf_counter()
+
+    writer_hana.write_list(user_list, write_args)
+
+    elapsed = time.perf_counter() - start
+    database_seconds = writer_hana.conn.database_seconds
+
+    contents = table_contents(writer_hana.create_ddl(user_list, write_args))
+
+    writer_hana.conn.close()
+
+    return elapsed, database_seconds, contents
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare HANA INSERT and IMPORT loading on the sqlite stand-in.")
+    parser.add_argument("-u", "--users",      help="number of users (default=20000)", type=int, default=20000)
+    parser.add_argument("-l", "--latency",    help="milliseconds added to every statement (default=1)", type=float, default=1)
+    parser.add_argument("-b", "--batch-size", help="INSERT batch size (default=1000)", type=int, default=1000)
+    parser.add_argument("--seed",             help="random seed (default=42)", type=int, default=42)
+
+    args = parser.parse_args()
+
+    os.environ["HANA_STANDIN_LATENCY"] = str(args.latency)
+
+    tenant = tenant_generator.generate(space_count=0, user_count=args.users, seed=args.seed)
+    user_list = list(users.prepare_users(tenant["users"]))
+
+    with tempfile.TemporaryDirectory() as import_dir:
+        results = { load : run(load, user_list, args, import_dir) for load in [ "insert", "import" ] }
+
+    insert_contents = results["insert"][2]
+    import_contents = results["import"][2]
+
+    if insert_contents != import_contents:
+        print("IMPORT loaded different rows than INSERT", file=sys.stderr)
+        sys.exit(1)
+
+    row_count = sum([ len(rows) for rows in insert_contents.values() ])
+
+    for table_name, rows in insert_contents.items():
+        print(f"{table_name:<20} {len(rows):>10} rows")
+
+    print(f"\n{'':<10} {'elapsed':>10} {'rows/sec':>10} {'sqlite':>10} {'provisioner':>12} {'rows/sec':>10}")
+
+    for load, (elapsed, database_seconds, _) in results.items():
+        client_seconds = elapsed - database_seconds
+
+        print(f"{load:<10} {elapsed:>9.2f}s {row_count / elapsed:>10.0f} {database_seconds:>9.2f}s "
+              f"{client_seconds:>11.2f}s {row_count / client_seconds:>10.0f}")
+
+    insert_client = results["insert"][0] - results["insert"][1]
+    import_client = results["import"][0] - results["import"][1]
+
+    print(f"\nIMPORT is {results['insert'][0] / results['import'][0]:.1f}x the speed of INSERT overall, "
+          f"{insert_client / import_client:.1f}x on the provisioner side "
+          f"({args.latency:g}ms per statement, batches of {args.batch_size})")
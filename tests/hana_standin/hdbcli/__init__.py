@@ -0,0 +1,10 @@
+"""
+Local stand-in for the SAP HANA client (hdbcli), backed by sqlite3.  Put the
+hana_standin directory first on PYTHONPATH to send writer_hana to it:
+
+    PYTHONPATH=tests/hana_standin python src/provisioner.py users list -f hana
+
+Set HANA_STANDIN_DB to keep the tables in a sqlite file (default in memory), and
+HANA_STANDIN_LATENCY to add a network round trip, in milliseconds, to every
+statement sent to the database.
+"""
@@ -0,0 +1,150 @@
+"""
+The part of hdbcli.dbapi used by writer_hana, on sqlite3.  HANA statements are
+rewritten for sqlite: column tables become plain tables, "drop ... cascade"
+drops the table, "upsert ... with primary key" replaces rows by key, "alter
+table ... add (...)" adds a column, and IMPORT FROM CSV FILE reads the file
+on the "server" - the local file system.  SYS.TABLE_COLUMNS is answered from
+the declared types of the table.
+
+Like HANA, a BIGINT column only takes integers and an NVARCHAR(n) column only
+takes strings of up to n characters - sqlite would store any value.
+
+Each connection adds up the time spent in sqlite as database_seconds, so a
+benchmark can tell the work of the client from the work of the stand-in.
+"""
+
+import os, re, sqlite3, time
+
+IMPORT_PATTERN = re.compile(r"\s*import\s+from\s+csv\s+file\s+'([^']*)'\s+into\s+(\S+)", re.IGNORECASE)
+TABLE_COLUMNS_PATTERN = re.compile(r"\s*select\s+.*\s+from\s+sys\.table_columns\s+", re.IGNORECASE | re.DOTALL)
+
+# The columns of a table, with the type name split from its length.
+TABLE_COLUMNS_SQL = ("select name, case when instr(type, '(') > 0 then substr(type, 1, instr(type, '(') - 1) else type end "
+                     "from pragma_table_info(?) order by cid")
+
+# One field of the staged file and the character after it - like HANA, an
+# unquoted empty field is NULL and a quoted empty field is an empty string.
+FIELD_PATTERN = re.compile(r'("(?:[^"]|"")*"|[^,\n"]*)(,|\n)')
+
+class Error(Exception):
+    def __init__(self, errortext):
+        super().__init__(errortext)
+        self.errortext = errortext
+
+def round_trip():
+    # Every statement pays the configured network latency once.
+
+    latency = float(os.environ.get("HANA_STANDIN_LATENCY", 0))
+
+    if latency > 0:
+        time.sleep(latency / 1000)
+
+def translate(sql):
+    sql = re.sub(r"^\s*create\s+column\s+table", "create table", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\s+cascade\s*$", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"^\s*upsert\s+(.*)\s+with\s+primary\s+key\s*$", r"insert or replace into \1", sql, flags=re.IGNORECASE | re.DOTALL)
+    sql = re.sub(r"^\s*(alter\s+table\s+\S+\s+add)\s*\((.*)\)\s*$", r"\1 column \2", sql, flags=re.IGNORECASE | re.DOTALL)
+
+    if re.match(r"\s*(create|alter)\s+table", sql, flags=re.IGNORECASE):
+        sql = re.sub(r'("[^"]+") BIGINT\b', r"\1 BIGINT CHECK (typeof(\1) in ('integer', 'null'))", sql)
+        sql = re.sub(r'("[^"]+") NVARCHAR\((\d+)\)', r"\1 NVARCHAR(\2) CHECK (length(\1) <= \2)", sql)
+
+    return sql
+
+def read_rows(text):
+    row = []
+
+    for field, separator in FIELD_PATTERN.findall(text):
+        if field.startswith('"'):
+            row.append(field[1:-1].replace('""', '"'))
+        else:
+            row.append(field if field != "" else None)
+
+        if separator == "\n":
+            yield row
+            row = []
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.db.cursor()
+
+    def execute(self, sql, parameters=()):
+        round_trip()
+
+        match = IMPORT_PATTERN.match(sql)
+        start = time.perf_counter()
+
+        try:
+            if match is not None:
+                self.import_csv(match.group(1), match.group(2))
+            elif TABLE_COLUMNS_PATTERN.match(sql):
+                self.cursor.execute(TABLE_COLUMNS_SQL, parameters)
+            else:
+                self.cursor.execute(translate(sql), parameters)
+        except (sqlite3.Error, OSError) as e:
+            raise Error(str(e))
+        finally:
+            self.connection.database_seconds += time.perf_counter() - start
+
+    def executemany(self, sql, rows):
+        round_trip()
+
+        start = time.perf_counter()
+
+        try:
+            self.cursor.executemany(translate(sql), rows)
+        except sqlite3.Error as e:
+            raise Error(str(e))
+        finally:
+            self.connection.database_seconds += time.perf_counter() - start
+
+    def import_csv(self, filename, table_name):
+        column_count = len(self.cursor.execute(f"pragma table_info({table_name})").fetchall())
+
+        if column_count == 0:
+            raise Error(f"invalid table name: {table_name}")
+
+        insert_sql = f"insert into {table_name} values ({','.join([ '?' ] * column_count)})"
+
+        with open(filename, "r", newline="", encoding="utf-8") as staged_handle:
+            self.cursor.executemany(insert_sql, read_rows(staged_handle.read()))
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+class Connection:
+    def __init__(self, database):
+        self.db = sqlite3.connect(database)
+        self.database_seconds = 0
+
+    def setautocommit(self, autocommit):
+        self.db.isolation_level = None if autocommit else ""
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        round_trip()
+
+        start = time.perf_counter()
+
+        self.db.commit()
+
+        self.database_seconds += time.perf_counter() - start
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+def connect(address=None, port=None, user=None, password=None, **kwargs):
+    return Connection(os.environ.get("HANA_STANDIN_DB", ":memory:"))
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of the JSONPath lookups used by the text templates: the path
+interpreter json_tools had before paths were compiled, json_tools.json_path
+(compiled paths looked up in the cache) and a compiled path called directly.
+
+    python json_path_benchmark.py --count 100000
+"""
+
+import argparse, os, re, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import json_tools
+
+TEST_DATA = { "simpleField" : "simple fld value",
+              "subobj"      : { "test" : "bob",
+                                "members" : [ { "name" : "mark" }, { "name" : "sally" }, { "name" : "jane" } ] },
+              "resources"   : { "memory" : { "assigned" : 2000000000, "used" : 123456789 } },
+              "dbusers"     : { "SALES#ETL" : {}, "SALES#BI" : {} } }
+
+# The kinds of paths used by the text templates.
+PATHS = [ "$.simpleField", "$.resources.memory.used", "$.subobj.members[*]", "$.subobj.members[1]", "$.dbusers.*" ]
+
+def interpret_path(data, field):
+    # The path interpreter json_tools had before paths were compiled - the
+    # path is parsed on every call.
+
+    if not isinstance(field, str) or len(field.strip()) == 0:
+        return None
+
+    # Always return None if the lookup fails.
+    json_value = None
+
+    # We want to be able to subscript the path elements as we loop - split on dot.
+    path_specs = field.strip().split(".")
+
+    for path_indx in range(len(path_specs)):
+        path_spec = path_specs[path_indx]
+
+        if path_spec == "$":
+            json_value = data
+        elif path_spec.startswith("*"):  # Expecting a dictionary
+            # We must be on a dictionary or array.
+            if isinstance(json_value, list):
+                return json_value
+
+            if isinstance(json_value, dict):
+                dict_value = []
+
+                for key in json_value.keys():
+                    dict_value.append({ "key" : key, "value" : json_value[key] })
+
+                return dict_value
+        elif path_spec.find("[") != -1 and path_spec.endswith("]"):
+            array_spec = re.search(r"\[(.*?)\]", path_spec)
+            path_spec = path_spec[0:path_spec.find("[")]
+
+            json_value = json_value[path_spec]  # Pull out the array
+
+            if array_spec.group(1) != "*":
+                array_index = int(array_spec.group(1))
+
+                if len(json_value) == 0 or array_index > len(json_value) - 1:
+                    json_value = None
+                else:
+                    json_value = [ json_value[array_index] ]
+        else:
+            if path_spec not in json_value:
+                json_value = None
+                break
+            else:
+                json_value = json_value[path_spec]
+
+    return json_value
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare interpreted and compiled JSONPath lookups.")
+    parser.add_argument("-c", "--count", help="lookups per path (default=100000)", type=int, default=100000)
+
+    args = parser.parse_args()
+
+    for path in PATHS:
+        if interpret_path(TEST_DATA, path) != json_tools.json_path(TEST_DATA, path):
+            print(f"{path}: compiled path differs from the interpreter", file=sys.stderr)
+            sys.exit(1)
+
+        interpreted = timeit.timeit(lambda: interpret_path(TEST_DATA, path), number=args.count)
+        cached = timeit.timeit(lambda: json_tools.json_path(TEST_DATA, path), number=args.count)
+
+        accessor = json_tools.compile_path(path)
+        compiled = timeit.timeit(lambda: accessor(TEST_DATA), number=args.count)
+
+        print(f"{path:<26} interpreted {interpreted / args.count * 1e6:6.2f} us   json_path {cached / args.count * 1e6:6.2f} us   "
+              f"compiled {compiled / args.count * 1e6:6.2f} us   ({interpreted / compiled:4.1f}x)")
@@ -0,0 +1,183 @@
+"""
+Generate a synthetic DWC tenant for the local stand-in server (dwc_standin.py).  The
+tenant is a single JSON document holding the spaces, space definitions, users,
+connections, shares and repository objects the stand-in serves back to the provisioner.
+
+    python tenant_generator.py --spaces 1000 --users 5000 --output tenant-1k.json
+"""
+
+import argparse, json, random, uuid, logging
+
+logger = logging.getLogger("tenant_generator")
+
+CONST_GIGABYTE = 1000000000
+
+ADMIN_USER = "PROVISIONER"
+ADMIN_EMAIL = "provisioner@example.com"
+
+roles = [ "PROFILE:sap.epm:BI_Admin", "PROFILE:sap.epm:BI_Content_Creator",
+          "PROFILE:sap.epm:Application_Creator", "PROFILE:sap.epm:Viewer",
+          "PROFILE:t.V:DW_Modeler", "PROFILE:t.V:DW_Integrator" ]
+
+connection_types = [ "HANA", "S3", "AZURESQL", "BW", "ODATA", "GENERICJDBC" ]
+
+builder_types = [ "DWC_LOCAL_TABLE", "DWC_REMOTE_TABLE", "DWC_VIEW", "DWC_ERMODEL", "DWC_DATAFLOW" ]
+
+def make_user(index):
+    user_name = f"USER{index:06d}"
+    email = f"user.{index:06d}@example.com"
+
+    user_roles = random.sample(roles, random.randint(0, 3))
+
+    return { "userName"   : user_name,
+             "parameters" : { "EMAIL"                  : email,
+                              "FIRST_NAME"             : f"First{index}",
+                              "LAST_NAME"              : f"Last{index}",
+                              "DISPLAY_NAME"           : f"First{index} Last{index}",
+                              "MANAGER"                : "",
+                              "NUMBER_OF_DAYS_VISITED" : str(random.randint(0, 400)),
+                              "LAST_LOGIN_DATE"        : str(1650000000000 + random.randint(0, 10000000000)) },
+             "metadata"   : { "isSamlEnabled" : True,
+                              "samlUserMapping#" : 1,
+                              "createTime"    : "2022-04-01T10:11:12.123456Z" },
+             "roles"      : ";".join(user_roles),
+             "isConcurrent" : False }
+
+def make_space(index, users):
+    space_name = f"SPACE_{index:05d}"
+    space_guid = str(uuid.UUID(int=random.getrandbits(128)))
+
+    member_count = min(len(users), random.randint(1, 20))
+    members = [ { "name" : user["userName"], "type" : "user" } for user in random.sample(users, member_count) ]
+
+    # Every other space includes the administrator so member-only
+    # queries return data for some, but not all, spaces.
+
+    if index % 2 == 0:
+        members.append({ "name" : ADMIN_USER, "type" : "user" })
+
+    dbusers = {}
+
+    for dbuser_index in range(random.randint(0, 2)):
+        dbusers[f"{space_name}#DBU{dbuser_index}"] = { "ingestion" : { "auditing" : { "dppRead" : { "isAuditPolicyActive" : False } } },
+                                                       "consumption" : { "consumptionWithGrant" : False } }
+
+    summary = { "name"         : space_name,
+                "id"           : space_guid,
+                "businessName" : f"Space {index}",
+                "creator"      : ADMIN_USER,
+                "creation_date": "2022-04-01T10:11:12.123Z" }
+
+    definition = { "version"         : "1.0.4",
+                   "label"           : f"Space {index}",
+                   "assignedStorage" : 2 * CONST_GIGABYTE,
+                   "assignedRam"     : CONST_GIGABYTE,
+                   "priority"        : 5,
+                   "auditing"        : { "dppRead" : { "retentionPeriod" : 7, "isAuditPolicyActive" : False } },
+                   "allowConsumption": False,
+                   "enableDataLake"  : False,
+                   "members"         : members,
+                   "dbusers"         : dbusers,
+                   "hdicontainers"   : {},
+                   "workloadType"    : "default" }
+
+    resources = { "memory" : { "assigned" : CONST_GIGABYTE, "used" : random.randint(0, CONST_GIGABYTE) },
+                  "disk"   : { "assigned" : 2 * CONST_GIGABYTE, "used" : random.randint(0, 2 * CONST_GIGABYTE) } }
+
+    return summary, definition, resources
+
+def make_connections(space_name, space_guid, count):
+    connections = []
+
+    for index in range(count):
+        connections.append({ "id"                : str(uuid.UUID(int=random.getrandbits(128))),
+                             "name"              : f"CONN_{index}",
+                             "businessName"      : f"Connection {index} of {space_name}",
+                             "typeId"            : random.choice(connection_types),
+                             "space_name"        : space_name,
+                             "space_id"          : space_guid,
+                             "modification_date" : "2022-05-01T10:11:12.123Z",
+                             "creation_date"     : "2022-04-01T10:11:12.123Z" })
+
+    return connections
+
+def make_objects(space_name, count):
+    objects = []
+
+    for index in range(count):
+        objects.append({ "name"                   : f"{space_name}_OBJ_{index}",
+                         "space_name"             : space_name,
+                         "technical_type"         : random.choice(builder_types),
+                         "business_name"          : f"Object {index}",
+                         "shared_with_space_name" : [] })
+
+    return objects
+
+def generate(space_count=10, user_count=100, connections=2, objects=5, share_ratio=0.2, seed=42):
+    '''Build a tenant document with the requested number of spaces and users.'''
+
+    random.seed(seed)
+
+    users = [ make_user(index) for index in range(user_count) ]
+
+    users.append({ "userName"   : ADMIN_USER,
+                   "parameters" : { "EMAIL" : ADMIN_EMAIL, "FIRST_NAME" : "Provisioner", "LAST_NAME" : "Admin",
+                                    "DISPLAY_NAME" : "Provisioner Admin", "NUMBER_OF_DAYS_VISITED" : "1",
+                                    "LAST_LOGIN_DATE" : "1660000000000" },
+                   "metadata"   : { "isSamlEnabled" : True },
+                   "roles"      : "PROFILE:sap.epm:BI_Admin;PROFILE:t.V:DW_Administrator" })
+
+    tenant = { "tenant_id"   : "STANDIN",
+               "admin"       : { "userName" : ADMIN_USER, "email" : ADMIN_EMAIL },
+               "users"       : users,
+               "spaces"      : [],
+               "definitions" : {},
+               "resources"   : {},
+               "connections" : {},
+               "objects"     : {},
+               "shares"      : {} }
+
+    for index in range(space_count):
+        summary, definition, resources = make_space(index, users[:-1] or users)
+        space_name = summary["name"]
+
+        tenant["spaces"].append(summary)
+        tenant["definitions"][space_name] = definition
+        tenant["resources"][space_name] = resources
+        tenant["connections"][space_name] = make_connections(space_name, summary["id"], random.randint(0, connections * 2))
+        tenant["objects"][space_name] = make_objects(space_name, random.randint(0, objects * 2))
+
+    # Share a fraction of the objects with other spaces.
+
+    space_names = [ space["name"] for space in tenant["spaces"] ]
+
+    for space_index, space_name in enumerate(space_names):
+        for object in tenant["objects"][space_name]:
+            if len(space_names) > 1 and random.random() < share_ratio:
+                # Pick from the other spaces by skipping over our own index.
+                picks = random.sample(range(len(space_names) - 1), min(3, len(space_names) - 1))
+                targets = [ space_names[pick + 1 if pick >= space_index else pick] for pick in picks ]
+
+                object["shared_with_space_name"] = targets
+                tenant["shares"].setdefault(space_name, {})[object["name"]] = [ { "name" : target } for target in targets ]
+
+    return tenant
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic DWC tenant for the stand-in server.")
+    parser.add_argument("-s", "--spaces",      help="number of spaces (default=10)", type=int, default=10)
+    parser.add_argument("-u", "--users",       help="number of users (default=100)", type=int, default=100)
+    parser.add_argument("-c", "--connections", help="average connections per space (default=2)", type=int, default=2)
+    parser.add_argument("-b", "--objects",     help="average builder objects per space (default=5)", type=int, default=5)
+    parser.add_argument("-r", "--share-ratio", help="fraction of objects shared (default=0.2)", type=float, default=0.2)
+    parser.add_argument("--seed",              help="random seed (default=42)", type=int, default=42)
+    parser.add_argument("-o", "--output",      help="output file (default=tenant.json)", default="tenant.json")
+
+    args = parser.parse_args()
+
+    tenant = generate(args.spaces, args.users, args.connections, args.objects, args.share_ratio, args.seed)
+
+    with open(args.output, "w") as output:
+        json.dump(tenant, output)
+
+    print(f"{args.output}: {len(tenant['spaces'])} space(s), {len(tenant['users'])} user(s)")
@@ -0,0 +1,28 @@
+import pytest
+
+import json_tools
+from json_path_benchmark import PATHS, TEST_DATA, interpret_path
+
+@pytest.mark.parametrize("path", PATHS + [ "$.missing", "$.subobj.missing", "$.subobj.members[0]", "$.subobj.members[5]", "$.resources.*" ])
+def test_compiled_path_matches_interpreter(path):
+    assert json_tools.json_path(TEST_DATA, path) == interpret_path(TEST_DATA, path)
+
+@pytest.mark.parametrize("path, expected", [
+    ("$.simpleField",              "simple fld value"),
+    ("$.resources.memory.used",    123456789),
+    ("$..name",                    [ "mark", "sally", "jane" ]),
+    ("$.subobj.members[0,2]",      [ { "name" : "mark" }, { "name" : "jane" } ]),
+    ("$.subobj.members[1:]",       [ { "name" : "sally" }, { "name" : "jane" } ]),
+    ("$..members[::2]",            [ { "name" : "mark" }, { "name" : "jane" } ]),
+    ("$..members[*].name",         [ "mark", "sally", "jane" ]),
+    ("$.subobj['test']",           "bob"),
+    ("$.dbusers.*",                [ { "key" : "SALES#ETL", "value" : {} }, { "key" : "SALES#BI", "value" : {} } ]),
+])
+def test_compiled_path(path, expected):
+    assert json_tools.json_path(TEST_DATA, path) == expected
+
+def test_compiled_paths_are_cached():
+    assert json_tools.compile_path("$.subobj.members[1]") is json_tools.compile_path("$.subobj.members[1]")
+
+def test_invalid_path():
+    assert json_tools.json_path(TEST_DATA, "  ") is None
@@ -0,0 +1,57 @@
+import http.server, threading
+
+import pytest
+import requests
+
+from metrics import RequestMetrics
+from transport import DWCTransport
+
+class ThrottledHandler(http.server.BaseHTTPRequestHandler):
+    # The first request is throttled for RETRY_AFTER seconds, the next one succeeds.
+
+    RETRY_AFTER = 0.3
+
+    def do_GET(self):
+        self.server.requests += 1
+
+        if self.server.requests == 1:
+            self.send_response(503)
+            self.send_header("Retry-After", str(self.RETRY_AFTER))
+            body = b"busy"
+        else:
+            self.send_response(200)
+            body = b"ok"
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ThrottledHandler)
+    server.requests = 0
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+
+    server.shutdown()
+    server.server_close()
+
+def test_latency_includes_retries_and_backoff(url):
+    session = requests.Session()
+    session.mount("http://", DWCTransport(retries=2))
+
+    metrics = RequestMetrics()
+    metrics.attach(session, lambda request_url: "throttled")
+
+    assert session.get(url).status_code == 200
+
+    endpoint = metrics.summary()["throttled"]
+
+    assert endpoint["count"] == 1
+    assert endpoint["retries"] == 1
+    assert endpoint["max"] >= ThrottledHandler.RETRY_AFTER
@@ -0,0 +1,43 @@
+"""
+--offline runs are served from the tenant snapshot written by earlier online
+runs, against the local DWC stand-in.
+"""
+
+import os
+
+import tenant_generator
+
+def test_offline_after_online_with_saved_session(standin, run_provisioner, tmp_path):
+    tenant, url = standin(space_count=4, user_count=40)
+
+    result = run_provisioner(tmp_path, "config", "--dwc-url", url, "--dwc-user", tenant_generator.ADMIN_USER,
+                             "--dwc-password", "standin", "--cache-ttl", "3600")
+    assert result.returncode == 0, result.stderr
+
+    # The first run logs in and saves the session, the second reuses it.
+
+    for _ in range(2):
+        result = run_provisioner(tmp_path, "users", "list", "-f", "json")
+        assert result.returncode == 0, result.stderr
+
+    assert os.path.exists(tmp_path / ".dwc_session")
+
+    # A change to the tenant drops the snapshot, but not who we are.
+
+    space = tenant["spaces"][0]["name"]
+    members = [ member["name"] for member in tenant["definitions"][space]["members"] ]
+    member = [ user["userName"] for user in tenant["users"] if user["userName"] not in members ][0]
+
+    result = run_provisioner(tmp_path, "spaces", "member", "add", space, member)
+    assert result.returncode == 0, result.stderr
+
+    result = run_provisioner(tmp_path, "users", "list", "-f", "json")
+    assert result.returncode == 0, result.stderr
+
+    online_users = result.stdout
+
+    result = run_provisioner(tmp_path, "--offline", "users", "list", "-f", "json")
+
+    assert result.returncode == 0, result.stderr
+    assert "No tenant snapshot found" not in result.stderr
+    assert result.stdout == online_users
@@ -0,0 +1,64 @@
+"""
+Column types inferred for columns with a mix of values, against the rules of
+the HANA writer before schema.py - the DDL must not change.
+"""
+
+import argparse
+
+import pytest
+
+import schema, writer_hana
+
+def baseline_type(values, column_name="value"):
+    # The type each row set on the column in writer_hana.recurse_columns.
+
+    column_type = None
+
+    for value in values:
+        if isinstance(value, int):
+            value_type = "BIGINT"
+        elif column_name in schema.timestamps or column_name in schema.date_fields:
+            value_type = "TIMESTAMP"
+        elif isinstance(value, (list, dict)):
+            value_type = "CLOB"
+        else:
+            value_type = "NVARCHAR(5000)"
+
+        if column_type is None:
+            column_type = value_type
+        elif column_type == "BIGINT" and value_type.startswith("NVARCHAR"):
+            column_type = value_type
+        elif column_type.startswith("NVARCHAR") and value_type == "CLOB":
+            column_type = value_type
+
+    return column_type
+
+def inferred_type(values):
+    rows = [ { "id" : position, "value" : value } for position, value in enumerate(values) ]
+
+    return schema.infer_schema(rows, "test")["TEST"]["columns"]["value"]["type"]
+
+@pytest.mark.parametrize("values", [
+    [ 1, "a" ],
+    [ "a", 1 ],
+    [ 1, [ "a" ] ],
+    [ 1, { "a" : 1 } ],
+    [ 1, [ "a" ], "b" ],
+    [ 1, "a", [ "b" ] ],
+    [ 1, [ "a" ], "b", [ "c" ] ],
+    [ 1, { "a" : 1 }, "b", { "c" : 2 } ],
+    [ "a", [ "b" ], 1 ],
+    [ None, 1, [ "a" ] ],
+    [ True, 2, "a", { "b" : 3 } ],
+])
+def test_mixed_column_type_matches_baseline(values):
+    assert inferred_type(values) == baseline_type(values)
+
+def test_mixed_column_ddl_matches_baseline():
+    # An integer column holding lists stayed BIGINT - it is not made a CLOB.
+
+    rows = [ { "id" : 1, "value" : 1 }, { "id" : 2, "value" : [ "a" ] } ]
+
+    ddl = writer_hana.create_ddl(rows, argparse.Namespace(prefix="test"))
+
+    assert ddl["TEST"]["create"] == 'create column table TEST (\n"id" BIGINT\n,"value" BIGINT)'
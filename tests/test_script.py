@@ -0,0 +1,59 @@
+"""
+script --parallel against the local DWC stand-in - the status of each line,
+and the lines skipped when a line they depend on fails.
+"""
+
+import gzip, re
+
+import pytest
+
+import tenant_generator
+
+def line_status(stderr):
+    # The status table printed at the end of a parallel script: line, status, seconds, command.
+    return { int(match.group(1)) : match.group(2) for match in re.finditer(r"^\s*(\d+) (ok|failed|skipped)\s", stderr, re.MULTILINE) }
+
+@pytest.fixture
+def work_dir(standin, run_provisioner, tmp_path):
+    tenant, url = standin(space_count=4, user_count=10)
+
+    result = run_provisioner(tmp_path, "config", "--dwc-url", url, "--dwc-user", tenant_generator.ADMIN_USER, "--dwc-password", "standin")
+    assert result.returncode == 0, result.stderr
+
+    return tmp_path
+
+def test_logged_error_fails_line_and_skips_dependents(work_dir, run_provisioner):
+    script = work_dir / "script.txt"
+
+    # Line 1 logs an error (there is no such space) without raising, line 2
+    # reads the space line 1 changes, and line 3 is independent of both.
+
+    script.write_text("spaces delete NEWSPACE_A\n"
+                      "spaces member list NEWSPACE_A\n"
+                      "users list\n")
+
+    result = run_provisioner(work_dir, "script", "--parallel", "2", str(script))
+
+    assert line_status(result.stderr) == { 1 : "failed", 2 : "skipped", 3 : "ok" }, result.stderr
+
+def test_parallel_gzip_output_stays_in_script_order(work_dir, run_provisioner):
+    script = work_dir / "script.txt"
+
+    # The gzip output is written to the binary buffer of stdout, between two
+    # lines of text output.
+
+    script.write_text("users list\n"
+                      "users list -f json -z\n"
+                      "spaces list\n")
+
+    users_text = run_provisioner(work_dir, "users", "list", text=False).stdout
+    users_json = run_provisioner(work_dir, "users", "list", "-f", "json", text=False).stdout
+    spaces_text = run_provisioner(work_dir, "spaces", "list", text=False).stdout
+
+    result = run_provisioner(work_dir, "script", "--parallel", "3", str(script), text=False)
+
+    assert line_status(result.stderr.decode("utf-8")) == { 1 : "ok", 2 : "ok", 3 : "ok" }
+
+    assert result.stdout.startswith(users_text)
+    assert result.stdout.endswith(spaces_text)
+    assert gzip.decompress(result.stdout[len(users_text):-len(spaces_text)]) == users_json
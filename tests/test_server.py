@@ -0,0 +1,77 @@
+"""
+The provisioner server against the local DWC stand-in - the socket is private
+to its owner, and commands sent with --socket run like they do directly.
+"""
+
+import json, os, socket, stat, subprocess, sys, time
+
+import pytest
+
+import tenant_generator
+from conftest import PROVISIONER
+
+@pytest.fixture
+def socket_path(standin, run_provisioner, tmp_path):
+    tenant, url = standin(space_count=4, user_count=10)
+
+    result = run_provisioner(tmp_path, "config", "--dwc-url", url, "--dwc-user", tenant_generator.ADMIN_USER, "--dwc-password", "standin")
+    assert result.returncode == 0, result.stderr
+
+    socket_path = tmp_path / "provisioner.sock"
+
+    server = subprocess.Popen([ sys.executable, PROVISIONER, "--socket", str(socket_path), "serve" ], cwd=tmp_path,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    for _ in range(100):
+        if socket_path.exists() or server.poll() is not None:
+            break
+
+        time.sleep(0.05)
+
+    assert socket_path.exists(), "the server did not start"
+
+    yield socket_path
+
+    server.terminate()
+    server.wait()
+
+def send(socket_path, argv):
+    # Talk to the server directly, without the checks made by a client run.
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall((json.dumps({ "argv" : argv, "cwd" : os.getcwd() }) + "\n").encode("utf-8"))
+
+        chunks = []
+
+        while True:
+            data = client.recv(65536)
+
+            if not data:
+                return b"".join(chunks).decode("utf-8")
+
+            chunks.append(data)
+
+def test_socket_is_private(socket_path):
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+def test_forwarded_command_matches_direct_run(socket_path, run_provisioner, tmp_path):
+    direct = run_provisioner(tmp_path, "users", "list", "-f", "json")
+    assert direct.returncode == 0, direct.stderr
+
+    forwarded = run_provisioner(tmp_path, "--socket", str(socket_path), "-w", "2", "users", "list", "-f", "json")
+    assert forwarded.returncode == 0, forwarded.stderr
+
+    assert forwarded.stdout == direct.stdout
+
+@pytest.mark.parametrize("option", [ [ "--offline" ], [ "-l", "debug" ], [ "--stats" ] ])
+def test_server_options_are_rejected(socket_path, run_provisioner, tmp_path, option):
+    result = run_provisioner(tmp_path, "--socket", str(socket_path), *option, "users", "list")
+
+    assert result.returncode == 1
+    assert "cannot be used with --socket" in result.stderr
+    assert result.stdout == ""
+
+    # The server refuses them too.
+
+    assert send(socket_path, option + [ "users", "list" ]).startswith("error: ")
@@ -0,0 +1,55 @@
+"""
+The spaces and users caches may be dropped (see server.py) while other threads
+are searching them.
+"""
+
+import sys, threading
+
+import pytest
+
+import tenant_generator
+from session import DWCSession
+
+@pytest.fixture
+def dwc(standin):
+    tenant, url = standin(space_count=6, user_count=30)
+
+    session = DWCSession(url, tenant_generator.ADMIN_USER, "standin")
+    assert session.login()
+
+    return tenant, session
+
+def test_lookups_survive_invalidate(dwc):
+    tenant, session = dwc
+
+    space = tenant["spaces"][0]["name"]
+    user = tenant["users"][0]["userName"]
+
+    errors = []
+
+    def lookup():
+        try:
+            for _ in range(100):
+                assert [ found["name"] for found in session.query_spaces(space, query=False) ] == [ space ]
+                assert session.get_space_guid(space) is not None
+                assert [ found["userName"] for found in session.get_users(user, query=False) ] == [ user ]
+        except Exception as error:
+            errors.append(error)
+
+    # Switch threads as often as possible, to land between the reads.
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    threads = [ threading.Thread(target=lookup) for _ in range(4) ]
+
+    try:
+        for thread in threads:
+            thread.start()
+
+        while any(thread.is_alive() for thread in threads):
+            session.invalidate_caches()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
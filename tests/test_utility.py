@@ -0,0 +1,22 @@
+import threading, time
+
+import utility
+
+def test_timers_are_per_thread():
+    utility.start_timer("shared")
+    time.sleep(0.2)
+
+    # A worker starting a timer of the same name does not restart ours.
+
+    elapsed = {}
+
+    def worker():
+        utility.start_timer("shared")
+        elapsed["worker"] = utility.get_timer("shared")
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert elapsed["worker"] < 0.1
+    assert utility.get_timer("shared") >= 0.2
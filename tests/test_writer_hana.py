@@ -0,0 +1,158 @@
+"""
+writer_hana against the sqlite stand-in for the HANA client (hana_standin).
+"""
+
+import argparse, configparser, os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "hana_standin"))
+
+import schema, session_config, writer_hana
+
+@pytest.fixture
+def hana(tmp_path, monkeypatch):
+    '''Configure writer_hana for a new stand-in database - call it with the hana settings to change.'''
+
+    monkeypatch.setenv("HANA_STANDIN_DB", str(tmp_path / "hana.db"))
+    monkeypatch.setenv("HANA_STANDIN_LATENCY", "0")
+
+    def configure(**settings):
+        config = configparser.ConfigParser()
+
+        config["hana"] = { "hana_host"       : "localhost",
+                           "hana_port"       : "30015",
+                           "hana_user"       : "TEST",
+                           "hana_password"   : session_config.fn_blur("TEST"),
+                           "hana_encrypt"    : "False",
+                           "hana_sslverify"  : "False",
+                           "hana_import_dir" : str(tmp_path / "import") }
+
+        config["hana"].update(settings)
+
+        monkeypatch.setattr(session_config, "session_config", config)
+
+    configure()
+
+    monkeypatch.setattr(writer_hana, "conn", None)
+    monkeypatch.setattr(writer_hana, "cursor", None)
+
+    yield configure
+
+    if writer_hana.conn is not None:
+        writer_hana.conn.close()
+
+def write(rows, prefix="test", **options):
+    writer_hana.write_list(rows, argparse.Namespace(prefix=prefix, directory=None, **options))
+
+def select(sql):
+    writer_hana.cursor.execute(sql)
+
+    return writer_hana.cursor.fetchall()
+
+# ---- IMPORT FROM staged files -------------------------------------------------
+
+CLOB_ROWS = [ { "name"  : "multi-line",
+                "notes" : { "text" : "first line\nsecond line\r\nthird \"quoted\" line" },
+                "items" : [ { "value" : 'a "b" c' } ] },
+              { "name"  : "quotes",
+                "notes" : { "json" : '{"key": "value, with comma", "list": ["x", "y"]}', "empty" : "" },
+                "items" : [ { "value" : '""' }, { "value" : "'single', \"double\"\n" } ] },
+              { "name"  : "empty",
+                "notes" : {},
+                "items" : [ { "value" : "" }, { "value" : None } ] } ]
+
+def table_rows(table_name):
+    return sorted(select(f"select * from {table_name}"), key=repr)
+
+def test_import_round_trips_multiline_and_quoted_clobs(hana):
+    hana(hana_load="insert")
+    write(CLOB_ROWS)
+
+    inserted = { table_name : table_rows(table_name) for table_name in [ "TEST", "TEST_ITEMS" ] }
+
+    writer_hana.conn.close()
+    writer_hana.conn = None
+
+    os.remove(os.environ["HANA_STANDIN_DB"])
+
+    hana(hana_load="import")
+    write(CLOB_ROWS)
+
+    imported = { table_name : table_rows(table_name) for table_name in [ "TEST", "TEST_ITEMS" ] }
+
+    assert imported == inserted
+
+    # The CLOB values are the text INSERT binds - newlines and quotes included.
+
+    notes = dict(select('select "name", "notes" from TEST'))
+
+    assert notes["multi-line"] == str(CLOB_ROWS[0]["notes"])
+    assert notes["quotes"] == str(CLOB_ROWS[1]["notes"])
+
+    # An empty string stays empty, a missing value is NULL.
+    assert sorted(select('select "value" from TEST_ITEMS'), key=repr) == sorted([ ('a "b" c',), ('""',), ("'single', \"double\"\n",), ("",), (None,) ], key=repr)
+
+def test_import_removes_staged_files(hana, tmp_path):
+    hana(hana_load="import")
+    write(CLOB_ROWS)
+
+    assert os.listdir(tmp_path / "import") == []
+
+# ---- --merge ------------------------------------------------------------------
+
+def spaces(members):
+    return [ { "name" : name, "label" : name.title(), "members" : [ { "name" : member } for member in member_names ] }
+             for name, member_names in members.items() ]
+
+def test_merge_writes_only_changes(hana):
+    write(spaces({ "SALES" : [ "ANNA", "BOB" ], "HR" : [ "CAROL" ] }), merge=True)
+    write(spaces({ "SALES" : [ "ANNA", "BOB" ], "FINANCE" : [ "DAVE" ] }), merge=True)
+
+    assert sorted(select('select "name" from TEST')) == [ ("FINANCE",), ("SALES",) ]
+    assert sorted(select('select "name" from TEST_MEMBERS')) == [ ("ANNA",), ("BOB",), ("DAVE",) ]
+
+def test_merge_empties_child_table_missing_from_refresh(hana):
+    write(spaces({ "SALES" : [ "ANNA", "BOB" ], "HR" : [ "CAROL" ] }), merge=True)
+
+    assert len(select("select * from TEST_MEMBERS")) == 3
+
+    # No space has members this time - TEST_MEMBERS is not in the schema
+    # of this run, but its rows are gone from the tenant.
+
+    write(spaces({ "SALES" : [], "HR" : [] }), merge=True)
+
+    assert select("select * from TEST_MEMBERS") == []
+    assert len(select("select * from TEST")) == 2
+
+    # And the table fills up again when the members are back.
+
+    write(spaces({ "SALES" : [ "ANNA" ], "HR" : [] }), merge=True)
+
+    assert select('select "name" from TEST_MEMBERS') == [ ("ANNA",) ]
+
+def test_merge_leaves_other_prefixes_alone(hana):
+    write(spaces({ "SALES" : [ "ANNA" ] }), prefix="test", merge=True)
+    write(spaces({ "HR" : [ "CAROL" ] }), prefix="test_other", merge=True)
+
+    write(spaces({ "SALES" : [] }), prefix="test", merge=True)
+
+    assert select("select * from TEST_MEMBERS") == []
+    assert select('select "name" from TEST_OTHER_MEMBERS') == [ ("CAROL",) ]
+
+def test_merge_recreates_table_for_wider_column(hana):
+    write([ { "name" : "SALES", "budget" : 100 }, { "name" : "HR", "budget" : 200 } ], merge=True)
+
+    # The budgets are strings now - the BIGINT column cannot take them.
+
+    write([ { "name" : "SALES", "budget" : "100k" }, { "name" : "HR", "budget" : 200 } ], merge=True)
+
+    assert sorted(select('select "name", "budget" from TEST')) == [ ("HR", "200"), ("SALES", "100k") ]
+    assert writer_hana.column_types("TEST")["budget"] == schema.TYPE_NVARCHAR
+
+    # Narrower values fit the wider column - the table is merged as usual.
+
+    write([ { "name" : "SALES", "budget" : 300 }, { "name" : "HR", "budget" : 200 } ], merge=True)
+
+    assert sorted(select('select "name", "budget" from TEST')) == [ ("HR", "200"), ("SALES", "300") ]
+    assert writer_hana.column_types("TEST")["budget"] == schema.TYPE_NVARCHAR
@@ -0,0 +1,32 @@
+"""
+writer_text keeps one compiled plan per template name.
+"""
+
+import copy, io
+
+import constants, writer_text
+
+def test_plan_reused_for_template():
+    template = constants.templates["users"]
+
+    assert writer_text.get_plan("users", template) is writer_text.get_plan("users", template)
+
+def test_replaced_template_is_compiled_again(monkeypatch):
+    template = constants.templates["users"]
+    plan = writer_text.get_plan("users", template)
+
+    # A new template object - even one that reuses the id of a freed one -
+    # never gets the plan of another template.
+
+    replacement = copy.deepcopy(template)
+    monkeypatch.setitem(constants.templates, "users", replacement)
+
+    assert writer_text.get_plan("users", replacement) is not plan
+    assert len([ name for name in writer_text.compiled_templates if name == "users" ]) == 1
+
+def test_render_by_template_name():
+    output = io.StringIO()
+
+    writer_text.recurse_format([ { "userName" : "USER1", "parameters" : {}, "metadata" : {} } ], "users", output)
+
+    assert "USER1" in output.getvalue()